@@ -16,6 +16,7 @@ from app.db.models.cliente import Cliente, ClienteStatus
 from app.api.v1.admin.auth import get_current_admin
 from app.core.security import get_password_hash
 from app.services.email import EmailService
+from app.services.whatsapp.tenant_cache import invalidar_cliente
 
 
 router = APIRouter()
@@ -237,6 +238,7 @@ def suspender_cliente(
     cliente.updated_at = datetime.utcnow()
     
     db.commit()
+    invalidar_cliente(db, cliente.id)
     
     # TODO: Enviar email notificando suspensão
     
@@ -273,6 +275,7 @@ def ativar_cliente(
     cliente.updated_at = datetime.utcnow()
     
     db.commit()
+    invalidar_cliente(db, cliente.id)
     
     # TODO: Enviar email notificando reativação
     
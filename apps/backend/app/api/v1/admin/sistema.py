@@ -9,6 +9,7 @@ from app.db.session import get_db
 from app.core.security import get_current_admin
 from app.db.models.admin import Admin
 from app.services.sistema import SistemaService
+from app.core import metrics
 
 
 router = APIRouter()
@@ -42,3 +43,17 @@ def obter_metricas_sistema(
     - Performance (tempo de resposta, requests/min, erros/min)
     """
     return SistemaService.obter_metricas_sistema()
+
+
+@router.get("/pipeline")
+def obter_metricas_pipeline(
+    admin: Admin = Depends(get_current_admin)
+) -> Dict[str, Any]:
+    """
+    Retorna métricas do pipeline de mensagens deste processo
+    - Fila e execução do executor (aguardando, fila, em_execucao)
+    - Tempo de espera e duração das rodadas (p50/p95/p99)
+    - Rodadas concluídas e erros
+    - Fila e processados por faixa do executor particionado
+    """
+    return metrics.snapshot()
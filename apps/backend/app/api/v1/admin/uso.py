@@ -3,7 +3,7 @@ Rotas de monitoramento de uso OpenAI para admin
 FASE 16.4 - Monitoramento de Uso (Créditos OpenAI)
 """
 from fastapi import APIRouter, Depends, Query
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -33,8 +33,14 @@ class HistoricoUso(BaseModel):
     tokens_prompt: int
     tokens_completion: int
     tokens_total: int
-    custo_estimado: float
+    custo_estimado: float = Field(
+        ...,
+        description="Estimativa. Chamadas de hedge canceladas entram só com o custo do prompt: "
+                    "o provedor não informa os tokens gerados até o cancelamento"
+    )
     mensagens_processadas: int
+    chamadas_hedge: int = Field(0, description="Mensagens em que o hedge disparou uma segunda chamada")
+    tokens_cache: int = 0
     modelo: str
 
 
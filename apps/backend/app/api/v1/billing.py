@@ -9,6 +9,7 @@ from decimal import Decimal
 
 from app.db.session import get_db
 from app.api.v1.auth import get_current_cliente
+from app.services.whatsapp.tenant_cache import invalidar_cliente
 
 router = APIRouter()
 
@@ -148,6 +149,7 @@ def create_checkout(
     db.add(pagamento)
     
     db.commit()
+    invalidar_cliente(db, cliente.id)
     
     # Retornar URL fake (em produção seria URL do Stripe)
     return {
@@ -220,6 +222,7 @@ def cancelar_assinatura(
     # TODO: Cancelar no Stripe
     
     db.commit()
+    invalidar_cliente(db, cliente.id)
     
     return {
         'message': 'Assinatura cancelada. Você manterá acesso até ' + 
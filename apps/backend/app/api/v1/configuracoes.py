@@ -2,9 +2,9 @@
 Rotas para configurações do bot
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional
 
 from app.db.session import get_db
 from app.api.v1.auth import get_current_cliente
@@ -22,6 +22,12 @@ class ConfiguracaoResponse(BaseModel):
     mensagem_fallback: str
     mensagem_espera: str
     mensagem_retorno_24h: str
+    debounce_min_segundos: Optional[float] = None
+    debounce_max_segundos: Optional[float] = None
+    etapas_desabilitadas: List[str] = []
+    hedge_habilitado: bool = False
+    limiar_cache_semantico: Optional[float] = None
+    orcamento_tokens_prompt: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -34,6 +40,12 @@ class ConfiguracaoUpdateRequest(BaseModel):
     mensagem_fallback: Optional[str] = None
     mensagem_espera: Optional[str] = None
     mensagem_retorno_24h: Optional[str] = None
+    debounce_min_segundos: Optional[float] = Field(None, ge=0, le=120)
+    debounce_max_segundos: Optional[float] = Field(None, ge=0, le=120)
+    etapas_desabilitadas: Optional[List[str]] = None
+    hedge_habilitado: Optional[bool] = None
+    limiar_cache_semantico: Optional[float] = Field(None, ge=0.5, le=1.0)
+    orcamento_tokens_prompt: Optional[int] = Field(None, ge=1000, le=128000)
 
 
 @router.get("/config", response_model=ConfiguracaoResponse)
@@ -52,7 +64,13 @@ def get_configuracao(
         "mensagem_saudacao": config.mensagem_saudacao,
         "mensagem_fallback": config.mensagem_fallback,
         "mensagem_espera": config.mensagem_espera,
-        "mensagem_retorno_24h": config.mensagem_retorno_24h
+        "mensagem_retorno_24h": config.mensagem_retorno_24h,
+        "debounce_min_segundos": config.debounce_min_segundos,
+        "debounce_max_segundos": config.debounce_max_segundos,
+        "etapas_desabilitadas": config.etapas_desabilitadas or [],
+        "hedge_habilitado": config.hedge_habilitado,
+        "limiar_cache_semantico": config.limiar_cache_semantico,
+        "orcamento_tokens_prompt": config.orcamento_tokens_prompt
     }
 
 
@@ -81,7 +99,13 @@ def update_configuracao(
             mensagem_saudacao=request.mensagem_saudacao,
             mensagem_fallback=request.mensagem_fallback,
             mensagem_espera=request.mensagem_espera,
-            mensagem_retorno_24h=request.mensagem_retorno_24h
+            mensagem_retorno_24h=request.mensagem_retorno_24h,
+            debounce_min_segundos=request.debounce_min_segundos,
+            debounce_max_segundos=request.debounce_max_segundos,
+            etapas_desabilitadas=request.etapas_desabilitadas,
+            hedge_habilitado=request.hedge_habilitado,
+            limiar_cache_semantico=request.limiar_cache_semantico,
+            orcamento_tokens_prompt=request.orcamento_tokens_prompt
         )
         
         logger.info(f"✅ Configurações salvas com sucesso para cliente {cliente.id}")
@@ -91,8 +115,19 @@ def update_configuracao(
             "mensagem_saudacao": config.mensagem_saudacao,
             "mensagem_fallback": config.mensagem_fallback,
             "mensagem_espera": config.mensagem_espera,
-            "mensagem_retorno_24h": config.mensagem_retorno_24h
+            "mensagem_retorno_24h": config.mensagem_retorno_24h,
+            "debounce_min_segundos": config.debounce_min_segundos,
+            "debounce_max_segundos": config.debounce_max_segundos,
+            "etapas_desabilitadas": config.etapas_desabilitadas or [],
+            "hedge_habilitado": config.hedge_habilitado,
+            "limiar_cache_semantico": config.limiar_cache_semantico,
+            "orcamento_tokens_prompt": config.orcamento_tokens_prompt
         }
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"❌ Erro ao salvar configurações: {str(e)}")
         raise HTTPException(
@@ -9,6 +9,7 @@ import base64
 
 from app.db.session import get_db
 from app.db.models.ia_configuracao import IAConfiguracao
+from app.services.ia_config_service import IAConfigService
 
 router = APIRouter()
 
@@ -112,6 +113,7 @@ def add_key(request: AddKeyRequest, db: Session = Depends(get_db)):
     config.updated_at = datetime.utcnow()
     
     db.commit()
+    IAConfigService.invalidar(chaves_alteradas=True)
     
     return {'message': 'API key adicionada com sucesso'}
 
@@ -132,6 +134,7 @@ def remove_key(provedor: str, db: Session = Depends(get_db)):
     config.updated_at = datetime.utcnow()
     
     db.commit()
+    IAConfigService.invalidar(chaves_alteradas=True)
     
     return {'message': 'API key removida'}
 
@@ -158,6 +161,7 @@ def set_active(request: SetActiveRequest, db: Session = Depends(get_db)):
     config.updated_at = datetime.utcnow()
     
     db.commit()
+    IAConfigService.invalidar()
     
     return {'message': f'{request.provedor.title()} ativado como modelo principal'}
 
@@ -180,6 +184,7 @@ def change_model(request: ChangeModelRequest, db: Session = Depends(get_db)):
     config.updated_at = datetime.utcnow()
     
     db.commit()
+    IAConfigService.invalidar()
     
     return {'message': f'Modelo alterado para {request.modelo}'}
 
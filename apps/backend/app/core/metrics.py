@@ -0,0 +1,116 @@
+"""
+Registro de métricas em memória (por processo)
+
+Contadores, gauges e histogramas simples, thread-safe, expostos em
+GET /api/v1/admin/sistema/pipeline. Não substitui um Prometheus: serve para
+acompanhar filas e latências do pipeline de mensagens sem dependência extra.
+"""
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+# Quantidade de observações recentes guardadas por histograma (percentis)
+_JANELA_HISTOGRAMA = 1000
+
+_lock = threading.Lock()
+_contadores: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_gauges_funcao: Dict[str, Callable[[], float]] = {}
+_histogramas: Dict[str, Dict[str, Any]] = {}
+
+
+def incrementar(nome: str, valor: float = 1):
+    """Soma valor ao contador"""
+    with _lock:
+        _contadores[nome] = _contadores.get(nome, 0) + valor
+
+
+def definir(nome: str, valor: float):
+    """Define o valor atual de um gauge"""
+    with _lock:
+        _gauges[nome] = valor
+
+
+def registrar_gauge(nome: str, funcao: Callable[[], float]):
+    """Registra um gauge calculado no momento da leitura (ex: tamanho de fila)"""
+    with _lock:
+        _gauges_funcao[nome] = funcao
+
+
+def remover_gauge(nome: str):
+    """Remove um gauge calculado (ex: faixa do executor encerrada)"""
+    with _lock:
+        _gauges_funcao.pop(nome, None)
+
+
+def observar(nome: str, valor: float):
+    """Registra uma observação no histograma (ex: duração em segundos)"""
+    with _lock:
+        hist = _histogramas.get(nome)
+        if hist is None:
+            hist = {'count': 0, 'sum': 0.0, 'max': 0.0, 'recentes': deque(maxlen=_JANELA_HISTOGRAMA)}
+            _histogramas[nome] = hist
+        hist['count'] += 1
+        hist['sum'] += valor
+        hist['max'] = max(hist['max'], valor)
+        hist['recentes'].append(valor)
+
+
+def percentil(nome: str, p: float, minimo_amostras: int = 1) -> Optional[float]:
+    """Percentil p (0-1) das observações recentes do histograma (None se houver menos de minimo_amostras)"""
+    with _lock:
+        hist = _histogramas.get(nome)
+        recentes = list(hist['recentes']) if hist else []
+    if len(recentes) < max(1, minimo_amostras):
+        return None
+    return _percentil(recentes, p)
+
+
+def _percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def snapshot() -> Dict[str, Any]:
+    """Retorna o estado atual de todas as métricas"""
+    with _lock:
+        contadores = dict(_contadores)
+        gauges = dict(_gauges)
+        funcoes = dict(_gauges_funcao)
+        histogramas = {
+            nome: (hist['count'], hist['sum'], hist['max'], list(hist['recentes']))
+            for nome, hist in _histogramas.items()
+        }
+
+    for nome, funcao in funcoes.items():
+        try:
+            gauges[nome] = funcao()
+        except Exception:
+            gauges[nome] = None
+
+    return {
+        'contadores': contadores,
+        'gauges': gauges,
+        'histogramas': {
+            nome: {
+                'count': count,
+                'media': (soma / count) if count else 0.0,
+                'max': maximo,
+                'p50': _percentil(recentes, 0.50),
+                'p95': _percentil(recentes, 0.95),
+                'p99': _percentil(recentes, 0.99)
+            }
+            for nome, (count, soma, maximo, recentes) in histogramas.items()
+        }
+    }
+
+
+def resetar():
+    """Zera contadores, gauges e histogramas (os gauges calculados continuam registrados)"""
+    with _lock:
+        _contadores.clear()
+        _gauges.clear()
+        _histogramas.clear()
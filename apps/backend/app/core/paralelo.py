@@ -0,0 +1,97 @@
+"""
+Chamadas de I/O independentes em paralelo, com timeout e valor degradado
+
+Antes da geração, o pipeline lê dependências que não dependem umas das
+outras (estado do chat, busca no vectorstore, histórico, provedores). Em
+sequência, a latência é a soma de todas; aqui elas rodam juntas em um pool
+de threads próprio e a latência passa a ser a da mais lenta.
+
+Cada chamada tem o próprio timeout (contado a partir do seu início). Se
+estourar ou falhar, vale o padrão da chamada (função sem argumentos, rodada
+na thread de quem chamou) e a chamada original continua no pool até
+terminar, sem bloquear a rodada.
+
+Uso:
+    resultados = executar_em_paralelo({
+        'historico': (lambda: buscar_historico(chat_id), 1.0, list),
+        'contexto': (lambda: buscar_contexto(cliente_id, mensagem), 5.0, contexto_vazio),
+    })
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PREGERACAO_MAX_WORKERS,
+    thread_name_prefix='pregeracao'
+)
+
+# nome -> (função, timeout em segundos, padrão)
+Chamadas = Dict[str, Tuple[Callable[[], Any], float, Callable[[], Any]]]
+
+
+def _medir(nome: str, funcao: Callable[[], Any]) -> Callable[[], Any]:
+    def executar():
+        inicio = time.monotonic()
+        try:
+            return funcao()
+        finally:
+            metrics.observar(f'pregeracao.{nome}.duracao_segundos', time.monotonic() - inicio)
+    return executar
+
+
+class Pendente:
+    """Chamada em andamento no pool (ver iniciar)"""
+
+    def __init__(self, nome: str, funcao: Callable[[], Any], timeout: float, padrao: Callable[[], Any]):
+        self.nome = nome
+        self.timeout = timeout
+        self.padrao = padrao
+        self._inicio = time.monotonic()
+        self._futuro = _executor.submit(_medir(nome, funcao))
+
+    def resultado(self) -> Any:
+        """Espera o que falta do timeout; em timeout ou erro, retorna o padrão"""
+        restante = max(0.0, self.timeout - (time.monotonic() - self._inicio))
+        try:
+            return self._futuro.result(timeout=restante)
+        except FuturesTimeoutError:
+            metrics.incrementar(f'pregeracao.{self.nome}.timeout')
+            logger.warning(f'[PRÉ-GERAÇÃO] {self.nome} excedeu {self.timeout:.1f}s - usando valor degradado')
+        except Exception as e:
+            metrics.incrementar(f'pregeracao.{self.nome}.erro')
+            logger.warning(f'[PRÉ-GERAÇÃO] Erro em {self.nome}: {e} - usando valor degradado')
+        return self.padrao()
+
+
+def iniciar(nome: str, funcao: Callable[[], Any], timeout: float, padrao: Callable[[], Any]) -> Pendente:
+    """
+    Começa uma chamada no pool e retorna sem esperar
+
+    Para sobrepor a chamada a um trabalho que precisa ficar na thread atual
+    (ex: query na Session do SQLAlchemy, que não é thread-safe).
+    """
+    return Pendente(nome, funcao, timeout, padrao)
+
+
+def executar_em_paralelo(chamadas: Chamadas) -> Dict[str, Any]:
+    """
+    Executa as chamadas ao mesmo tempo e espera cada uma até o seu timeout
+
+    Args:
+        chamadas: nome -> (função sem argumentos, timeout em segundos, padrão)
+
+    Returns:
+        nome -> retorno da função, ou do padrão em timeout/erro
+    """
+    inicio = time.monotonic()
+    pendentes = {nome: iniciar(nome, *chamada) for nome, chamada in chamadas.items()}
+    resultados = {nome: pendente.resultado() for nome, pendente in pendentes.items()}
+    metrics.observar('pregeracao.duracao_segundos', time.monotonic() - inicio)
+    return resultados
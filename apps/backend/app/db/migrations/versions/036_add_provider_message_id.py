@@ -0,0 +1,32 @@
+"""add_provider_message_id
+
+Revision ID: 036_add_provider_message_id
+Revises: 035_add_phone_verification
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '036_add_provider_message_id'
+down_revision = '035_add_phone_verification'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ID da mensagem no WhatsApp (deduplicação de reenvios do webhook)
+    op.add_column('mensagens', sa.Column('provider_message_id', sa.String(100), nullable=True))
+    op.create_index(
+        'ix_mensagens_provider_message_id',
+        'mensagens',
+        ['provider_message_id'],
+        unique=True
+    )
+
+
+def downgrade():
+    op.drop_index('ix_mensagens_provider_message_id', table_name='mensagens')
+    op.drop_column('mensagens', 'provider_message_id')
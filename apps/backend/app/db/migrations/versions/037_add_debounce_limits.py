@@ -0,0 +1,27 @@
+"""add_debounce_limits
+
+Revision ID: 037_add_debounce_limits
+Revises: 036_add_provider_message_id
+Create Date: 2026-10-18 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '037_add_debounce_limits'
+down_revision = '036_add_provider_message_id'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Limites do debounce adaptativo por cliente (None = padrão do sistema)
+    op.add_column('configuracoes_bot', sa.Column('debounce_min_segundos', sa.Float(), nullable=True))
+    op.add_column('configuracoes_bot', sa.Column('debounce_max_segundos', sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('configuracoes_bot', 'debounce_max_segundos')
+    op.drop_column('configuracoes_bot', 'debounce_min_segundos')
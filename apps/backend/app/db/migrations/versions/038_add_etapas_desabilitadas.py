@@ -0,0 +1,25 @@
+"""add_etapas_desabilitadas
+
+Revision ID: 038_add_etapas_desabilitadas
+Revises: 037_add_debounce_limits
+Create Date: 2026-10-18 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '038_add_etapas_desabilitadas'
+down_revision = '037_add_debounce_limits'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Etapas opcionais do pipeline de mensagens desabilitadas por cliente
+    op.add_column('configuracoes_bot', sa.Column('etapas_desabilitadas', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('configuracoes_bot', 'etapas_desabilitadas')
@@ -0,0 +1,33 @@
+"""add_hedge_llm
+
+Revision ID: 039_add_hedge_llm
+Revises: 038_add_etapas_desabilitadas
+Create Date: 2026-10-18 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '039_add_hedge_llm'
+down_revision = '038_add_etapas_desabilitadas'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Hedging de chamadas ao LLM: opt-in por cliente e contagem no uso diário
+    op.add_column(
+        'configuracoes_bot',
+        sa.Column('hedge_habilitado', sa.Boolean(), nullable=False, server_default=sa.false())
+    )
+    op.add_column(
+        'uso_openai',
+        sa.Column('chamadas_hedge', sa.Integer(), nullable=False, server_default='0')
+    )
+
+
+def downgrade():
+    op.drop_column('uso_openai', 'chamadas_hedge')
+    op.drop_column('configuracoes_bot', 'hedge_habilitado')
@@ -0,0 +1,25 @@
+"""add_limiar_cache_semantico
+
+Revision ID: 040_add_limiar_cache_semantico
+Revises: 039_add_hedge_llm
+Create Date: 2026-10-18 16:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '040_add_limiar_cache_semantico'
+down_revision = '039_add_hedge_llm'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Similaridade mínima do cache semântico de respostas por cliente (NULL = padrão do sistema)
+    op.add_column('configuracoes_bot', sa.Column('limiar_cache_semantico', sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('configuracoes_bot', 'limiar_cache_semantico')
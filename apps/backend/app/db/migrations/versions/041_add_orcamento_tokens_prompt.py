@@ -0,0 +1,25 @@
+"""add_orcamento_tokens_prompt
+
+Revision ID: 041_add_orcamento_tokens_prompt
+Revises: 040_add_limiar_cache_semantico
+Create Date: 2026-10-18 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '041_add_orcamento_tokens_prompt'
+down_revision = '040_add_limiar_cache_semantico'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Máximo de tokens do prompt enviado ao LLM por cliente (NULL = padrão do sistema)
+    op.add_column('configuracoes_bot', sa.Column('orcamento_tokens_prompt', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('configuracoes_bot', 'orcamento_tokens_prompt')
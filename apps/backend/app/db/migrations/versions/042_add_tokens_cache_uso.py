@@ -0,0 +1,28 @@
+"""add_tokens_cache_uso
+
+Revision ID: 042_add_tokens_cache_uso
+Revises: 041_add_orcamento_tokens_prompt
+Create Date: 2026-10-18 19:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '042_add_tokens_cache_uso'
+down_revision = '041_add_orcamento_tokens_prompt'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tokens do prompt lidos do cache do provedor (prefixo estável por cliente)
+    op.add_column(
+        'uso_openai',
+        sa.Column('tokens_cache', sa.Integer(), nullable=False, server_default='0')
+    )
+
+
+def downgrade():
+    op.drop_column('uso_openai', 'tokens_cache')
@@ -0,0 +1,50 @@
+"""add_cliente_id_mensagens
+
+Revision ID: 043_add_cliente_id_mensagens
+Revises: 042_add_tokens_cache_uso
+Create Date: 2026-10-18 21:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '043_add_cliente_id_mensagens'
+down_revision = '042_add_tokens_cache_uso'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Ids do WhatsApp são únicos por instância: a deduplicação passa a ser por cliente
+    op.add_column('mensagens', sa.Column('cliente_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_mensagens_cliente_id', 'mensagens', 'clientes', ['cliente_id'], ['id']
+    )
+    # Só as mensagens com id do WhatsApp entram na constraint
+    op.execute("""
+        UPDATE mensagens SET cliente_id = conversas.cliente_id
+        FROM conversas
+        WHERE mensagens.conversa_id = conversas.id
+          AND mensagens.provider_message_id IS NOT NULL
+    """)
+
+    op.drop_index('ix_mensagens_provider_message_id', table_name='mensagens')
+    op.create_unique_constraint(
+        'uq_mensagens_cliente_provider_message_id',
+        'mensagens',
+        ['cliente_id', 'provider_message_id']
+    )
+
+
+def downgrade():
+    op.drop_constraint('uq_mensagens_cliente_provider_message_id', 'mensagens', type_='unique')
+    op.create_index(
+        'ix_mensagens_provider_message_id',
+        'mensagens',
+        ['provider_message_id'],
+        unique=True
+    )
+    op.drop_constraint('fk_mensagens_cliente_id', 'mensagens', type_='foreignkey')
+    op.drop_column('mensagens', 'cliente_id')
@@ -1,7 +1,7 @@
 """
 Model para configurações do bot
 """
-from sqlalchemy import Column, Integer, String, Text, Float, ForeignKey, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, Float, Boolean, ForeignKey, DateTime, JSON, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -39,6 +39,22 @@ class ConfiguracaoBot(Base):
     threshold_confianca = Column(Float, default=0.6, nullable=False)
     notificar_email = Column(String(255), nullable=True)
     
+    # Debounce adaptativo (segundos desde a primeira mensagem; None = padrão do sistema)
+    debounce_min_segundos = Column(Float, nullable=True)
+    debounce_max_segundos = Column(Float, nullable=True)
+    
+    # Etapas opcionais do pipeline desabilitadas (ver etapas_mensagem.ETAPAS_OPCIONAIS)
+    etapas_desabilitadas = Column(JSON, nullable=True)
+    
+    # Hedging de chamadas ao LLM (segunda chamada quando a primeira demora; custa mais tokens)
+    hedge_habilitado = Column(Boolean, default=False, nullable=False)
+    
+    # Similaridade mínima do cache semântico de respostas (None = padrão do sistema)
+    limiar_cache_semantico = Column(Float, nullable=True)
+    
+    # Máximo de tokens do prompt enviado ao LLM (None = padrão do sistema)
+    orcamento_tokens_prompt = Column(Integer, nullable=True)
+    
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.db.base import Base
@@ -8,12 +8,21 @@ from app.db.base import Base
 
 class Mensagem(Base):
     __tablename__ = "mensagens"
+    __table_args__ = (
+        # Ids do WhatsApp são únicos por instância, não entre clientes
+        UniqueConstraint('cliente_id', 'provider_message_id', name='uq_mensagens_cliente_provider_message_id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     conversa_id = Column(Integer, ForeignKey("conversas.id"), nullable=True, index=True)
+    cliente_id = Column(Integer, ForeignKey("clientes.id"), nullable=True)
     tipo = Column(String(20), nullable=False)  # 'usuario', 'ia', 'humano'
     conteudo = Column(Text, nullable=False)
     
+    # ID da mensagem no WhatsApp (data.key.id) - evita processar reenvios do webhook.
+    # Cada mensagem do contato é uma linha, então todos os ids de um lote ficam gravados
+    provider_message_id = Column(String(100), nullable=True)
+    
     # Campos de confiança e fallback
     confidence_score = Column(Float, nullable=True)
     fallback_triggered = Column(Boolean, default=False, nullable=False)
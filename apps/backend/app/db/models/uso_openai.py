@@ -31,6 +31,8 @@ class UsoOpenAI(Base):
     
     # Estatísticas
     mensagens_processadas = Column(Integer, default=0, nullable=False)
+    chamadas_hedge = Column(Integer, default=0, nullable=False)  # Mensagens em que o hedge disparou uma segunda chamada
+    tokens_cache = Column(Integer, default=0, nullable=False)  # Tokens do prompt lidos do cache do provedor (parte de tokens_prompt)
     modelo = Column(String(50), nullable=False)
     
     # Timestamps
@@ -5,15 +5,25 @@ from sqlalchemy import text
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+import asyncio
 import logging
 import atexit
 
-from app.services.conversations.message_buffer import buffer_message
+from app.services.conversations.webhook_handler import processar_evento_webhook
+from app.services.conversations.ingestion_stream import publicar_evento
+from app.services.conversations.debounce_scheduler import AgendadorDebounce
+from app.services.conversations.message_buffer import handle_debounce
+from app.services.conversations.pipeline_executor import encerrar as encerrar_pipeline
+from app.services.llm.clients import fechar as fechar_clientes_llm
+from app.services.conversations.webhook_payload import (
+    extrair_evento,
+    motivo_ignorado,
+    decodificar,
+    logar_payload
+)
 from app.db.session import get_db
 from app.api.v1.billing import router as billing_router
 from app.api.v1.auth import router as auth_router
-from app.db.models.instancia_whatsapp import InstanciaWhatsApp, InstanciaStatus
-from app.db.models.cliente import Cliente, ClienteStatus
 from app.core.config import settings
 from app.core.middleware import (
     ErrorHandlerMiddleware, 
@@ -207,6 +217,26 @@ iniciar_scheduler()
 # Registrar função para parar scheduler ao encerrar aplicação
 atexit.register(parar_scheduler)
 
+
+@app.on_event("startup")
+async def iniciar_agendador_debounce():
+    """Inicia o agendador do debounce distribuído (chats com prazo vencido)"""
+    if not settings.DEBOUNCE_POLLER_ENABLED:
+        return
+    app.state.agendador_debounce = AgendadorDebounce(handle_debounce)
+    app.state.tarefa_debounce = asyncio.create_task(app.state.agendador_debounce.executar())
+
+
+@app.on_event("shutdown")
+async def parar_agendador_debounce():
+    """Encerra o agendador e o executor do pipeline aguardando os chats em processamento"""
+    agendador = getattr(app.state, 'agendador_debounce', None)
+    if agendador:
+        agendador.parar()
+        await app.state.tarefa_debounce
+    encerrar_pipeline()
+    fechar_clientes_llm()
+
 @app.get('/health')
 @limiter.limit(f"{settings.RATE_LIMIT_PER_MINUTE}/minute")
 async def health_check(request: Request):
@@ -252,113 +282,37 @@ async def webhook(
     
     Requer API Key no header X-API-Key (se WEBHOOK_API_KEY estiver configurado)
     SEM rate limit - precisa processar todas as mensagens
+    
+    Com WEBHOOK_INGESTION_MODE=stream o evento é apenas validado e enfileirado
+    no Redis Stream; o processamento fica com app.workers.ingestion_worker
     """
     try:
-        data = await request.json()
-        
-        # DEBUG: Logar payload completo
-        logger.info(f"🔍 [DEBUG] Webhook payload: {data}")
-        
-        # Extrair event type
-        event = data.get('event')
-        instance_id = data.get('instance')
-        
-        # Ignorar eventos de presença (digitando, online, etc)
-        if event == 'presence.update':
-            return {'status': 'ignored', 'reason': 'presence_event'}
-        
-        # Processar apenas eventos de mensagens
-        if event != 'messages.upsert':
-            logger.debug(f"⏭️ Evento ignorado: {event}")
-            return {'status': 'ignored', 'reason': 'not_message_event'}
-        
-        # Extrair dados da mensagem
-        message_data = data.get('data', {})
-        
-        # Verificar se data é lista (alguns eventos vêm assim)
-        if isinstance(message_data, list):
-            if len(message_data) == 0:
-                logger.warning("⚠️ Lista de mensagens vazia")
-                return {'status': 'ignored', 'reason': 'empty_list'}
-            message_data = message_data[0]  # Pegar primeira mensagem
-        
-        # Extrair chat_id e mensagem
-        chat_id = message_data.get('key', {}).get('remoteJid')
-        from_me = message_data.get('key', {}).get('fromMe', False)
-        message = message_data.get('message', {}).get('conversation')
-        
-        # IGNORAR MENSAGENS ENVIADAS PELO PRÓPRIO BOT
-        if from_me:
-            logger.info(f"⏭️ Mensagem própria ignorada: {chat_id}")
-            return {'status': 'ignored', 'reason': 'own_message'}
-        
-        # Tentar outros formatos de mensagem
-        if not message:
-            msg_obj = message_data.get('message', {})
-            message = (
-                msg_obj.get('extendedTextMessage', {}).get('text') or
-                msg_obj.get('imageMessage', {}).get('caption') or
-                msg_obj.get('videoMessage', {}).get('caption')
-            )
-        
-        # Validações básicas
-        if not chat_id or not message:
-            logger.warning(f"⚠️ Webhook sem chat_id ou message | event: {event}")
-            return {'status': 'ignored', 'reason': 'missing_data'}
-        
-        # Ignorar mensagens de grupo
-        if '@g.us' in chat_id:
-            logger.info(f"⚠️ Mensagem de grupo ignorada: {chat_id}")
-            return {'status': 'ignored', 'reason': 'group_message'}
-        
-        logger.info(f"📥 Mensagem recebida: {chat_id} | Instance: {instance_id}")
-        
-        # Buscar instância e cliente
-        instancia = None
-        cliente = None
-        
-        if instance_id:
-            # Buscar por instance_id
-            instancia = db.query(InstanciaWhatsApp).filter(
-                InstanciaWhatsApp.instance_id == instance_id
-            ).first()
-            
-            if instancia:
-                cliente = instancia.cliente
-                logger.info(f"✅ Cliente identificado: ID={cliente.id} | Email={cliente.email}")
+        corpo = await request.body()
         
-        # Se não encontrou por instance_id, tentar por número
-        if not cliente:
-            # Extrair número do chat_id (remover @s.whatsapp.net)
-            numero = chat_id.replace('@s.whatsapp.net', '')
-            
-            instancia = db.query(InstanciaWhatsApp).filter(
-                InstanciaWhatsApp.numero == numero
-            ).first()
-            
-            if instancia:
-                cliente = instancia.cliente
-                logger.info(f"✅ Cliente identificado por número: ID={cliente.id} | Email={cliente.email}")
+        # Descartar eventos ignorados (presença, status...) sem decodificar o payload
+        evento = extrair_evento(corpo)
+        logar_payload(corpo, evento)
         
-        # Se não encontrou cliente, logar e ignorar
-        if not cliente:
-            logger.warning(f"⚠️ Cliente não encontrado para chat_id: {chat_id} | instance: {instance_id}")
-            return {'status': 'ignored', 'reason': 'client_not_found'}
+        motivo = motivo_ignorado(evento)
+        if motivo:
+            return {'status': 'ignored', 'reason': motivo}
         
-        # Validar assinatura ativa
-        if cliente.status != ClienteStatus.ATIVO:
-            logger.warning(f"⚠️ Cliente {cliente.id} com status {cliente.status} - mensagem ignorada")
-            return {'status': 'ignored', 'reason': 'inactive_subscription'}
+        try:
+            data = decodificar(corpo)
+        except ValueError:
+            logger.warning("⚠️ Webhook com payload inválido")
+            return {'status': 'ignored', 'reason': 'invalid_payload'}
         
-        # Processar mensagem com isolamento por cliente
-        await buffer_message(
-            chat_id=chat_id,
-            message=message,
-            cliente_id=cliente.id  # ← ISOLAMENTO MULTI-TENANT
-        )
+        # presence.update só ajusta o debounce no Redis: sempre inline (sensível a latência)
+        if settings.WEBHOOK_INGESTION_MODE == "stream" and evento != 'presence.update':
+            try:
+                await publicar_evento(corpo)
+                return {'status': 'queued'}
+            except Exception as e:
+                # Redis indisponível: não perder o evento, processar inline
+                logger.error(f"❌ Erro ao enfileirar evento, processando inline: {e}")
         
-        logger.info(f"✅ Mensagem processada para cliente {cliente.id}")
-        return {'status': 'ok'}
+        return await processar_evento_webhook(data, db)
         
     except Exception as e:
         logger.error(f"❌ Erro ao processar webhook: {str(e)}", exc_info=True)
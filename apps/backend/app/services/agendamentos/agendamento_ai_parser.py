@@ -7,16 +7,16 @@ import re
 import json
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
-from openai import OpenAI
-
 from app.core.config import settings
+from app.services.llm.clients import obter_openai
 
 
 class AgendamentoAIParser:
     """Parser de IA para identificar e extrair informações de agendamentos"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        # Cliente compartilhado (pool de conexões reutilizado entre instâncias)
+        self.client = obter_openai(settings.OPENAI_API_KEY)
     
     def detectar_intencao_agendamento(self, mensagem: str) -> bool:
         """
@@ -76,7 +76,8 @@ class AgendamentoService:
         nome_usuario: Optional[str] = None,
         tipo_servico: Optional[str] = None,
         observacoes: Optional[str] = None,
-        mensagem_original: Optional[str] = None
+        mensagem_original: Optional[str] = None,
+        commit: bool = True
     ) -> Agendamento:
         """
         Cria novo agendamento
@@ -89,6 +90,7 @@ class AgendamentoService:
             tipo_servico: Tipo de serviço (opcional)
             observacoes: Observações adicionais (opcional)
             mensagem_original: Mensagem original do usuário (opcional)
+            commit: Se False, só faz flush (o chamador controla a transação)
         
         Returns:
             Agendamento criado
@@ -105,8 +107,11 @@ class AgendamentoService:
         )
         
         db.add(agendamento)
-        db.commit()
-        db.refresh(agendamento)
+        if commit:
+            db.commit()
+            db.refresh(agendamento)
+        else:
+            db.flush()
         return agendamento
     
     @staticmethod
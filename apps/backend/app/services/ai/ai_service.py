@@ -1,15 +1,24 @@
 """
 Service para processar mensagens com IA (RAG + LLM)
 """
+import asyncio
 import logging
-from typing import Dict, List
+import time
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
+from app.core import metrics
 from app.core.config import settings
+from app.core.paralelo import executar_em_paralelo
+from app.services.ai import cache_respostas, prefixo_prompt
+from app.services.llm import circuit_breaker
+from app.services.llm.circuit_breaker import CircuitoAbertoError
+from app.services.llm.clients import obter_chat_model
+from app.services.llm.orcamento_prompt import montar_prompt
+from app.services.llm.segmentador import SegmentadorFrases
 from app.services.rag.vectorstore import buscar_no_vectorstore
 from app.services.conversations.memory import get_session_history
-from app.db.models.ia_configuracao import IAConfiguracao
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +34,8 @@ class AIService:
         tom: str = "casual",
         nome_empresa: str = None,
         primeira_mensagem: bool = False,
-        nome_usuario: str = None
+        nome_usuario: str = None,
+        registrar_uso: bool = True
     ) -> Dict:
         """
         Processa mensagem do usuário e gera resposta com IA
@@ -38,271 +48,805 @@ class AIService:
             nome_empresa: Nome da empresa para saudação
             primeira_mensagem: Se é a primeira mensagem da conversa
             nome_usuario: Nome do usuário (se conhecido)
+            registrar_uso: Se False, não grava o uso de tokens (o chamador grava
+                a partir de 'uso', ex: unit of work do pipeline)
             
         Returns:
-            Dict com 'resposta', 'contexto_usado', 'confianca'
+            Dict com 'resposta', 'contexto_usado', 'confianca', 'uso'
         """
         logger.info(f"Processando mensagem para cliente {cliente_id}: '{mensagem[:50]}...'")
         
-        # 1. Buscar contexto no vectorstore (RAG)
-        contexto_docs = buscar_no_vectorstore(cliente_id, mensagem, k=5)
+        preparacao = AIService.preparar_geracao(cliente_id, chat_id, mensagem)
+        contexto = preparacao['contexto']
+        geracao = AIService.gerar_resposta(
+            cliente_id=cliente_id,
+            chat_id=chat_id,
+            mensagem=mensagem,
+            contexto_texto=contexto['texto'],
+            tom=tom,
+            nome_empresa=nome_empresa,
+            primeira_mensagem=primeira_mensagem,
+            nome_usuario=nome_usuario,
+            registrar_uso=registrar_uso,
+            historico=preparacao['historico']
+        )
+        
+        return {
+            "resposta": geracao['resposta'],
+            "contexto_usado": len(contexto['documentos']),
+            "confianca": contexto['confianca'],
+            "documentos": contexto['documentos'],  # Adicionar documentos para cálculo de confiança
+            "uso": geracao['uso']
+        }
+    
+    @staticmethod
+    def buscar_contexto(cliente_id: int, mensagem: str, embedding: Optional[List[float]] = None) -> Dict:
+        """
+        Busca o contexto da mensagem (RAG, com fallback para o conhecimento do banco)
+        
+        Args:
+            cliente_id: ID do cliente
+            mensagem: Mensagem do usuário
+            embedding: Embedding da mensagem já calculado (evita recalcular)
+            
+        Returns:
+            Dict com 'texto', 'confianca', 'documentos'
+        """
+        # Buscar contexto no vectorstore (RAG)
+        contexto_docs = buscar_no_vectorstore(cliente_id, mensagem, k=5, embedding=embedding)
         
         if not contexto_docs or len(contexto_docs) == 0:
             logger.warning(f"Nenhum embedding encontrado para cliente {cliente_id} - usando conhecimento estruturado")
+            return AIService._contexto_do_banco(cliente_id)
+        
+        # Montar texto do contexto
+        contexto_texto = "\n\n".join([
+            f"[Trecho {i+1}]: {doc['text']}"
+            for i, doc in enumerate(contexto_docs)
+        ])
+        
+        # Calcular confiança média baseada nos scores
+        scores = [doc['score'] for doc in contexto_docs]
+        confianca = 1.0 - (sum(scores) / len(scores))  # Inverter score (menor = melhor)
+        
+        logger.info(f"Contexto encontrado: {len(contexto_docs)} chunks, confiança: {confianca:.2f}")
+        
+        return {
+            "texto": contexto_texto,
+            "confianca": confianca,
+            "documentos": contexto_docs
+        }
+    
+    @staticmethod
+    def _contexto_do_banco(cliente_id: int) -> Dict:
+        """Fallback da busca: conhecimento do cliente direto do banco (sem documentos)"""
+        from app.db.session import SessionLocal
+        from app.services.conhecimento import ConhecimentoService
+        from app.services.conhecimento.estruturador_service import EstruturadorService
+        
+        db = SessionLocal()
+        try:
+            conhecimento = ConhecimentoService.buscar_ou_criar(db, cliente_id)
             
-            # Fallback: buscar conhecimento direto do banco
-            from app.db.session import SessionLocal
-            from app.services.conhecimento import ConhecimentoService
-            from app.services.conhecimento.estruturador_service import EstruturadorService
-            
-            db = SessionLocal()
-            try:
-                conhecimento = ConhecimentoService.buscar_ou_criar(db, cliente_id)
+            # Priorizar JSON estruturado se existir
+            if conhecimento.conteudo_estruturado:
+                logger.info(f"✅ Usando conhecimento estruturado (JSON)")
+                contexto_texto = EstruturadorService.json_para_texto_busca(conhecimento.conteudo_estruturado)
+                confianca = 0.7  # Confiança alta quando usa JSON estruturado
+            elif conhecimento.conteudo_texto and len(conhecimento.conteudo_texto.strip()) > 0:
+                logger.info(f"⚠️ Usando texto direto (JSON não disponível)")
+                contexto_texto = conhecimento.conteudo_texto
+                confianca = 0.5  # Confiança média quando usa texto direto
+            else:
+                contexto_texto = "Nenhum conhecimento disponível."
+                confianca = 0.0
                 
-                # Priorizar JSON estruturado se existir
-                if conhecimento.conteudo_estruturado:
-                    logger.info(f"✅ Usando conhecimento estruturado (JSON)")
-                    contexto_texto = EstruturadorService.json_para_texto_busca(conhecimento.conteudo_estruturado)
-                    confianca = 0.7  # Confiança alta quando usa JSON estruturado
-                elif conhecimento.conteudo_texto and len(conhecimento.conteudo_texto.strip()) > 0:
-                    logger.info(f"⚠️ Usando texto direto (JSON não disponível)")
-                    contexto_texto = conhecimento.conteudo_texto
-                    confianca = 0.5  # Confiança média quando usa texto direto
-                else:
-                    contexto_texto = "Nenhum conhecimento disponível."
-                    confianca = 0.0
-                    
-                logger.info(f"Usando conhecimento: {len(contexto_texto)} chars, confiança: {confianca}")
-            finally:
-                db.close()
-        else:
-            # Montar texto do contexto
-            contexto_texto = "\n\n".join([
-                f"[Trecho {i+1}]: {doc['text']}"
-                for i, doc in enumerate(contexto_docs)
-            ])
-            
-            # Calcular confiança média baseada nos scores
-            scores = [doc['score'] for doc in contexto_docs]
-            confianca = 1.0 - (sum(scores) / len(scores))  # Inverter score (menor = melhor)
-            
-            logger.info(f"Contexto encontrado: {len(contexto_docs)} chunks, confiança: {confianca:.2f}")
+            logger.info(f"Usando conhecimento: {len(contexto_texto)} chars, confiança: {confianca}")
+        finally:
+            db.close()
         
-        # 2. Buscar histórico da conversa (últimas 10 mensagens)
-        session_history = get_session_history(chat_id)
-        historico_mensagens = session_history.messages[-10:] if session_history.messages else []
+        return {
+            "texto": contexto_texto,
+            "confianca": confianca,
+            "documentos": []
+        }
+    
+    @staticmethod
+    def _buscar_historico(chat_id: str) -> List:
+        """Últimas 10 mensagens da conversa (Redis)"""
+        mensagens = get_session_history(chat_id).messages
+        return mensagens[-10:] if mensagens else []
+    
+    @staticmethod
+    def preparar_geracao(
+        cliente_id: int,
+        chat_id: str,
+        mensagem: str,
+        embedding: Optional[List[float]] = None
+    ) -> Dict:
+        """
+        Busca em paralelo o que a geração precisa: contexto, histórico e provedores
         
-        logger.info(f"Histórico: {len(historico_mensagens)} mensagens")
+        Cada leitura tem o próprio timeout (PREGERACAO_TIMEOUT_*) e um valor
+        degradado: busca lenta usa o conhecimento do banco, histórico lento
+        gera sem histórico, e provedores lentos são carregados na geração.
         
-        # 3. Montar prompt baseado no tom
-        system_prompt = AIService._get_system_prompt(tom, contexto_texto, nome_empresa, nome_usuario)
+        Args:
+            cliente_id: ID do cliente
+            chat_id: ID do chat (session_id)
+            mensagem: Mensagem do usuário
+            embedding: Embedding da mensagem já calculado (evita recalcular)
+            
+        Returns:
+            Dict com 'contexto' (retorno de buscar_contexto) e 'historico'
+            (mensagens para gerar_resposta)
+        """
+        from app.services.ia_config_service import IAConfigService
         
-        # 4. Montar mensagens para o LLM
-        messages = [SystemMessage(content=system_prompt)]
+        resultados = executar_em_paralelo({
+            'contexto': (
+                lambda: AIService.buscar_contexto(cliente_id, mensagem, embedding=embedding),
+                settings.PREGERACAO_TIMEOUT_RECUPERACAO,
+                lambda: AIService._contexto_do_banco(cliente_id)
+            ),
+            'historico': (
+                lambda: AIService._buscar_historico(chat_id),
+                settings.PREGERACAO_TIMEOUT_HISTORICO,
+                list
+            ),
+            # Só aquece o cache em memória; a geração lê de lá
+            'provedores': (
+                IAConfigService.listar_provedores,
+                settings.PREGERACAO_TIMEOUT_PROVEDORES,
+                lambda: None
+            ),
+        })
         
-        # Adicionar histórico
-        for msg in historico_mensagens:
-            messages.append(msg)
+        return {
+            "contexto": resultados['contexto'],
+            "historico": resultados['historico']
+        }
+    
+    @staticmethod
+    def gerar_resposta(
+        cliente_id: int,
+        chat_id: str,
+        mensagem: str,
+        contexto_texto: str,
+        tom: str = "casual",
+        nome_empresa: str = None,
+        primeira_mensagem: bool = False,
+        nome_usuario: str = None,
+        registrar_uso: bool = True,
+        historico: Optional[List] = None,
+        orcamento_tokens: Optional[int] = None
+    ) -> Dict:
+        """
+        Gera a resposta com o LLM a partir do contexto já buscado
         
-        # Adicionar mensagem atual
-        messages.append(HumanMessage(content=mensagem))
+        Args:
+            cliente_id: ID do cliente
+            chat_id: ID do chat (session_id)
+            mensagem: Mensagem do usuário
+            contexto_texto: Contexto retornado por buscar_contexto
+            tom: Tom das respostas (formal, casual, tecnico)
+            nome_empresa: Nome da empresa para saudação
+            primeira_mensagem: Se é a primeira mensagem da conversa
+            nome_usuario: Nome do usuário (se conhecido)
+            registrar_uso: Se False, não grava o uso de tokens
+            historico: Histórico já carregado (ver preparar_geracao); None = lê do Redis
+            orcamento_tokens: Máximo de tokens do prompt (None = LLM_PROMPT_MAX_TOKENS)
+            
+        Returns:
+            Dict com 'resposta', 'uso'
+        """
+        messages, session_history = AIService._montar_mensagens(
+            cliente_id, chat_id, mensagem, contexto_texto, tom, nome_empresa, nome_usuario, historico,
+            orcamento_tokens
+        )
         
-        # 5. Chamar IA com fallback automático
         try:
-            from app.db.session import SessionLocal
-            from app.services.ia_config_service import IAConfigService
-            
-            # Buscar TODOS os provedores configurados (ordenados por prioridade)
-            db_config = SessionLocal()
-            try:
-                # Buscar provedor ativo
-                config_ativa = IAConfigService.get_api_key_ativa(db_config)
-                
-                # Buscar todos configurados como backup
-                todos_configs = db_config.query(IAConfiguracao).filter_by(configurado=True).all()
-                
-                # Ordenar: ativo primeiro, depois os outros
-                configs_ordenadas = []
-                if config_ativa:
-                    configs_ordenadas.append(config_ativa)
-                
-                for cfg in todos_configs:
-                    provedor_cfg = (cfg.provedor, cfg.modelo, IAConfigService.decrypt_key(cfg.api_key_encrypted))
-                    if config_ativa and cfg.provedor == config_ativa[0]:
-                        continue  # Já adicionou
-                    configs_ordenadas.append(provedor_cfg)
-                
-            finally:
-                db_config.close()
-            
-            # Tentar cada provedor até funcionar
             ultima_exception = None
+            for provedor, modelo, llm in AIService._candidatos_llm():
+                try:
+                    response = AIService._chamar_llm(provedor, modelo, llm, messages)
+                    break
+                except Exception as e:
+                    ultima_exception = AIService._registrar_falha(provedor, e, ultima_exception)
+            else:
+                raise ultima_exception or CircuitoAbertoError('Todos os provedores LLM com circuito aberto')
             
-            for idx, config in enumerate(configs_ordenadas):
-                provedor, modelo, api_key = config
-                
+            return AIService._finalizar_resposta(
+                cliente_id, mensagem, response, modelo, session_history,
+                primeira_mensagem, registrar_uso
+            )
+        except Exception as e:
+            logger.error(f"Erro ao gerar resposta: {e}")
+            raise
+    
+    @staticmethod
+    async def agerar_resposta(
+        cliente_id: int,
+        chat_id: str,
+        mensagem: str,
+        contexto_texto: str,
+        tom: str = "casual",
+        nome_empresa: str = None,
+        primeira_mensagem: bool = False,
+        nome_usuario: str = None,
+        registrar_uso: bool = True,
+        hedge: bool = False,
+        historico: Optional[List] = None,
+        orcamento_tokens: Optional[int] = None
+    ) -> Dict:
+        """
+        Versão async de gerar_resposta (mesmos argumentos e retorno)
+        
+        A chamada ao LLM usa ainvoke: cancelar a task interrompe a requisição
+        em andamento, e o histórico da sessão só é gravado se a geração terminar.
+        
+        Com hedge=True, se o primeiro provedor não responder dentro do atraso
+        de hedge (percentil LLM_HEDGE_PERCENTIL da latência recente do modelo),
+        a mesma requisição vai para o próximo provedor; vale a primeira
+        resposta e a outra chamada é cancelada (uso['hedge'] = True).
+        """
+        messages, session_history = AIService._montar_mensagens(
+            cliente_id, chat_id, mensagem, contexto_texto, tom, nome_empresa, nome_usuario, historico,
+            orcamento_tokens
+        )
+        
+        try:
+            ultima_exception = None
+            hedge_usado = False
+            resposta_hedge = None
+            candidatos = AIService._candidatos_llm()
+            for provedor, modelo, llm in candidatos:
                 try:
-                    if idx == 0:
-                        logger.info(f"🤖 Tentando {provedor} ({modelo}) - Provedor ativo")
-                    else:
-                        logger.warning(f"🔄 Fallback: Tentando {provedor} ({modelo})")
-                    
-                    # Usar provedor
-                    if provedor == 'openai':
-                        llm = ChatOpenAI(
-                            model=modelo,
-                            temperature=float(settings.OPENAI_MODEL_TEMPERATURE),
-                            openai_api_key=api_key
+                    if hedge:
+                        # Só a primeira tentativa é protegida; depois segue o fallback normal
+                        hedge = False
+                        provedor, modelo, response, hedge_usado, resposta_hedge = await AIService._achamar_com_hedge(
+                            (provedor, modelo, llm), messages, candidatos
                         )
                     else:
-                        # Outros provedores ainda não implementados
-                        continue
-                    
-                    # Tentar gerar resposta
-                    response = llm.invoke(messages)
-                    resposta = response.content
-                    
-                    # ✅ Sucesso! Sair do loop
-                    if idx > 0:
-                        logger.info(f"✅ Fallback bem-sucedido! Usando {provedor}")
+                        response = await AIService._achamar_llm(provedor, modelo, llm, messages)
                     break
-                    
                 except Exception as e:
-                    ultima_exception = e
-                    error_msg = str(e).lower()
+                    ultima_exception = AIService._registrar_falha(provedor, e, ultima_exception)
+            else:
+                raise ultima_exception or CircuitoAbertoError('Todos os provedores LLM com circuito aberto')
+            
+            return AIService._finalizar_resposta(
+                cliente_id, mensagem, response, modelo, session_history,
+                primeira_mensagem, registrar_uso, hedge=hedge_usado, resposta_hedge=resposta_hedge
+            )
+        except Exception as e:
+            logger.error(f"Erro ao gerar resposta: {e}")
+            raise
+    
+    @staticmethod
+    async def agerar_resposta_em_segmentos(
+        cliente_id: int,
+        chat_id: str,
+        mensagem: str,
+        contexto_texto: str,
+        ao_segmento: Callable[[str], Awaitable[bool]],
+        tom: str = "casual",
+        nome_empresa: str = None,
+        primeira_mensagem: bool = False,
+        nome_usuario: str = None,
+        registrar_uso: bool = True,
+        historico: Optional[List] = None,
+        orcamento_tokens: Optional[int] = None
+    ) -> Dict:
+        """
+        Gera a resposta em streaming, entregando segmentos (frases/parágrafos) à medida que chegam
+        
+        Args:
+            ao_segmento: Corrotina chamada com cada segmento completo (ver
+                SegmentadorFrases); retornar False retém o resto da resposta
+                e encerra o streaming
+            (demais argumentos como em gerar_resposta)
+            
+        Returns:
+            Dict com 'resposta' (texto completo, ou None se interrompida),
+            'resposta_llm', 'uso', 'segmentos' (aceitos por ao_segmento) e
+            'interrompida' (retida por ao_segmento ou erro do provedor depois
+            do primeiro segmento)
+        """
+        messages, session_history = AIService._montar_mensagens(
+            cliente_id, chat_id, mensagem, contexto_texto, tom, nome_empresa, nome_usuario, historico,
+            orcamento_tokens
+        )
+        
+        ultima_exception = None
+        for provedor, modelo, llm in AIService._candidatos_llm():
+            segmentador = SegmentadorFrases(
+                minimo_primeiro=settings.LLM_STREAMING_PRIMEIRO_SEGMENTO_MIN,
+                tamanho_alvo=settings.LLM_STREAMING_SEGMENTO_ALVO
+            )
+            aceitos: List[str] = []
+            partes: List[str] = []
+            uso_stream = None
+            interrompida = False
+            inicio = time.monotonic()
+            
+            async def entregar(segmento: str) -> bool:
+                if not aceitos and primeira_mensagem:
+                    segmento = AIService._adicionar_saudacao(segmento)
+                if not await ao_segmento(segmento):
+                    return False
+                aceitos.append(segmento)
+                return True
+            
+            falhou = False
+            erro_provedor = False
+            stream = llm.astream(messages, stream_usage=True)
+            try:
+                while not interrompida:
+                    # Só erros do provedor contam como falha (erros de ao_segmento propagam)
+                    try:
+                        chunk = await stream.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    except Exception as e:
+                        circuit_breaker.registrar(provedor, modelo, False, time.monotonic() - inicio)
+                        if not aceitos:
+                            ultima_exception = AIService._registrar_falha(provedor, e, ultima_exception)
+                            falhou = True
+                            break
+                        # Parte da resposta já foi entregue: não dá para tentar outro provedor
+                        logger.error(f"❌ Streaming de {provedor} interrompido após {len(aceitos)} segmento(s): {e}")
+                        interrompida = erro_provedor = True
+                        break
                     
-                    # Detectar erros de limite/quota
-                    if any(x in error_msg for x in ['rate limit', 'quota', 'insufficient', 'exceeded']):
-                        logger.error(f"❌ {provedor} atingiu limite: {e}")
-                        # Tentar próximo
-                        continue
-                    else:
-                        # Outro tipo de erro, tentar próximo também
-                        logger.error(f"❌ Erro em {provedor}: {e}")
+                    if chunk.usage_metadata:
+                        uso_stream = chunk.usage_metadata
+                    if not isinstance(chunk.content, str) or not chunk.content:
                         continue
+                    if not partes:
+                        metrics.observar('llm.streaming.primeiro_token_segundos', time.monotonic() - inicio)
+                    partes.append(chunk.content)
+                    for segmento in segmentador.adicionar(chunk.content):
+                        if not await entregar(segmento):
+                            interrompida = True
+                            break
+            finally:
+                # Fecha a requisição (ex: resposta retida no meio da geração)
+                await stream.aclose()
             
-            # Se nenhum funcionou, tentar .env como último recurso
-            if 'resposta' not in locals():
-                logger.warning(f"⚠️ Todos os provedores falharam, tentando .env como último recurso")
-                try:
-                    llm = ChatOpenAI(
-                        model=settings.OPENAI_MODEL_NAME,
-                        temperature=float(settings.OPENAI_MODEL_TEMPERATURE)
+            if falhou:
+                continue
+            
+            if not interrompida:
+                # Latência só de gerações completas (entra no percentil do hedge)
+                AIService._registrar_sucesso(provedor, modelo, time.monotonic() - inicio)
+                resto = segmentador.finalizar()
+                if resto and not await entregar(resto):
+                    interrompida = True
+            elif not erro_provedor:
+                # Resto retido por ao_segmento: o provedor respondeu bem (sem isso, uma
+                # chamada de teste do circuito meio-aberto nunca teria resultado)
+                circuit_breaker.registrar(provedor, modelo, True, time.monotonic() - inicio)
+            break
+        else:
+            raise ultima_exception or CircuitoAbertoError('Todos os provedores LLM com circuito aberto')
+        
+        uso = {
+            'modelo': modelo,
+            'tokens_prompt': (uso_stream or {}).get('input_tokens', 0),
+            'tokens_completion': (uso_stream or {}).get('output_tokens', 0),
+            'tokens_cache': AIService._tokens_em_cache(uso_stream)
+        }
+        
+        if interrompida:
+            # Histórico com o que o contato recebeu
+            if aceitos:
+                session_history.add_user_message(mensagem)
+                session_history.add_ai_message("\n\n".join(aceitos))
+            return {
+                'resposta': None,
+                'resposta_llm': None,
+                'uso': uso,
+                'segmentos': aceitos,
+                'interrompida': True
+            }
+        
+        resposta_llm = ''.join(partes).strip()
+        resposta = AIService._adicionar_saudacao(resposta_llm) if primeira_mensagem else resposta_llm
+        session_history.add_user_message(mensagem)
+        session_history.add_ai_message(resposta)
+        logger.info(f"Resposta gerada em {len(aceitos)} segmento(s): '{resposta[:50]}...'")
+        
+        return {
+            'resposta': resposta,
+            'resposta_llm': resposta_llm,
+            'uso': uso,
+            'segmentos': aceitos,
+            'interrompida': False
+        }
+    
+    @staticmethod
+    def _montar_mensagens(
+        cliente_id: int,
+        chat_id: str,
+        mensagem: str,
+        contexto_texto: str,
+        tom: str,
+        nome_empresa: str = None,
+        nome_usuario: str = None,
+        historico: Optional[List] = None,
+        orcamento_tokens: Optional[int] = None
+    ) -> Tuple[List, object]:
+        """
+        Monta as mensagens do LLM
+        
+        Ordem: prefixo estável do cliente (ver prefixo_prompt), histórico,
+        trechos da busca + nome do contato e mensagem atual. O que muda a
+        cada mensagem fica no fim, para o provedor reaproveitar o prefixo em
+        cache. Trechos e histórico entram até o orçamento de tokens (ver
+        orcamento_prompt), contados no tokenizer do provedor ativo.
+        """
+        # 2. Histórico da conversa (últimas 10 mensagens), se ainda não foi carregado
+        session_history = get_session_history(chat_id)
+        historico_mensagens = historico if historico is not None else AIService._buscar_historico(chat_id)
+        
+        # 3. Prefixo do cliente (memorizado) e parte dinâmica, dentro do orçamento
+        prefixo = prefixo_prompt.obter(cliente_id, tom, nome_empresa)
+        if prefixo_prompt.ja_no_prefixo(prefixo, contexto_texto):
+            contexto_texto = ""
+        
+        provedores = AIService._provedores_configurados()
+        prompt = montar_prompt(
+            instrucoes=lambda contexto: prefixo_prompt.contexto_dinamico(contexto, nome_usuario),
+            contexto=contexto_texto,
+            historico=historico_mensagens,
+            mensagem=mensagem,
+            orcamento=orcamento_tokens or settings.LLM_PROMPT_MAX_TOKENS,
+            modelo=provedores[0][1] if provedores else settings.OPENAI_MODEL_NAME,
+            prefixo=prefixo['texto']
+        )
+        
+        logger.info(
+            f"Histórico: {len(prompt['historico'])} mensagens, prompt: ~{prompt['tokens']} tokens "
+            f"(prefixo: {prefixo['tokens']})"
+        )
+        
+        # 4. Montar mensagens para o LLM
+        messages = [SystemMessage(content=prefixo['texto'])]
+        messages.extend(prompt['historico'])
+        messages.append(SystemMessage(content=prompt['system_prompt']))
+        messages.append(HumanMessage(content=mensagem))
+        
+        return messages, session_history
+    
+    @staticmethod
+    def _provedores_configurados() -> List[Tuple[str, str, str]]:
+        """Provedores configurados (provedor, modelo, api_key), o ativo primeiro (em cache)"""
+        from app.services.ia_config_service import IAConfigService
+        
+        return IAConfigService.listar_provedores()
+    
+    @staticmethod
+    def _candidatos_llm() -> Iterator[Tuple[str, str, ChatOpenAI]]:
+        """
+        5. LLMs na ordem de tentativa (fallback automático entre provedores)
+        
+        O ativo primeiro, depois os outros configurados e, por último, o
+        modelo do .env. O chamador para no primeiro que responder.
+        Provedores com o circuito aberto são pulados sem chamada (ver
+        circuit_breaker): o chamador registra o resultado de cada tentativa.
+        """
+        for idx, (provedor, modelo, api_key) in enumerate(AIService._provedores_configurados()):
+            if provedor != 'openai':
+                # Outros provedores ainda não implementados
+                continue
+            
+            if not circuit_breaker.permitir(provedor, modelo):
+                logger.warning(f"🔌 {provedor} ({modelo}) com circuito aberto - pulando")
+                continue
+            
+            if idx == 0:
+                logger.info(f"🤖 Tentando {provedor} ({modelo}) - Provedor ativo")
+            else:
+                logger.warning(f"🔄 Fallback: Tentando {provedor} ({modelo})")
+            
+            yield provedor, modelo, obter_chat_model(
+                modelo, api_key=api_key, temperatura=float(settings.OPENAI_MODEL_TEMPERATURE)
+            )
+        
+        if not circuit_breaker.permitir('.env', settings.OPENAI_MODEL_NAME):
+            logger.error(f"🔌 .env ({settings.OPENAI_MODEL_NAME}) com circuito aberto - sem provedor disponível")
+            return
+        
+        logger.warning(f"⚠️ Todos os provedores falharam, tentando .env como último recurso")
+        yield '.env', settings.OPENAI_MODEL_NAME, obter_chat_model(
+            settings.OPENAI_MODEL_NAME, temperatura=float(settings.OPENAI_MODEL_TEMPERATURE)
+        )
+    
+    @staticmethod
+    def _chamar_llm(provedor: str, modelo: str, llm: ChatOpenAI, messages: List):
+        """Chamada ao LLM registrando o resultado no circuit breaker e a latência do modelo"""
+        inicio = time.monotonic()
+        try:
+            response = llm.invoke(messages)
+        except Exception:
+            circuit_breaker.registrar(provedor, modelo, False, time.monotonic() - inicio)
+            raise
+        AIService._registrar_sucesso(provedor, modelo, time.monotonic() - inicio)
+        return response
+    
+    @staticmethod
+    async def _achamar_llm(provedor: str, modelo: str, llm: ChatOpenAI, messages: List):
+        """Versão async de _chamar_llm (cancelamento não conta como falha)"""
+        inicio = time.monotonic()
+        try:
+            response = await llm.ainvoke(messages)
+        except Exception:
+            circuit_breaker.registrar(provedor, modelo, False, time.monotonic() - inicio)
+            raise
+        AIService._registrar_sucesso(provedor, modelo, time.monotonic() - inicio)
+        return response
+    
+    @staticmethod
+    def _registrar_sucesso(provedor: str, modelo: str, duracao: float):
+        circuit_breaker.registrar(provedor, modelo, True, duracao)
+        metrics.observar(f'llm.latencia_segundos.{modelo}', duracao)
+    
+    @staticmethod
+    def _atraso_hedge(modelo: str) -> float:
+        """Quanto esperar pelo primeiro provedor antes de disparar a chamada de hedge"""
+        atraso = metrics.percentil(
+            f'llm.latencia_segundos.{modelo}',
+            settings.LLM_HEDGE_PERCENTIL,
+            minimo_amostras=settings.LLM_HEDGE_AMOSTRAS_MINIMAS
+        )
+        if atraso is None:
+            atraso = settings.LLM_HEDGE_ATRASO_PADRAO_SEGUNDOS
+        return max(atraso, settings.LLM_HEDGE_ATRASO_MINIMO_SEGUNDOS)
+    
+    @staticmethod
+    async def _achamar_com_hedge(
+        primario: Tuple[str, str, ChatOpenAI],
+        messages: List,
+        candidatos: Iterator[Tuple[str, str, ChatOpenAI]]
+    ) -> Tuple[str, str, object, bool, Optional[Tuple[str, object]]]:
+        """
+        Chama o primário e, se passar do atraso de hedge, também o próximo candidato
+        
+        Returns:
+            (provedor, modelo, response, se a chamada de hedge foi disparada,
+            (modelo, response) da outra chamada se ela também terminou - senão
+            foi cancelada e o uso dela não é conhecido)
+        
+        Raises:
+            Erro do primário, se todas as chamadas falharem (erros do
+            secundário são só logados)
+        """
+        provedor, modelo, llm = primario
+        tarefas = {asyncio.ensure_future(AIService._achamar_llm(provedor, modelo, llm, messages)): primario}
+        
+        try:
+            atraso = AIService._atraso_hedge(modelo)
+            concluidas, _ = await asyncio.wait(tarefas, timeout=atraso)
+            if not concluidas:
+                secundario = next(candidatos, None)
+                if secundario is not None:
+                    logger.warning(
+                        f"⏱️ [HEDGE] {provedor} ({modelo}) sem resposta em {atraso:.1f}s - "
+                        f"disparando {secundario[0]} ({secundario[1]})"
                     )
-                    response = llm.invoke(messages)
-                    resposta = response.content
-                    logger.info(f"✅ Fallback .env bem-sucedido!")
-                except Exception as e:
-                    logger.error(f"❌ Até o .env falhou: {e}")
-                    raise ultima_exception or e
+                    metrics.incrementar('llm.hedge.disparados')
+                    tarefas[asyncio.ensure_future(AIService._achamar_llm(*secundario, messages))] = secundario
             
-            # 📊 REGISTRAR USO DA OPENAI (FASE 16.4)
+            erro_primario = None
+            pendentes = set(tarefas)
+            while pendentes:
+                concluidas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+                for tarefa in concluidas:
+                    provedor_tarefa, modelo_tarefa, _ = tarefas[tarefa]
+                    if tarefa.exception() is None:
+                        perdedora = None
+                        if len(tarefas) > 1:
+                            vencedor = 'primario' if tarefas[tarefa] is primario else 'secundario'
+                            metrics.incrementar(f'llm.hedge.vencedor_{vencedor}')
+                            # As duas terminaram juntas: o uso da outra também é conhecido
+                            perdedora = next(
+                                (
+                                    (tarefas[outra][1], outra.result()) for outra in concluidas
+                                    if outra is not tarefa and outra.exception() is None
+                                ),
+                                None
+                            )
+                        return provedor_tarefa, modelo_tarefa, tarefa.result(), len(tarefas) > 1, perdedora
+                    if tarefas[tarefa] is primario:
+                        erro_primario = tarefa.exception()
+                    else:
+                        AIService._registrar_falha(provedor_tarefa, tarefa.exception(), None)
+            raise erro_primario
+        finally:
+            for tarefa in tarefas:
+                if not tarefa.done():
+                    tarefa.cancel()
+    
+    @staticmethod
+    def _registrar_falha(provedor: str, erro: Exception, ultima_exception: Optional[Exception]) -> Exception:
+        """Loga a falha de um provedor e retorna a exceção a propagar se todos falharem"""
+        if provedor == '.env':
+            logger.error(f"❌ Até o .env falhou: {erro}")
+            # Propaga o erro do último provedor configurado, se houver
+            return ultima_exception or erro
+        
+        error_msg = str(erro).lower()
+        
+        # Detectar erros de limite/quota
+        if any(x in error_msg for x in ['rate limit', 'quota', 'insufficient', 'exceeded']):
+            logger.error(f"❌ {provedor} atingiu limite: {erro}")
+        else:
+            logger.error(f"❌ Erro em {provedor}: {erro}")
+        return erro
+    
+    @staticmethod
+    def _tokens_em_cache(usage_metadata: Optional[Dict], token_usage: Optional[Dict] = None) -> int:
+        """Tokens do prompt lidos do cache do provedor (prefixo reaproveitado)"""
+        detalhes = (usage_metadata or {}).get('input_token_details') or {}
+        if detalhes.get('cache_read') is not None:
+            tokens = detalhes['cache_read']
+        else:
+            tokens = ((token_usage or {}).get('prompt_tokens_details') or {}).get('cached_tokens')
+        tokens = int(tokens or 0)
+        if tokens:
+            metrics.incrementar('llm.tokens_cache', tokens)
+        return tokens
+    
+    @staticmethod
+    def _finalizar_resposta(
+        cliente_id: int,
+        mensagem: str,
+        response,
+        modelo_usado: str,
+        session_history,
+        primeira_mensagem: bool,
+        registrar_uso: bool,
+        hedge: bool = False,
+        resposta_hedge: Optional[Tuple[str, object]] = None
+    ) -> Dict:
+        """Uso de tokens, saudação e histórico da sessão a partir da resposta do LLM"""
+        resposta = response.content
+        
+        # 📊 REGISTRAR USO DA OPENAI (FASE 16.4)
+        token_usage = response.response_metadata.get('token_usage', {})
+        uso = {
+            'modelo': modelo_usado,
+            'tokens_prompt': token_usage.get('prompt_tokens', 0),
+            'tokens_completion': token_usage.get('completion_tokens', 0),
+            'tokens_cache': AIService._tokens_em_cache(getattr(response, 'usage_metadata', None), token_usage),
+            'hedge': hedge
+        }
+        if hedge and resposta_hedge is not None:
+            modelo_hedge, response_hedge = resposta_hedge
+            token_usage_hedge = response_hedge.response_metadata.get('token_usage', {})
+            uso['uso_hedge'] = {
+                'modelo': modelo_hedge,
+                'tokens_prompt': token_usage_hedge.get('prompt_tokens', 0),
+                'tokens_completion': token_usage_hedge.get('completion_tokens', 0)
+            }
+        
+        if registrar_uso and (uso['tokens_prompt'] > 0 or uso['tokens_completion'] > 0):
             try:
                 from app.db.session import SessionLocal
                 from app.services.uso import UsoOpenAIService
                 
-                # Extrair tokens da resposta
-                tokens_prompt = response.response_metadata.get('token_usage', {}).get('prompt_tokens', 0)
-                tokens_completion = response.response_metadata.get('token_usage', {}).get('completion_tokens', 0)
-                
-                if tokens_prompt > 0 or tokens_completion > 0:
-                    db = SessionLocal()
-                    try:
-                        UsoOpenAIService.registrar_uso(
-                            db=db,
-                            cliente_id=cliente_id,
-                            modelo=settings.OPENAI_MODEL_NAME,
-                            tokens_prompt=tokens_prompt,
-                            tokens_completion=tokens_completion
-                        )
-                    finally:
-                        db.close()
+                db = SessionLocal()
+                try:
+                    UsoOpenAIService.registrar_uso(db=db, cliente_id=cliente_id, **uso)
+                finally:
+                    db.close()
             except Exception as e:
                 logger.error(f"Erro ao registrar uso OpenAI: {e}")
                 # Não falhar a requisição por erro no registro
-            
-            # 6. Adicionar saudação se for primeira mensagem
-            if primeira_mensagem:
-                from datetime import datetime
-                hora = datetime.now().hour
-                
-                if 5 <= hora < 12:
-                    saudacao = "Bom dia"
-                elif 12 <= hora < 18:
-                    saudacao = "Boa tarde"
-                else:
-                    saudacao = "Boa noite"
-                
-                # Saudação simples sem nome da empresa
-                resposta = f"{saudacao}! Como posso ajudar você?\n\n{resposta}"
-            
-            logger.info(f"Resposta gerada: '{resposta[:50]}...'")
-            
-            # 7. Salvar no histórico
-            session_history.add_user_message(mensagem)
-            session_history.add_ai_message(resposta)
-            
-            return {
-                "resposta": resposta,
-                "contexto_usado": len(contexto_docs),
-                "confianca": confianca,
-                "documentos": contexto_docs  # Adicionar documentos para cálculo de confiança
-            }
-            
-        except Exception as e:
-            logger.error(f"Erro ao gerar resposta: {e}")
-            raise
+        
+        resposta_llm = resposta
+        
+        # 6. Adicionar saudação se for primeira mensagem
+        if primeira_mensagem:
+            resposta = AIService._adicionar_saudacao(resposta)
+        
+        logger.info(f"Resposta gerada: '{resposta[:50]}...'")
+        
+        # 7. Salvar no histórico
+        session_history.add_user_message(mensagem)
+        session_history.add_ai_message(resposta)
+        
+        return {
+            "resposta": resposta,
+            "resposta_llm": resposta_llm,
+            "uso": uso
+        }
+    
+    @staticmethod
+    def _adicionar_saudacao(resposta: str) -> str:
+        """Saudação pela hora do dia (primeira mensagem da conversa)"""
+        from datetime import datetime
+        hora = datetime.now().hour
+        
+        if 5 <= hora < 12:
+            saudacao = "Bom dia"
+        elif 12 <= hora < 18:
+            saudacao = "Boa tarde"
+        else:
+            saudacao = "Boa noite"
+        
+        # Saudação simples sem nome da empresa
+        return f"{saudacao}! Como posso ajudar você?\n\n{resposta}"
     
     @staticmethod
-    def _get_system_prompt(tom: str, contexto: str, nome_empresa: str = None, nome_usuario: str = None) -> str:
+    def responder_do_cache(
+        cliente_id: int,
+        chat_id: str,
+        mensagem: str,
+        tom: str,
+        versao_conhecimento: int,
+        primeira_mensagem: bool = False,
+        nome_usuario: str = None
+    ) -> Optional[Dict]:
         """
-        Gera system prompt baseado no tom e contexto
+        Resposta do cache de perguntas repetidas, sem recuperação nem LLM
+        
+        Aplica a saudação e grava no histórico da sessão como uma resposta
+        gerada (ver cache_respostas).
+        
+        Returns:
+            Dict com 'resposta' e 'confianca', ou None se não houver no cache
         """
-        tom_instrucoes = {
-            "formal": "Você deve ser profissional, respeitoso e usar linguagem formal.",
-            "casual": "Você deve ser amigável, descontraído e usar linguagem casual.",
-            "tecnico": "Você deve ser preciso, técnico e usar terminologia especializada."
-        }
+        acerto = cache_respostas.buscar(cliente_id, mensagem, tom, versao_conhecimento, nome_usuario)
+        if acerto is None:
+            return None
         
-        instrucao_tom = tom_instrucoes.get(tom, tom_instrucoes["casual"])
+        logger.info(f"⚡ Resposta do cache para cliente {cliente_id}")
+        return AIService._responder_com_acerto(chat_id, mensagem, acerto, primeira_mensagem)
+    
+    @staticmethod
+    def responder_do_cache_semantico(
+        cliente_id: int,
+        chat_id: str,
+        mensagem: str,
+        embedding: List[float],
+        tom: str,
+        versao_conhecimento: int,
+        limiar: Optional[float] = None,
+        primeira_mensagem: bool = False,
+        nome_usuario: str = None
+    ) -> Optional[Dict]:
+        """
+        Resposta de uma pergunta semelhante já respondida (cache semântico)
         
-        # Adicionar instrução sobre uso do nome
-        instrucao_nome = ""
-        if nome_usuario:
-            instrucao_nome = f"\n\nIMPORTANTE: O nome do usuário é {nome_usuario}. Use o nome dele nas respostas de forma natural e amigável."
+        Mesmo retorno de responder_do_cache; limiar None usa CACHE_SEMANTICO_LIMIAR.
+        """
+        from app.services.rag import cache_semantico
         
-        return f"""Você é um assistente virtual de atendimento. {instrucao_tom}{instrucao_nome}
-
-REGRAS IMPORTANTES:
-
-1. TOLERÂNCIA COM ERROS:
-   - Seja tolerante com erros de digitação (ex: "queor" = "quero", "cachoro" = "cachorro")
-   - Tente entender a INTENÇÃO da mensagem, não apenas as palavras exatas
-   - Se entender a intenção, responda normalmente
-
-2. SAUDAÇÕES E MENSAGENS GERAIS:
-   - Se a pessoa apenas cumprimentar (oi, olá, bom dia, boa tarde, e aí, etc), responda de forma amigável e pergunte como pode ajudar
-   - Exemplo: "Olá{', ' + nome_usuario if nome_usuario else ''}! Como posso ajudar você hoje?"
-   - Seja natural e receptivo
-
-3. PERGUNTAS ESPECÍFICAS:
-   - Para perguntas sobre produtos/serviços, responda APENAS com base no conhecimento abaixo
-   - Se você REALMENTE não souber ou a informação não estiver no conhecimento, responda EXATAMENTE: "Não tenho essa informação no momento."
-   - IMPORTANTE: Use essa frase exata para que possamos transferir para um atendente humano
-   
-4. PERGUNTAS FORA DO ESCOPO:
-   - Para perguntas não relacionadas ao negócio (hora, tempo, notícias, etc), responda: "Desculpe, só posso ajudar com informações sobre nossos serviços."
-
-5. ESTILO:
-   - Seja conciso (máximo 3 frases)
-   - Seja amigável e prestativo
-   - Não invente informações
-
-CONHECIMENTO DISPONÍVEL:
-{contexto}
-
-Responda de forma natural e útil."""
-
+        acerto = cache_semantico.buscar(
+            cliente_id, embedding, tom, versao_conhecimento, limiar=limiar, nome_usuario=nome_usuario
+        )
+        if acerto is None:
+            return None
+        
+        logger.info(f"⚡ Resposta do cache semântico para cliente {cliente_id} (similaridade {acerto['similaridade']:.3f})")
+        return AIService._responder_com_acerto(chat_id, mensagem, acerto, primeira_mensagem)
+    
+    @staticmethod
+    def _responder_com_acerto(chat_id: str, mensagem: str, acerto: Dict, primeira_mensagem: bool) -> Dict:
+        """Saudação e histórico da sessão para uma resposta vinda de cache"""
+        resposta = acerto['resposta']
+        if primeira_mensagem:
+            resposta = AIService._adicionar_saudacao(resposta)
+        
+        session_history = get_session_history(chat_id)
+        session_history.add_user_message(mensagem)
+        session_history.add_ai_message(resposta)
+        
+        return {'resposta': resposta, 'confianca': acerto['confianca']}
+    
     @staticmethod
     def melhorar_conhecimento(texto: str) -> str:
         """
@@ -317,10 +861,10 @@ Responda de forma natural e útil."""
         logger.info(f"🤖 Melhorando conhecimento com IA: {len(texto)} chars")
         
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL,
-                temperature=0.3,  # Baixa temperatura para respostas mais consistentes
-                api_key=settings.OPENAI_API_KEY
+            llm = obter_chat_model(
+                settings.OPENAI_MODEL_NAME,
+                api_key=settings.OPENAI_API_KEY,
+                temperatura=0.3  # Baixa temperatura para respostas mais consistentes
             )
             
             system_prompt = """Você é um assistente especializado em estruturar e melhorar textos de conhecimento para chatbots.
@@ -0,0 +1,124 @@
+"""
+Cache de respostas para perguntas repetidas (exact match por cliente)
+
+Contatos de um mesmo cliente repetem as mesmas perguntas ("qual o horário?",
+"aceita pix?"). A resposta gerada fica em um LRU em memória com TTL
+(CACHE_RESPOSTAS_TTL), com chave:
+
+    (cliente_id, texto normalizado, tom, versão do conhecimento)
+
+O texto é normalizado (sem acentos, minúsculo, sem pontuação, espaços
+simples). A versão do conhecimento (ConhecimentoService.obter_versao) muda a
+cada atualização, então respostas antigas deixam de ser encontradas em todos
+os processos; o processo que atualizou também limpa as entradas do cliente.
+
+A resposta é guardada sem saudação e com o nome do contato trocado por um
+marcador: a personalização é aplicada depois da busca. Respostas com nome
+não servem para contatos sem nome (tratadas como miss).
+"""
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.core import metrics
+from app.core.config import settings
+
+_MARCADOR_NOME = '\x00nome\x00'
+
+_cache = TTLCache(maxsize=settings.CACHE_RESPOSTAS_MAXSIZE, ttl=settings.CACHE_RESPOSTAS_TTL)
+_lock = threading.Lock()
+
+
+def normalizar(texto: str) -> str:
+    """Texto sem acentos, minúsculo, sem pontuação e com espaços simples"""
+    sem_acentos = ''.join(
+        c for c in unicodedata.normalize('NFKD', texto or '') if not unicodedata.combining(c)
+    )
+    return ' '.join(re.sub(r'[^\w\s]|_', ' ', sem_acentos.lower()).split())
+
+
+def elegivel(mensagem: str) -> bool:
+    """Se a mensagem pode usar o cache (curta e com texto)"""
+    texto = normalizar(mensagem)
+    return bool(texto) and len(texto) <= settings.CACHE_RESPOSTAS_MAX_CARACTERES
+
+
+def _chave(cliente_id: int, mensagem: str, tom: str, versao: int) -> Tuple:
+    return (cliente_id, normalizar(mensagem), tom, versao)
+
+
+def despersonalizar(resposta: str, nome_usuario: Optional[str]) -> str:
+    """Troca o nome do contato na resposta pelo marcador (antes de guardar)"""
+    if not nome_usuario:
+        return resposta
+    return re.sub(rf'\b{re.escape(nome_usuario)}\b', _MARCADOR_NOME, resposta, flags=re.IGNORECASE)
+
+
+def personalizar(resposta: str, nome_usuario: Optional[str]) -> Optional[str]:
+    """Aplica o nome do contato no marcador (None se a resposta pede nome e não há)"""
+    if _MARCADOR_NOME not in resposta:
+        return resposta
+    if not nome_usuario:
+        return None
+    return resposta.replace(_MARCADOR_NOME, nome_usuario)
+
+
+def buscar(
+    cliente_id: int,
+    mensagem: str,
+    tom: str,
+    versao: int,
+    nome_usuario: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Resposta em cache para a mensagem
+
+    Returns:
+        Dict com 'resposta' (já com o nome do contato) e 'confianca', ou None
+    """
+    with _lock:
+        entrada = _cache.get(_chave(cliente_id, mensagem, tom, versao))
+
+    resposta = personalizar(entrada['resposta'], nome_usuario) if entrada is not None else None
+    if resposta is None:
+        metrics.incrementar('cache_respostas.falhas')
+        return None
+
+    metrics.incrementar('cache_respostas.acertos')
+    return {'resposta': resposta, 'confianca': entrada['confianca']}
+
+
+def guardar(
+    cliente_id: int,
+    mensagem: str,
+    tom: str,
+    versao: int,
+    resposta: str,
+    confianca: Optional[float] = None,
+    nome_usuario: Optional[str] = None
+):
+    """Guarda a resposta (sem saudação) gerada para a mensagem"""
+    if not resposta or not elegivel(mensagem):
+        return
+
+    with _lock:
+        _cache[_chave(cliente_id, mensagem, tom, versao)] = {
+            'resposta': despersonalizar(resposta, nome_usuario),
+            'confianca': confianca
+        }
+
+
+def invalidar_cliente(cliente_id: int):
+    """Remove as respostas do cliente deste processo (conhecimento alterado)"""
+    with _lock:
+        for chave in [chave for chave in _cache if chave[0] == cliente_id]:
+            _cache.pop(chave, None)
+
+
+def limpar():
+    """Esvazia o cache (testes)"""
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,172 @@
+"""
+Prefixo estável do prompt por cliente (cache de prompt do provedor)
+
+Provedores como a OpenAI reaproveitam o processamento do início do prompt
+quando ele é idêntico ao de uma chamada recente (a partir de 1024 tokens):
+os tokens em cache custam menos e o primeiro token chega antes. Com o
+contexto da busca e o nome do contato no meio do system prompt, o início
+mudava a cada mensagem e o cache nunca era usado.
+
+As mensagens enviadas ao LLM seguem esta ordem:
+
+    1. system  prefixo do cliente: regras, tom, empresa e resumo do conhecimento
+    2. histórico da conversa
+    3. system  trechos buscados para esta mensagem e nome do contato
+    4. human   mensagem atual
+
+O prefixo só muda quando o cliente muda algo (tom, nome da empresa,
+conhecimento). Ele é montado uma vez por (cliente, versão do conhecimento,
+tom, empresa) e fica em um LRU em memória. A versão do conhecimento
+(ConhecimentoService.obter_versao) muda a cada atualização, em todos os
+processos; o processo que atualizou também limpa as entradas do cliente.
+"""
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from cachetools import LRUCache
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.llm.orcamento_prompt import contar_tokens, cortar_por_linha
+
+logger = logging.getLogger(__name__)
+
+_cache = LRUCache(maxsize=settings.LLM_PREFIXO_MAX_CLIENTES)
+_lock = threading.Lock()
+
+TOM_INSTRUCOES = {
+    "formal": "Você deve ser profissional, respeitoso e usar linguagem formal.",
+    "casual": "Você deve ser amigável, descontraído e usar linguagem casual.",
+    "tecnico": "Você deve ser preciso, técnico e usar terminologia especializada."
+}
+
+
+def _hash(texto: str) -> str:
+    return hashlib.sha256(texto.strip().encode('utf-8')).hexdigest()
+
+
+def montar(tom: str, nome_empresa: Optional[str] = None, resumo: str = '') -> str:
+    """Texto do prefixo: só dados do cliente (nada que mude por mensagem ou contato)"""
+    instrucao_tom = TOM_INSTRUCOES.get(tom, TOM_INSTRUCOES["casual"])
+    empresa = f" da empresa {nome_empresa}" if nome_empresa else ""
+
+    return f"""Você é um assistente virtual de atendimento{empresa}. {instrucao_tom}
+
+REGRAS IMPORTANTES:
+
+1. TOLERÂNCIA COM ERROS:
+   - Seja tolerante com erros de digitação (ex: "queor" = "quero", "cachoro" = "cachorro")
+   - Tente entender a INTENÇÃO da mensagem, não apenas as palavras exatas
+   - Se entender a intenção, responda normalmente
+
+2. SAUDAÇÕES E MENSAGENS GERAIS:
+   - Se a pessoa apenas cumprimentar (oi, olá, bom dia, boa tarde, e aí, etc), responda de forma amigável e pergunte como pode ajudar
+   - Exemplo: "Olá! Como posso ajudar você hoje?" (com o nome do usuário, se ele for informado no fim)
+   - Seja natural e receptivo
+
+3. PERGUNTAS ESPECÍFICAS:
+   - Para perguntas sobre produtos/serviços, responda APENAS com base no conhecimento da empresa abaixo e nos trechos informados no fim da conversa
+   - Se você REALMENTE não souber ou a informação não estiver no conhecimento, responda EXATAMENTE: "Não tenho essa informação no momento."
+   - IMPORTANTE: Use essa frase exata para que possamos transferir para um atendente humano
+
+4. PERGUNTAS FORA DO ESCOPO:
+   - Para perguntas não relacionadas ao negócio (hora, tempo, notícias, etc), responda: "Desculpe, só posso ajudar com informações sobre nossos serviços."
+
+5. ESTILO:
+   - Seja conciso (máximo 3 frases)
+   - Seja amigável e prestativo
+   - Não invente informações
+
+CONHECIMENTO DA EMPRESA:
+{resumo or "Nenhum resumo disponível."}
+
+Responda de forma natural e útil."""
+
+
+def contexto_dinamico(contexto: str, nome_usuario: Optional[str] = None) -> str:
+    """Parte do prompt que muda a cada mensagem (vai depois do histórico)"""
+    partes = [f"CONHECIMENTO RELEVANTE PARA ESTA MENSAGEM:\n{contexto or 'Nenhum trecho adicional.'}"]
+    if nome_usuario:
+        partes.append(
+            f"IMPORTANTE: O nome do usuário é {nome_usuario}. "
+            f"Use o nome dele nas respostas de forma natural e amigável."
+        )
+    return "\n\n".join(partes)
+
+
+def _carregar_resumo(cliente_id: int) -> Tuple[str, str]:
+    """(resumo limitado a LLM_PREFIXO_MAX_TOKENS_RESUMO, texto completo do conhecimento)"""
+    from app.db.session import SessionLocal
+    from app.services.conhecimento import ConhecimentoService
+    from app.services.conhecimento.estruturador_service import EstruturadorService
+
+    db = SessionLocal()
+    try:
+        conhecimento = ConhecimentoService.buscar_ou_criar(db, cliente_id)
+        if conhecimento.conteudo_estruturado:
+            texto = EstruturadorService.json_para_texto_busca(conhecimento.conteudo_estruturado)
+        else:
+            texto = conhecimento.conteudo_texto or ''
+    finally:
+        db.close()
+
+    return cortar_por_linha(texto, settings.LLM_PREFIXO_MAX_TOKENS_RESUMO), texto
+
+
+def obter(cliente_id: int, tom: str, nome_empresa: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Prefixo do cliente (memorizado por versão do conhecimento, tom e empresa)
+
+    Returns:
+        Dict com 'texto', 'tokens' e 'conhecimento_hash' (hash do conhecimento
+        quando ele coube inteiro no resumo; None se foi cortado)
+    """
+    from app.services.conhecimento import ConhecimentoService
+
+    chave = (cliente_id, ConhecimentoService.obter_versao(cliente_id), tom, nome_empresa)
+    with _lock:
+        prefixo = _cache.get(chave)
+    if prefixo is not None:
+        metrics.incrementar('prompt.prefixo.acertos')
+        return prefixo
+
+    metrics.incrementar('prompt.prefixo.falhas')
+    try:
+        resumo, completo = _carregar_resumo(cliente_id)
+    except Exception as e:
+        # Sem resumo o prompt ainda funciona (os trechos vêm no fim); não memoriza
+        logger.warning(f'[PROMPT] Erro ao carregar o resumo do conhecimento do cliente {cliente_id}: {e}')
+        texto = montar(tom, nome_empresa)
+        return {'texto': texto, 'tokens': contar_tokens(texto), 'conhecimento_hash': None}
+
+    texto = montar(tom, nome_empresa, resumo)
+    prefixo = {
+        'texto': texto,
+        'tokens': contar_tokens(texto),
+        'conhecimento_hash': _hash(completo) if completo.strip() and resumo == completo.strip() else None
+    }
+    with _lock:
+        _cache[chave] = prefixo
+
+    logger.info(f'[PROMPT] Prefixo do cliente {cliente_id} montado: {prefixo["tokens"]} tokens')
+    return prefixo
+
+
+def ja_no_prefixo(prefixo: Dict[str, Any], contexto: str) -> bool:
+    """Se o contexto é o conhecimento inteiro, já presente no prefixo (fallback da busca)"""
+    return bool(prefixo.get('conhecimento_hash')) and _hash(contexto or '') == prefixo['conhecimento_hash']
+
+
+def invalidar_cliente(cliente_id: int):
+    """Remove os prefixos do cliente (conhecimento alterado neste processo)"""
+    with _lock:
+        for chave in [chave for chave in _cache if chave[0] == cliente_id]:
+            del _cache[chave]
+
+
+def limpar():
+    """Esvazia o cache (testes)"""
+    with _lock:
+        _cache.clear()
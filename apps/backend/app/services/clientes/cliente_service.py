@@ -10,6 +10,7 @@ from sqlalchemy.orm import Session
 from bcrypt import hashpw, gensalt
 
 from app.db.models.cliente import Cliente, ClienteStatus
+from app.services.whatsapp.tenant_cache import invalidar_cliente
 
 
 class ClienteService:
@@ -78,6 +79,7 @@ class ClienteService:
             cliente_existente.updated_at = datetime.utcnow()
             db.commit()
             db.refresh(cliente_existente)
+            invalidar_cliente(db, cliente_existente.id)
             return cliente_existente, None  # Não retorna senha para cliente existente
         
         # Gera senha aleatória
@@ -142,6 +144,8 @@ class ClienteService:
         db.commit()
         db.refresh(cliente)
         
+        invalidar_cliente(db, cliente.id)
+        
         return cliente
     
     @staticmethod
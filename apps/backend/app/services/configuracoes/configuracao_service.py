@@ -2,9 +2,10 @@
 Service para gerenciar configurações do bot
 """
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional
 
 from app.db.models.configuracao_bot import ConfiguracaoBot, TomEnum
+from app.services.whatsapp.tenant_cache import invalidar_cliente
 
 
 class ConfiguracaoService:
@@ -54,10 +55,20 @@ class ConfiguracaoService:
         mensagem_espera: Optional[str] = None,
         mensagem_retorno_24h: Optional[str] = None,
         threshold_confianca: Optional[float] = None,
-        notificar_email: Optional[str] = None
+        notificar_email: Optional[str] = None,
+        debounce_min_segundos: Optional[float] = None,
+        debounce_max_segundos: Optional[float] = None,
+        etapas_desabilitadas: Optional[List[str]] = None,
+        hedge_habilitado: Optional[bool] = None,
+        limiar_cache_semantico: Optional[float] = None,
+        orcamento_tokens_prompt: Optional[int] = None
     ) -> ConfiguracaoBot:
         """
         Atualiza configurações do bot
+        
+        Raises:
+            ValueError: Se os limites de debounce forem inválidos ou se
+                etapas_desabilitadas tiver etapa que não pode ser desabilitada
         """
         config = ConfiguracaoService.buscar_ou_criar(db, cliente_id)
         
@@ -83,8 +94,40 @@ class ConfiguracaoService:
             config.threshold_confianca = threshold_confianca
         if notificar_email is not None:
             config.notificar_email = notificar_email
+        if debounce_min_segundos is not None:
+            config.debounce_min_segundos = debounce_min_segundos
+        if debounce_max_segundos is not None:
+            config.debounce_max_segundos = debounce_max_segundos
+        if etapas_desabilitadas is not None:
+            from app.services.conversations.etapas_mensagem import ETAPAS_OPCIONAIS
+            invalidas = sorted(set(etapas_desabilitadas) - set(ETAPAS_OPCIONAIS))
+            if invalidas:
+                db.rollback()
+                raise ValueError(
+                    f"Etapas que não podem ser desabilitadas: {', '.join(invalidas)} "
+                    f"(opcionais: {', '.join(ETAPAS_OPCIONAIS)})"
+                )
+            config.etapas_desabilitadas = sorted(set(etapas_desabilitadas))
+        if hedge_habilitado is not None:
+            config.hedge_habilitado = hedge_habilitado
+        if limiar_cache_semantico is not None:
+            config.limiar_cache_semantico = limiar_cache_semantico
+        if orcamento_tokens_prompt is not None:
+            config.orcamento_tokens_prompt = orcamento_tokens_prompt
+        
+        if (
+            config.debounce_min_segundos is not None
+            and config.debounce_max_segundos is not None
+            and config.debounce_min_segundos > config.debounce_max_segundos
+        ):
+            db.rollback()
+            raise ValueError("debounce_min_segundos não pode ser maior que debounce_max_segundos")
         
         db.commit()
         db.refresh(config)
         
+        # Limites de debounce ficam no cache de resolução do webhook
+        if debounce_min_segundos is not None or debounce_max_segundos is not None:
+            invalidar_cliente(db, cliente_id)
+        
         return config
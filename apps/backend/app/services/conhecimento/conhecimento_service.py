@@ -40,6 +40,15 @@ class ConhecimentoService:
         
         return conhecimento
     
+    @staticmethod
+    def obter_versao(cliente_id: int) -> int:
+        """
+        Versão do conhecimento do cliente (contador no Redis, incrementado a
+        cada atualização). Caches de resposta usam a versão na chave.
+        """
+        from app.services.conversations import chat_state
+        return chat_state.versao_conhecimento(cliente_id)
+    
     @staticmethod
     def _limpar_texto_ia(texto: str) -> str:
         """
@@ -176,6 +185,14 @@ class ConhecimentoService:
         db.commit()
         db.refresh(conhecimento)
         
+        from app.services.conversations import chat_state
+        from app.services.ai import cache_respostas, prefixo_prompt
+        from app.services.rag import cache_semantico
+        chat_state.incrementar_versao_conhecimento(cliente_id)
+        cache_respostas.invalidar_cliente(cliente_id)
+        cache_semantico.invalidar_cliente(cliente_id)
+        prefixo_prompt.invalidar_cliente(cliente_id)
+        
         logger.info(f"Conhecimento atualizado para cliente {cliente_id}: {len(conteudo)} chars")
         
         return conhecimento
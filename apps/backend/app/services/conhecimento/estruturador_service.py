@@ -4,10 +4,10 @@ Service para estruturar conhecimento em JSON usando IA
 import logging
 import json
 from typing import Dict, Any
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from app.core.config import settings
+from app.services.llm.clients import obter_chat_model
 
 logger = logging.getLogger(__name__)
 
@@ -110,10 +110,7 @@ REGRAS IMPORTANTES:
 Analise o texto e retorne o JSON estruturado:"""
 
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL_NAME,
-                temperature=0  # Temperatura 0 para ser mais preciso
-            )
+            llm = obter_chat_model(settings.OPENAI_MODEL_NAME, temperatura=0)  # Temperatura 0 para ser mais preciso
             
             messages = [
                 SystemMessage(content=system_prompt),
@@ -206,10 +203,7 @@ NOVO TEXTO COM ATUALIZAÇÕES:
 Analise e retorne o JSON mesclado:"""
 
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL_NAME,
-                temperature=0
-            )
+            llm = obter_chat_model(settings.OPENAI_MODEL_NAME, temperatura=0)
             
             prompt = system_prompt.format(
                 existente_json=existente_texto,
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.db.models.contexto_usuario import ContextoUsuarioWhatsApp
+from app.services.conversations import chat_state
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +28,10 @@ class ContextoUsuarioService:
         Returns:
             bool: True se é primeira interação
         """
+        estado = chat_state.ler(cliente_id, numero_usuario)
+        if estado is not None:
+            return not estado['contexto']
+        
         contexto = db.query(ContextoUsuarioWhatsApp).filter(
             ContextoUsuarioWhatsApp.cliente_id == cliente_id,
             ContextoUsuarioWhatsApp.numero_usuario == numero_usuario
@@ -55,6 +60,8 @@ class ContextoUsuarioService:
         db.commit()
         db.refresh(contexto)
         
+        chat_state.atualizar(cliente_id, numero_usuario, contexto=True)
+        
         logger.info(f"Contexto criado para usuário {numero_usuario} do cliente {cliente_id}")
         
         return contexto
@@ -87,6 +94,11 @@ class ContextoUsuarioService:
             contexto.ultima_interacao = datetime.utcnow()
             db.commit()
             
+            chat_state.atualizar(
+                cliente_id, numero_usuario,
+                nome=nome, ultima_interacao=contexto.ultima_interacao
+            )
+            
             logger.info(f"Nome '{nome}' salvo para usuário {numero_usuario}")
             
             return True
@@ -109,6 +121,10 @@ class ContextoUsuarioService:
         Returns:
             str: Nome do usuário ou None
         """
+        estado = chat_state.ler(cliente_id, numero_usuario)
+        if estado is not None:
+            return estado['nome']
+        
         contexto = db.query(ContextoUsuarioWhatsApp).filter(
             ContextoUsuarioWhatsApp.cliente_id == cliente_id,
             ContextoUsuarioWhatsApp.numero_usuario == numero_usuario
@@ -135,6 +151,7 @@ class ContextoUsuarioService:
             if contexto:
                 contexto.ultima_interacao = datetime.utcnow()
                 db.commit()
+                chat_state.atualizar(cliente_id, numero_usuario, ultima_interacao=contexto.ultima_interacao)
                 
         except Exception as e:
             logger.error(f"Erro ao atualizar última interação: {e}")
@@ -9,11 +9,56 @@ from datetime import datetime
 from app.db.models.conversa import Conversa
 from app.db.models.mensagem import Mensagem
 from app.db.models.cliente import Cliente
+from app.services.conversations import chat_state
 
 
 class ConversaService:
     """Serviço para operações com conversas"""
     
+    @staticmethod
+    def alterar_status(
+        db: Session,
+        conversa: Conversa,
+        status: str,
+        motivo_fallback: Optional[str] = None,
+        commit: bool = True
+    ) -> Conversa:
+        """
+        Altera o status da conversa (único caminho de escrita do status).
+        
+        O status é lido do estado do chat no Redis pelo pipeline (ex: conversa
+        com atendente), então toda alteração grava no banco e depois faz
+        write-through em chat_state.
+        
+        Args:
+            db: Sessão do banco de dados
+            conversa: Conversa (nova ou já carregada)
+            status: Novo status
+            motivo_fallback: Motivo do fallback (None limpa)
+            commit: Se False, só faz flush; o chamador grava o estado do chat
+                depois do commit (unit of work do pipeline)
+        
+        Returns:
+            Conversa atualizada
+        """
+        conversa.status = status
+        conversa.motivo_fallback = motivo_fallback
+        
+        if conversa.id is None:
+            db.add(conversa)
+        
+        if not commit:
+            db.flush()
+            return conversa
+        
+        db.commit()
+        db.refresh(conversa)
+        chat_state.atualizar(
+            conversa.cliente_id, conversa.numero_whatsapp,
+            conversa_id=conversa.id, status=conversa.status
+        )
+        return conversa
+    
     @staticmethod
     def listar_conversas(
         db: Session,
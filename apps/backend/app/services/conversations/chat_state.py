@@ -0,0 +1,156 @@
+"""
+Estado quente do chat no Redis
+
+Um hash por chat (chat:estado:{cliente_id}:{chat_id}) com o que o pipeline
+lê a cada mensagem:
+
+    contexto            "1" se o contexto do usuário já existe (senão, primeira interação)
+    nome                nome do contato ("" = desconhecido)
+    conversa_id         conversa mais recente ("" = nenhuma)
+    status              status da conversa mais recente
+    ultima_interacao    ISO 8601 (UTC)
+    versao_conhecimento versão do conhecimento do cliente vista na última rodada
+
+O registro completo só é criado pelo pipeline, depois de ler o Postgres em
+um cache miss (gravar). Os services que alteram esses dados (contexto,
+fallback) fazem write-through com atualizar(), que só altera registros que
+já existem: um registro parcial nunca é confundido com um cache hit.
+
+A versão do conhecimento é um contador por cliente (INCR a cada alteração
+do conhecimento), lido junto com o hash na mesma ida ao Redis.
+
+Todas as operações são síncronas (o pipeline roda em threads) e falham
+abertas: com o Redis indisponível, o pipeline lê o Postgres.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis.from_url(settings.CACHE_REDIS_URI, decode_responses=True)
+
+CAMPOS = ('contexto', 'nome', 'conversa_id', 'status', 'ultima_interacao', 'versao_conhecimento')
+
+# ARGV[1] = TTL em segundos, ARGV[2..] = campo, valor, ...
+_LUA_ATUALIZAR = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+_atualizar = redis_client.register_script(_LUA_ATUALIZAR)
+
+
+def _chave(cliente_id: int, chat_id: str) -> str:
+    return f'chat:estado:{cliente_id}:{chat_id}'
+
+
+def _chave_versao(cliente_id: int) -> str:
+    return f'conhecimento:versao:{cliente_id}'
+
+
+def _serializar(campos: Dict[str, Any]) -> Dict[str, str]:
+    resultado = {}
+    for campo, valor in campos.items():
+        if valor is None:
+            valor = ''
+        elif isinstance(valor, bool):
+            valor = '1' if valor else '0'
+        elif isinstance(valor, datetime):
+            valor = valor.isoformat()
+        resultado[campo] = str(valor)
+    return resultado
+
+
+def ler(cliente_id: int, chat_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Lê o estado do chat e a versão atual do conhecimento do cliente
+
+    Returns:
+        Dict com os CAMPOS (conversa_id int ou None, contexto bool,
+        versao_conhecimento = versão atual do contador) ou None em cache miss
+    """
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hgetall(_chave(cliente_id, chat_id))
+        pipe.get(_chave_versao(cliente_id))
+        estado, versao = pipe.execute()
+    except Exception as e:
+        logger.warning(f'[CHAT STATE] Redis indisponível, lendo do banco: {e}')
+        return None
+
+    if not estado or any(campo not in estado for campo in CAMPOS):
+        return None
+
+    return {
+        'contexto': estado['contexto'] == '1',
+        'nome': estado['nome'] or None,
+        'conversa_id': int(estado['conversa_id']) if estado['conversa_id'] else None,
+        'status': estado['status'] or None,
+        'ultima_interacao': estado['ultima_interacao'] or None,
+        'versao_conhecimento': int(versao or 0)
+    }
+
+
+def gravar(cliente_id: int, chat_id: str, **campos):
+    """Grava o registro completo do chat (todos os CAMPOS)"""
+    faltando = [campo for campo in CAMPOS if campo not in campos]
+    if faltando:
+        raise ValueError(f'Campos faltando no estado do chat: {", ".join(faltando)}')
+
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(_chave(cliente_id, chat_id), mapping=_serializar(campos))
+        pipe.expire(_chave(cliente_id, chat_id), settings.CHAT_STATE_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f'[CHAT STATE] Erro ao gravar estado de {chat_id}: {e}')
+
+
+def atualizar(cliente_id: int, chat_id: str, **campos):
+    """Write-through: altera campos de um registro existente (sem registro, não faz nada)"""
+    pares = []
+    for campo, valor in _serializar(campos).items():
+        pares.extend([campo, valor])
+    if not pares:
+        return
+
+    try:
+        _atualizar(keys=[_chave(cliente_id, chat_id)], args=[settings.CHAT_STATE_TTL, *pares])
+    except Exception as e:
+        logger.warning(f'[CHAT STATE] Erro ao atualizar estado de {chat_id}: {e}')
+        invalidar(cliente_id, chat_id)
+
+
+def invalidar(cliente_id: int, chat_id: str):
+    """Remove o estado do chat (próxima rodada lê do banco)"""
+    try:
+        redis_client.delete(_chave(cliente_id, chat_id))
+    except Exception as e:
+        logger.warning(f'[CHAT STATE] Erro ao invalidar estado de {chat_id}: {e}')
+
+
+def versao_conhecimento(cliente_id: int) -> int:
+    """Versão atual do conhecimento do cliente (0 se nunca alterado)"""
+    try:
+        return int(redis_client.get(_chave_versao(cliente_id)) or 0)
+    except Exception as e:
+        logger.warning(f'[CHAT STATE] Erro ao ler versão do conhecimento: {e}')
+        return 0
+
+
+def incrementar_versao_conhecimento(cliente_id: int) -> int:
+    """Marca o conhecimento do cliente como alterado"""
+    try:
+        return int(redis_client.incr(_chave_versao(cliente_id)))
+    except Exception as e:
+        logger.warning(f'[CHAT STATE] Erro ao incrementar versão do conhecimento: {e}')
+        return 0
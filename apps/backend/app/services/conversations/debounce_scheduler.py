@@ -0,0 +1,407 @@
+"""
+Debounce distribuído do buffer de mensagens
+
+O prazo de cada chat fica em um sorted set no Redis (membro
+"{cliente_id}|{chat_id}", score = prazo em ms). Cada nova mensagem
+reescreve o prazo (reset do debounce). Qualquer processo que rode o
+AgendadorDebounce (API em modo inline ou worker de ingestão) busca os chats
+vencidos e os reivindica atomicamente via Lua, então o debounce funciona
+com vários workers/hosts e sobrevive a reinícios.
+
+A reivindicação não remove o membro: ela empurra o score para
+agora + DEBOUNCE_LEASE_MS (lease). Se o processo morrer no meio do
+processamento, o chat volta a vencer e é reprocessado por outro worker.
+Cada busca só reivindica tantos chats quantas faixas do executor estão
+livres, e o lock e o lease passam a contar quando a faixa começa a rodada:
+a espera na fila da faixa não consome o lease. Enquanto a rodada roda, o
+lease e o lock são renovados a cada terço de DEBOUNCE_LEASE_MS, então uma
+rodada longa (supersessão, cadeia de provedores, hedge) não deixa o chat
+vencer de novo; o lease só expira se o processo parar de renovar (caiu).
+Ao concluir, o membro só é removido se o score ainda for o do lease, ou
+seja, se nenhuma mensagem nova chegou durante o processamento.
+
+Debounce adaptativo: o prazo usa os eventos presence.update do contato.
+- digitando/gravando: o prazo é estendido (DEBOUNCE_PRESENCE_EXTEND_SECONDS)
+- parou de digitar: o prazo é antecipado para agora
+- sem informação de presença: DEBOUNCE_SECONDS
+Sempre limitado a [primeira mensagem + mínimo, primeira mensagem + máximo],
+com mínimo/máximo configuráveis por cliente.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional, Set, Tuple
+
+import redis.asyncio as redis
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.conversations.sharded_executor import ExecutorParticionado
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis.from_url(settings.CACHE_REDIS_URI, decode_responses=True)
+
+# Presenças que indicam que o contato ainda está escrevendo
+PRESENCAS_ATIVAS = ('composing', 'recording')
+
+# Reivindica o chat se o prazo venceu: score passa a ser o fim do lease.
+# Retorna o início da rodada (ms da primeira mensagem), 0 se desconhecido,
+# ou -1 se não reivindicou.
+_LUA_REIVINDICAR = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) <= tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+    local inicio = redis.call('HGET', KEYS[2], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    return tonumber(inicio) or 0
+end
+return -1
+"""
+
+# Nova mensagem: marca o início da rodada e calcula o prazo pela presença
+_LUA_AGENDAR_MENSAGEM = """
+redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2])
+local inicio = tonumber(redis.call('HGET', KEYS[2], ARGV[1]))
+local agora = tonumber(ARGV[2])
+local minimo = tonumber(ARGV[4])
+local maximo = tonumber(ARGV[5])
+local presenca = redis.call('GET', KEYS[3])
+local espera = tonumber(ARGV[3])
+if presenca == 'composing' or presenca == 'recording' then
+    espera = tonumber(ARGV[6])
+elseif presenca then
+    espera = 0
+end
+local prazo = math.min(agora + espera, inicio + maximo)
+prazo = math.max(prazo, inicio + minimo)
+redis.call('ZADD', KEYS[1], prazo, ARGV[1])
+return prazo
+"""
+
+# Evento de presença: guarda a presença e ajusta o prazo da rodada pendente
+_LUA_PRESENCA = """
+redis.call('SET', KEYS[3], ARGV[3], 'PX', ARGV[7])
+local inicio = redis.call('HGET', KEYS[2], ARGV[1])
+local atual = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not inicio or not atual then
+    return -1
+end
+inicio = tonumber(inicio)
+atual = tonumber(atual)
+local agora = tonumber(ARGV[2])
+local prazo
+if ARGV[3] == 'composing' or ARGV[3] == 'recording' then
+    prazo = math.max(atual, math.min(agora + tonumber(ARGV[6]), inicio + tonumber(ARGV[5])))
+else
+    prazo = math.min(atual, math.max(agora, inicio + tonumber(ARGV[4])))
+end
+redis.call('ZADD', KEYS[1], 'XX', prazo, ARGV[1])
+return prazo
+"""
+
+# Estende o lease apenas se o score ainda é o do lease atual (sem mensagens novas)
+_LUA_RENOVAR = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) == tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# Estende o lock do chat apenas se ainda for o nosso
+_LUA_RENOVAR_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Remove o chat apenas se o score ainda é o do lease (sem mensagens novas)
+_LUA_CONCLUIR = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) == tonumber(ARGV[2]) then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+_reivindicar = redis_client.register_script(_LUA_REIVINDICAR)
+_agendar_mensagem = redis_client.register_script(_LUA_AGENDAR_MENSAGEM)
+_presenca = redis_client.register_script(_LUA_PRESENCA)
+_renovar = redis_client.register_script(_LUA_RENOVAR)
+_renovar_lock = redis_client.register_script(_LUA_RENOVAR_LOCK)
+_concluir = redis_client.register_script(_LUA_CONCLUIR)
+
+
+def _agora_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def membro(cliente_id: int, chat_id: str) -> str:
+    return f'{cliente_id}|{chat_id}'
+
+
+def ler_membro(valor: str) -> Tuple[int, str]:
+    cliente_id, chat_id = valor.split('|', 1)
+    return int(cliente_id), chat_id
+
+
+def _chave_lock(valor: str) -> str:
+    return f'{settings.DEBOUNCE_ZSET_KEY}:lock:{valor}'
+
+
+def _chave_inicio() -> str:
+    return f'{settings.DEBOUNCE_ZSET_KEY}:inicio'
+
+
+def _chave_presenca(valor: str) -> str:
+    return f'{settings.DEBOUNCE_ZSET_KEY}:presenca:{valor}'
+
+
+def _limites_ms(minimo: Optional[float], maximo: Optional[float]) -> Tuple[int, int]:
+    """Limites do cliente (segundos) com fallback para os padrões, em ms"""
+    minimo = settings.DEBOUNCE_MIN_SECONDS if minimo is None else minimo
+    maximo = settings.DEBOUNCE_MAX_SECONDS if maximo is None else maximo
+    return int(minimo * 1000), int(max(minimo, maximo) * 1000)
+
+
+async def agendar_no_pipeline(
+    pipe,
+    cliente_id: int,
+    chat_id: str,
+    minimo: Optional[float] = None,
+    maximo: Optional[float] = None
+):
+    """
+    Adiciona ao pipeline a (re)definição do prazo do chat por nova mensagem
+
+    Args:
+        pipe: Pipeline do redis.asyncio (o chamador executa)
+        cliente_id: ID do cliente
+        chat_id: ID do chat
+        minimo: Espera mínima do cliente em segundos (padrão: DEBOUNCE_MIN_SECONDS)
+        maximo: Espera máxima do cliente em segundos (padrão: DEBOUNCE_MAX_SECONDS)
+    """
+    valor = membro(cliente_id, chat_id)
+    minimo_ms, maximo_ms = _limites_ms(minimo, maximo)
+    # Com pipeline, o EVALSHA só é enfileirado (o chamador executa)
+    await _agendar_mensagem(
+        keys=[settings.DEBOUNCE_ZSET_KEY, _chave_inicio(), _chave_presenca(valor)],
+        args=[
+            valor,
+            _agora_ms(),
+            int(float(settings.DEBOUNCE_SECONDS) * 1000),
+            minimo_ms,
+            maximo_ms,
+            int(settings.DEBOUNCE_PRESENCE_EXTEND_SECONDS * 1000)
+        ],
+        client=pipe
+    )
+
+
+async def agendar(cliente_id: int, chat_id: str, atraso_ms: int):
+    """Define o prazo de processamento do chat para daqui a atraso_ms"""
+    await redis_client.zadd(settings.DEBOUNCE_ZSET_KEY, {membro(cliente_id, chat_id): _agora_ms() + atraso_ms})
+
+
+async def registrar_presenca(
+    cliente_id: int,
+    chat_id: str,
+    presenca: str,
+    minimo: Optional[float] = None,
+    maximo: Optional[float] = None
+) -> Optional[int]:
+    """
+    Ajusta o prazo do chat a partir de um evento presence.update
+
+    A presença fica guardada por DEBOUNCE_PRESENCE_TTL_SECONDS para a
+    próxima mensagem do contato, mesmo sem rodada pendente.
+
+    Args:
+        cliente_id: ID do cliente
+        chat_id: ID do chat
+        presenca: composing, recording, paused, available, unavailable
+        minimo: Espera mínima do cliente em segundos
+        maximo: Espera máxima do cliente em segundos
+
+    Returns:
+        Novo prazo em ms, ou None se o chat não tem rodada pendente
+    """
+    valor = membro(cliente_id, chat_id)
+    minimo_ms, maximo_ms = _limites_ms(minimo, maximo)
+    prazo = await _presenca(
+        keys=[settings.DEBOUNCE_ZSET_KEY, _chave_inicio(), _chave_presenca(valor)],
+        args=[
+            valor,
+            _agora_ms(),
+            presenca,
+            minimo_ms,
+            maximo_ms,
+            int(settings.DEBOUNCE_PRESENCE_EXTEND_SECONDS * 1000),
+            int(settings.DEBOUNCE_PRESENCE_TTL_SECONDS * 1000)
+        ]
+    )
+    metrics.incrementar(f'debounce.presenca.{presenca}')
+    return None if prazo == -1 else int(prazo)
+
+
+class AgendadorDebounce:
+    """
+    Poller dos chats com prazo vencido
+
+    Pode rodar em quantos processos forem necessários; cada chat vencido é
+    reivindicado por um único processo. Um lock por chat impede que o mesmo
+    chat seja processado em paralelo quando chega mensagem nova durante o
+    processamento. Dentro do processo, os chats são distribuídos nas faixas
+    do ExecutorParticionado (ordem por chat, paralelismo entre chats); o
+    processo só reivindica chats para as faixas livres, deixando o resto
+    para os outros workers.
+    """
+
+    def __init__(
+        self,
+        processar: Callable[[str, int], Awaitable[None]],
+        executor: Optional[ExecutorParticionado] = None
+    ):
+        """
+        Args:
+            processar: Corrotina processar(chat_id, cliente_id) chamada
+                para cada chat reivindicado
+            executor: Executor particionado (padrão: PIPELINE_LANES faixas)
+        """
+        self._processar = processar
+        self.executor = executor or ExecutorParticionado('pipeline.faixas', settings.PIPELINE_LANES)
+        self._parar = asyncio.Event()
+        self._tarefas: Set[asyncio.Task] = set()
+
+    def parar(self):
+        """Sinaliza para o loop encerrar"""
+        self._parar.set()
+
+    async def executar(self):
+        """Loop principal: busca chats vencidos a cada DEBOUNCE_POLL_INTERVAL_MS"""
+        intervalo = settings.DEBOUNCE_POLL_INTERVAL_MS / 1000
+        self.executor.iniciar()
+        logger.info('[DEBOUNCE] Agendador iniciado')
+
+        while not self._parar.is_set():
+            try:
+                await self._despachar_vencidos()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f'[DEBOUNCE] Erro no agendador: {e}', exc_info=True)
+
+            try:
+                await asyncio.wait_for(self._parar.wait(), timeout=intervalo)
+            except asyncio.TimeoutError:
+                pass
+
+        if self._tarefas:
+            logger.info(f'[DEBOUNCE] Aguardando {len(self._tarefas)} chat(s) em processamento')
+            await asyncio.gather(*self._tarefas, return_exceptions=True)
+        await self.executor.parar()
+
+        logger.info('[DEBOUNCE] Agendador encerrado')
+
+    @property
+    def vagas(self) -> int:
+        """Chats que ainda podem ser reivindicados (faixas ativas - chats em andamento)"""
+        return max(0, len(self.executor.faixas_ativas) - len(self._tarefas))
+
+    async def _despachar_vencidos(self):
+        vagas = min(self.vagas, settings.DEBOUNCE_BATCH_SIZE)
+        if not vagas:
+            return  # Faixas ocupadas: os chats vencidos ficam para outro worker ou a próxima busca
+
+        agora = _agora_ms()
+        vencidos = await redis_client.zrangebyscore(
+            settings.DEBOUNCE_ZSET_KEY,
+            '-inf',
+            agora,
+            start=0,
+            num=vagas
+        )
+
+        for valor in vencidos:
+            lease = agora + settings.DEBOUNCE_LEASE_MS
+            inicio = await _reivindicar(
+                keys=[settings.DEBOUNCE_ZSET_KEY, _chave_inicio()],
+                args=[valor, agora, lease]
+            )
+            if inicio == -1:
+                continue  # Outro processo reivindicou ou chegou mensagem nova
+
+            if inicio:
+                # Espera efetiva da rodada: primeira mensagem → processamento
+                metrics.observar('debounce.espera_segundos', (agora - int(inicio)) / 1000)
+
+            tarefa = asyncio.create_task(self._executar_chat(valor, lease))
+            self._tarefas.add(tarefa)
+            tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _executar_chat(self, valor: str, lease: int):
+        """Enfileira o chat reivindicado na sua faixa"""
+        try:
+            await self.executor.executar(valor, lambda: self._rodada(valor, lease))
+        except Exception as e:
+            # Sem concluir: o chat volta a vencer quando o lease expirar
+            logger.error(f'[DEBOUNCE] Erro ao processar {valor}: {e}', exc_info=True)
+
+    async def _rodada(self, valor: str, lease: int):
+        """Rodada do chat já na faixa, com lock por chat; lock e lease contam a partir daqui"""
+        cliente_id, chat_id = ler_membro(valor)
+        chave_lock = _chave_lock(valor)
+        token = str(lease)
+        if not await redis_client.set(chave_lock, token, nx=True, px=settings.DEBOUNCE_LEASE_MS):
+            # Chat ainda em processamento em outro worker: tentar de novo depois
+            await agendar(cliente_id, chat_id, settings.DEBOUNCE_POLL_INTERVAL_MS * 4)
+            logger.info(f'[DEBOUNCE] Chat {chat_id} em processamento, reagendado')
+            return
+
+        async def renovar():
+            nonlocal lease
+            novo_lease = _agora_ms() + settings.DEBOUNCE_LEASE_MS
+            if await _renovar(keys=[settings.DEBOUNCE_ZSET_KEY], args=[valor, lease, novo_lease]):
+                lease = novo_lease
+            # Com mensagem nova o score já é o prazo dela; o lock continua segurando o chat
+            await _renovar_lock(keys=[chave_lock], args=[token, settings.DEBOUNCE_LEASE_MS])
+
+        encerrada = asyncio.Event()
+
+        async def manter_lease():
+            intervalo = settings.DEBOUNCE_LEASE_MS / 3000
+            while True:
+                try:
+                    await asyncio.wait_for(encerrada.wait(), timeout=intervalo)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    await renovar()
+                except Exception as e:
+                    logger.warning(f'[DEBOUNCE] Erro ao renovar lease de {valor}: {e}')
+
+        renovacao = None
+        try:
+            # A espera na fila da faixa não conta: o lease recomeça no início da rodada
+            await renovar()
+            renovacao = asyncio.create_task(manter_lease())
+
+            await self._processar(chat_id, cliente_id)
+            # Sem cancelar no meio de uma renovação: concluir precisa do lease atual
+            encerrada.set()
+            await renovacao
+            await _concluir(keys=[settings.DEBOUNCE_ZSET_KEY], args=[valor, lease])
+        finally:
+            if renovacao and not renovacao.done():
+                renovacao.cancel()
+            # Liberar o lock apenas se ainda for o nosso
+            try:
+                if await redis_client.get(chave_lock) == token:
+                    await redis_client.delete(chave_lock)
+            except Exception as e:
+                logger.warning(f'[DEBOUNCE] Erro ao liberar lock de {valor}: {e}')
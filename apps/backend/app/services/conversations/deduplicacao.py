@@ -0,0 +1,76 @@
+"""
+Deduplicação de mensagens recebidas pelo webhook
+
+A Evolution API reenvia o webhook em caso de timeout. Cada mensagem é
+marcada no Redis (SET NX com TTL) pelo id do WhatsApp (data.key.id);
+reenvios encontram a marca e são descartados antes de qualquer acesso
+ao banco ou chamada de IA.
+"""
+import logging
+from typing import List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis.from_url(settings.CACHE_REDIS_URI, decode_responses=True)
+
+
+def _chave(instance_id: Optional[str], chat_id: str, message_id: str) -> str:
+    return f'webhook:dedup:{instance_id or "-"}:{chat_id}:{message_id}'
+
+
+async def marcar_mensagens(
+    instance_id: Optional[str],
+    mensagens: List[Tuple[str, Optional[str]]]
+) -> List[bool]:
+    """
+    Marca as mensagens como recebidas (uma ida ao Redis para o lote)
+
+    Args:
+        instance_id: Nome da instância enviado pela Evolution API
+        mensagens: Lista de (chat_id, message_id)
+
+    Returns:
+        Lista de bools na mesma ordem: True se a mensagem é nova,
+        False se é reenvio. Mensagens sem id e falhas no Redis são
+        tratadas como novas (fail-open).
+    """
+    resultado = [True] * len(mensagens)
+    indices = [i for i, (_, message_id) in enumerate(mensagens) if message_id]
+    if not indices:
+        return resultado
+
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for i in indices:
+                chat_id, message_id = mensagens[i]
+                pipe.set(_chave(instance_id, chat_id, message_id), 1, nx=True, ex=settings.WEBHOOK_DEDUP_TTL)
+            respostas = await pipe.execute()
+    except Exception as e:
+        logger.warning(f'[DEDUP] Redis indisponível, processando sem deduplicação: {e}')
+        return resultado
+
+    for i, nova in zip(indices, respostas):
+        resultado[i] = bool(nova)
+    return resultado
+
+
+async def desmarcar_mensagens(instance_id: Optional[str], mensagens: List[Tuple[str, Optional[str]]]):
+    """
+    Remove as marcas (ex: processamento falhou e o evento será reentregue)
+
+    Args:
+        instance_id: Nome da instância enviado pela Evolution API
+        mensagens: Lista de (chat_id, message_id)
+    """
+    chaves = [_chave(instance_id, chat_id, message_id) for chat_id, message_id in mensagens if message_id]
+    if not chaves:
+        return
+
+    try:
+        await redis_client.delete(*chaves)
+    except Exception as e:
+        logger.warning(f'[DEDUP] Erro ao remover marcas de deduplicação: {e}')
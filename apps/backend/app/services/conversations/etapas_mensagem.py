@@ -0,0 +1,597 @@
+"""
+Etapas do pipeline de mensagens do WhatsApp
+
+Ordem padrão (ETAPAS_PADRAO):
+    atendimento_humano → primeiro_contato → captura_nome → agendamento →
+    solicitacao_humano → cache_resposta → cache_semantico → recuperacao →
+    geracao → confianca → cache_resposta_gravar → envio (final) →
+    persistencia (final)
+
+Chaves do contexto (ctx.dados):
+    mensagem, session_id, nome_usuario  (entrada)
+    entradas          mensagens do contato na rodada (message_id, texto), uma linha cada na persistência
+    resposta          texto a enviar ao usuário
+    resposta_llm      resposta do LLM sem saudação (guardada no cache)
+    cache_hit         True quando a resposta veio do cache de respostas
+    cache_pendente    True quando a resposta gerada pode ir para o cache
+    embedding         embedding da mensagem (cache semântico, reutilizado na recuperação)
+    contexto, confianca_basica, documentos  (recuperacao)
+    historico         histórico da conversa lido em paralelo com a busca (recuperacao)
+    uso               tokens da geração
+    confianca         score calculado pelo ConfiancaService
+    fallback          True quando a conversa foi para atendimento humano
+    atendimento_humano True quando a conversa já estava com um atendente
+    conversa_id       conversa definida por uma etapa (ex: fallback)
+    enviada           True depois do envio da resposta
+    drenadas          entradas brutas drenadas do buffer pela supersessão
+    reinicios         vezes que a rodada recomeçou (supersessão mudou a intenção)
+"""
+import asyncio
+import logging
+from typing import Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+from app.db.models.conversa import MotivoFallback, StatusConversa
+from app.services.ai import AIService, cache_respostas
+from app.services.confianca import ConfiancaService
+from app.services.fallback import FallbackService
+from app.services.whatsapp.evolution_api import send_whatsapp_message
+from app.services.conversations import supersessao
+from app.services.llm.clients import executar_no_loop
+from app.services.conversations.pipeline_etapas import (
+    CONTINUAR,
+    ENCERRAR,
+    ContextoPipeline,
+    Etapa,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _intencoes(ctx: ContextoPipeline, mensagem: str) -> Tuple[bool, bool]:
+    """Intenções que as etapas anteriores à geração tratam (agendamento, pedido de humano)"""
+    from app.services.agendamentos.agendamento_ai_parser import AgendamentoAIParser
+
+    desabilitadas = ctx.uow.config.etapas_desabilitadas or []
+    return (
+        'agendamento' not in desabilitadas and AgendamentoAIParser().detectar_intencao_agendamento(mensagem),
+        'solicitacao_humano' not in desabilitadas and bool(ConfiancaService.detectar_solicitacao_humano(mensagem))
+    )
+
+
+def _acionar_fallback(ctx: ContextoPipeline, motivo: str):
+    """Aciona o fallback dentro da transação da unit of work"""
+    conversa = FallbackService.acionar_fallback(
+        db=ctx.uow.db,
+        numero_whatsapp=ctx.chat_id,
+        cliente_id=ctx.cliente_id,
+        motivo=motivo,
+        ultima_mensagem=ctx.dados['mensagem'],
+        conversa=ctx.uow.carregar_conversa(),
+        commit=False
+    )
+    ctx.uow.definir_conversa(conversa)
+    ctx.dados['conversa_id'] = conversa.id
+    ctx.dados['fallback'] = True
+
+
+class EtapaAtendimentoHumano(Etapa):
+    """
+    Conversa aguardando atendente: o bot não responde
+
+    A mensagem só é gravada na conversa (visível para o atendente), sem
+    recuperação, LLM ou novo fallback, até a conversa voltar para "ativa".
+    O status vem do estado do chat no Redis (sem ida ao banco).
+    """
+
+    nome = 'atendimento_humano'
+    requer = ('mensagem',)
+    produz = ('atendimento_humano',)
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        uow = ctx.uow
+        if uow.conversa_id is None or uow.conversa_status != StatusConversa.AGUARDANDO_HUMANO.value:
+            return CONTINUAR
+
+        logger.info(f'[FALLBACK] Conversa {uow.conversa_id} com atendente - mensagem encaminhada sem IA')
+        ctx.dados['atendimento_humano'] = True
+        ctx.dados['conversa_id'] = uow.conversa_id
+        return ENCERRAR
+
+
+class EtapaPrimeiroContato(Etapa):
+    """Primeira interação: cria o contexto e pergunta o nome"""
+
+    nome = 'primeiro_contato'
+    requer = ('mensagem',)
+    produz = ('resposta',)
+    opcional = True
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        if not ctx.uow.eh_primeira_interacao:
+            return CONTINUAR
+
+        logger.info(f'[CONTEXTO] Primeira interação de {ctx.chat_id} - perguntando nome')
+        ctx.uow.criar_contexto()
+        ctx.dados['resposta'] = "Olá! 👋 Qual é o seu nome?"
+        return ENCERRAR
+
+
+class EtapaCapturaNome(Etapa):
+    """Usuário sem nome: tenta detectar o nome na mensagem"""
+
+    nome = 'captura_nome'
+    requer = ('mensagem',)
+    produz = ('resposta',)
+    opcional = True
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        from app.services.contexto import ContextoUsuarioService
+
+        if ctx.dados.get('nome_usuario'):
+            return CONTINUAR
+
+        nome_detectado = ContextoUsuarioService.detectar_nome_na_mensagem(ctx.dados['mensagem'])
+        if not nome_detectado:
+            return CONTINUAR
+
+        logger.info(f'[CONTEXTO] Nome detectado: {nome_detectado}')
+        ctx.uow.salvar_nome_usuario(nome_detectado)
+        ctx.dados['nome_usuario'] = nome_detectado
+        ctx.dados['resposta'] = f"Prazer em conhecer você, {nome_detectado}! 😊 Como posso ajudar?"
+        return ENCERRAR
+
+
+class EtapaAgendamento(Etapa):
+    """TASK 10.6: Detecta pedidos de agendamento e cria o agendamento"""
+
+    nome = 'agendamento'
+    requer = ('mensagem',)
+    produz = ('resposta',)
+    opcional = True
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        from app.services.agendamentos import AgendamentoService
+        from app.services.agendamentos.agendamento_ai_parser import AgendamentoAIParser
+
+        mensagem = ctx.dados['mensagem']
+        parser = AgendamentoAIParser()
+
+        if not parser.detectar_intencao_agendamento(mensagem):
+            return CONTINUAR
+
+        logger.info(f'[AGENDAMENTO] Intenção de agendamento detectada: {ctx.chat_id}')
+
+        # Buscar configuração de horários do cliente
+        config_horarios = AgendamentoService.obter_configuracao(ctx.uow.db, ctx.cliente_id)
+        tipos_servico = config_horarios.tipos_servico if config_horarios else None
+
+        info_agendamento = parser.extrair_informacoes_agendamento(mensagem, tipos_servico)
+        if not info_agendamento:
+            return CONTINUAR
+
+        logger.info(f'[AGENDAMENTO] Informações extraídas: {info_agendamento}')
+
+        # Criar agendamento (gravado no commit da unit of work)
+        agendamento = AgendamentoService.criar_agendamento(
+            db=ctx.uow.db,
+            cliente_id=ctx.cliente_id,
+            numero_usuario=ctx.chat_id,
+            nome_usuario=ctx.dados.get('nome_usuario'),
+            data_hora=info_agendamento['data_hora'],
+            tipo_servico=info_agendamento.get('tipo_servico'),
+            observacoes=info_agendamento.get('observacoes'),
+            mensagem_original=mensagem,
+            commit=False
+        )
+        logger.info(f'[AGENDAMENTO] Agendamento criado: ID={agendamento.id}')
+
+        ctx.dados['resposta'] = parser.gerar_mensagem_confirmacao(
+            data_hora=agendamento.data_hora,
+            tipo_servico=agendamento.tipo_servico,
+            nome_usuario=ctx.dados.get('nome_usuario')
+        )
+        return ENCERRAR
+
+
+class EtapaSolicitacaoHumano(Etapa):
+    """Usuário pediu atendimento humano explicitamente"""
+
+    nome = 'solicitacao_humano'
+    requer = ('mensagem',)
+    produz = ('fallback',)
+    opcional = True
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        if not ConfiancaService.detectar_solicitacao_humano(ctx.dados['mensagem']):
+            return CONTINUAR
+
+        logger.info(f'[CONFIANÇA] Cliente solicitou atendimento humano: {ctx.chat_id}')
+        _acionar_fallback(ctx, MotivoFallback.SOLICITACAO_MANUAL.value)
+        return ENCERRAR
+
+
+class EtapaCacheResposta(Etapa):
+    """
+    Pergunta repetida: responde do cache, sem recuperação nem LLM
+
+    Em miss, marca a rodada para a resposta gerada ir para o cache depois
+    de passar pela confiança (cache_resposta_gravar).
+    """
+
+    nome = 'cache_resposta'
+    requer = ('mensagem',)
+    produz = ('resposta',)
+    opcional = True
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        uow = ctx.uow
+        if not cache_respostas.elegivel(ctx.dados['mensagem']):
+            return CONTINUAR
+
+        acerto = AIService.responder_do_cache(
+            cliente_id=ctx.cliente_id,
+            chat_id=ctx.dados['session_id'],
+            mensagem=ctx.dados['mensagem'],
+            tom=uow.config.tom.value,
+            versao_conhecimento=uow.versao_conhecimento,
+            primeira_mensagem=uow.primeira_mensagem,
+            nome_usuario=ctx.dados.get('nome_usuario')
+        )
+        if acerto is None:
+            ctx.dados['cache_pendente'] = True
+            return CONTINUAR
+
+        ctx.dados['resposta'] = acerto['resposta']
+        ctx.dados['confianca'] = acerto['confianca']
+        ctx.dados['cache_hit'] = True
+        return ENCERRAR
+
+
+class EtapaCacheSemantico(Etapa):
+    """
+    Pergunta semelhante a uma já respondida: responde do cache semântico
+
+    Calcula o embedding da mensagem, que a recuperação reutiliza em caso de
+    miss (e que é guardado com a resposta gerada).
+    """
+
+    nome = 'cache_semantico'
+    requer = ('mensagem',)
+    produz = ('resposta',)
+    opcional = True
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        from app.services.rag.vectorstore import embedar_query
+
+        uow = ctx.uow
+        try:
+            embedding = embedar_query(ctx.dados['mensagem'])
+        except Exception as e:
+            logger.warning(f'[CACHE] Erro ao calcular embedding, seguindo sem cache semântico: {e}')
+            return CONTINUAR
+
+        ctx.dados['embedding'] = embedding
+        acerto = AIService.responder_do_cache_semantico(
+            cliente_id=ctx.cliente_id,
+            chat_id=ctx.dados['session_id'],
+            mensagem=ctx.dados['mensagem'],
+            embedding=embedding,
+            tom=uow.config.tom.value,
+            versao_conhecimento=uow.versao_conhecimento,
+            limiar=uow.config.limiar_cache_semantico,
+            primeira_mensagem=uow.primeira_mensagem,
+            nome_usuario=ctx.dados.get('nome_usuario')
+        )
+        if acerto is None:
+            return CONTINUAR
+
+        ctx.dados['resposta'] = acerto['resposta']
+        ctx.dados['confianca'] = acerto['confianca']
+        ctx.dados['cache_hit'] = True
+        return ENCERRAR
+
+
+class EtapaRecuperacao(Etapa):
+    """
+    Busca o contexto da mensagem (RAG) em paralelo com o histórico e os
+    provedores de IA (ver AIService.preparar_geracao)
+    """
+
+    nome = 'recuperacao'
+    requer = ('mensagem',)
+    produz = ('contexto',)
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        preparacao = AIService.preparar_geracao(
+            ctx.cliente_id, ctx.dados['session_id'], ctx.dados['mensagem'],
+            embedding=ctx.dados.get('embedding')
+        )
+        contexto = preparacao['contexto']
+        ctx.dados['historico'] = preparacao['historico']
+        ctx.dados['contexto'] = contexto['texto']
+        ctx.dados['confianca_basica'] = contexto['confianca']
+        ctx.dados['documentos'] = contexto['documentos']
+        return CONTINUAR
+
+
+class EtapaGeracao(Etapa):
+    """
+    Gera a resposta com o LLM (uso de tokens gravado pela persistência)
+
+    Com PIPELINE_SUPERSESSAO_MAX > 0, mensagens novas do chat durante a
+    geração cancelam a chamada e a resposta é gerada de novo para o texto
+    completo (ver supersessao). O hedging (configuracoes_bot.hedge_habilitado)
+    usa esse caminho async.
+
+    Com LLM_STREAMING_HABILITADO, a resposta é enviada por segmentos enquanto
+    é gerada (ver _gerar_em_segmentos); a supersessão não se aplica, porque
+    o que já foi enviado não pode ser substituído.
+    """
+
+    nome = 'geracao'
+    requer = ('mensagem', 'contexto')
+    produz = ('resposta',)
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        uow = ctx.uow
+        tom = uow.config.tom.value
+        logger.info(f'[BUFFER] Usando tom: {tom}, threshold: {uow.config.threshold_confianca}')
+
+        argumentos = dict(
+            cliente_id=ctx.cliente_id,
+            chat_id=ctx.dados['session_id'],
+            tom=tom,
+            nome_empresa=uow.cliente.nome_empresa if uow.cliente else None,
+            primeira_mensagem=uow.primeira_mensagem,
+            nome_usuario=ctx.dados.get('nome_usuario'),
+            registrar_uso=False,
+            historico=ctx.dados.get('historico'),
+            orcamento_tokens=uow.config.orcamento_tokens_prompt
+        )
+
+        if settings.LLM_STREAMING_HABILITADO:
+            return self._gerar_em_segmentos(ctx, argumentos)
+
+        if settings.PIPELINE_SUPERSESSAO_MAX <= 0:
+            geracao = AIService.gerar_resposta(
+                mensagem=ctx.dados['mensagem'],
+                contexto_texto=ctx.dados['contexto'],
+                **argumentos
+            )
+        else:
+            geracao = self._gerar_com_supersessao(ctx, argumentos)
+
+        ctx.dados['resposta'] = geracao['resposta']
+        ctx.dados['resposta_llm'] = geracao['resposta_llm']
+        ctx.dados['uso'] = geracao['uso']
+        return CONTINUAR
+
+    @staticmethod
+    def _gerar_com_supersessao(ctx: ContextoPipeline, argumentos: dict) -> dict:
+        async def gerar(mensagem: str) -> dict:
+            if mensagem != ctx.dados['mensagem']:
+                # Texto novo: contexto buscado de novo para a mensagem completa
+                contexto = await asyncio.to_thread(AIService.buscar_contexto, ctx.cliente_id, mensagem)
+                ctx.dados.pop('embedding', None)  # Era da mensagem anterior
+                ctx.dados['mensagem'] = mensagem
+                ctx.dados['contexto'] = contexto['texto']
+                ctx.dados['confianca_basica'] = contexto['confianca']
+                ctx.dados['documentos'] = contexto['documentos']
+
+            return await AIService.agerar_resposta(
+                mensagem=mensagem,
+                contexto_texto=ctx.dados['contexto'],
+                hedge=bool(ctx.uow.config.hedge_habilitado),
+                **argumentos
+            )
+
+        from app.services.conversations.message_buffer import _filtrar_ja_persistidas
+
+        # Rodada já recomeçada PIPELINE_SUPERSESSAO_MAX vezes: segue com a intenção atual
+        pode_reiniciar = ctx.dados.get('reinicios', 0) < settings.PIPELINE_SUPERSESSAO_MAX
+        geracao, _, incorporadas = supersessao.gerar_com_supersessao(
+            ctx.cliente_id, ctx.chat_id, ctx.dados['mensagem'], gerar, ctx.dados.setdefault('drenadas', []),
+            filtrar=lambda entradas: _filtrar_ja_persistidas(ctx.uow.db, ctx.cliente_id, entradas),
+            intencoes=(lambda mensagem: _intencoes(ctx, mensagem)) if pode_reiniciar else None
+        )
+        ctx.dados.setdefault('entradas', []).extend(incorporadas)
+        return geracao
+
+    @staticmethod
+    def _gerar_em_segmentos(ctx: ContextoPipeline, argumentos: dict) -> str:
+        """
+        Streaming: cada segmento é enviado assim que fica completo
+
+        Antes de cada envio a confiança é calculada sobre o texto acumulado
+        (se a etapa confianca estiver habilitada). Abaixo do threshold (ex:
+        apareceu "não tenho essa informação"), o resto da resposta é retido,
+        a geração é encerrada e o fallback é acionado; um stream sem conteúdo
+        também aciona o fallback. Produz 'enviada' e 'confianca': as etapas
+        confianca e envio são puladas.
+        """
+        uow = ctx.uow
+        dados = ctx.dados
+        verificar_confianca = 'confianca' not in (uow.config.etapas_desabilitadas or [])
+        threshold_confianca = uow.config.threshold_confianca
+        acumulado = []
+
+        async def ao_segmento(segmento: str) -> bool:
+            acumulado.append(segmento)
+            if verificar_confianca:
+                confianca = ConfiancaService.calcular_confianca(
+                    query=dados['mensagem'],
+                    documentos=dados.get('documentos') or [],
+                    resposta='\n\n'.join(acumulado)
+                )
+                dados['confianca'] = confianca
+                if ConfiancaService.deve_acionar_fallback(confianca, threshold_confianca):
+                    logger.warning(
+                        f'[CONFIANÇA] Baixa confiança no streaming ({confianca:.2f}) - '
+                        f'retendo o resto da resposta de {ctx.chat_id}'
+                    )
+                    return False
+
+            await asyncio.to_thread(send_whatsapp_message, number=ctx.chat_id, text=segmento)
+            uow.registrar_envio()
+            return True
+
+        geracao = executar_no_loop(AIService.agerar_resposta_em_segmentos(
+            mensagem=dados['mensagem'],
+            contexto_texto=dados['contexto'],
+            ao_segmento=ao_segmento,
+            **argumentos
+        ))
+
+        dados['uso'] = geracao['uso']
+        dados['enviada'] = bool(geracao['segmentos'])
+        logger.info(f'[BUFFER] {len(geracao["segmentos"])} segmento(s) enviados para {ctx.chat_id}')
+
+        if not geracao['segmentos'] and not geracao['interrompida']:
+            # Stream sem conteúdo: a etapa envio seria pulada e o contato ficaria sem resposta
+            metrics.incrementar('llm.streaming.respostas_vazias')
+            logger.warning(f'[BUFFER] Streaming sem conteúdo para {ctx.chat_id} - acionando fallback')
+            dados['resposta'] = None
+            _acionar_fallback(ctx, MotivoFallback.BAIXA_CONFIANCA.value)
+            return ENCERRAR
+
+        if not geracao['interrompida']:
+            dados['resposta'] = geracao['resposta']
+            dados['resposta_llm'] = geracao['resposta_llm']
+            return CONTINUAR
+
+        # Persistência grava como resposta da IA só o que foi enviado
+        dados['resposta'] = '\n\n'.join(geracao['segmentos']) or None
+        _acionar_fallback(ctx, MotivoFallback.BAIXA_CONFIANCA.value)
+        return ENCERRAR
+
+
+class EtapaConfianca(Etapa):
+    """Calcula a confiança da resposta e aciona o fallback se ficar abaixo do threshold"""
+
+    nome = 'confianca'
+    requer = ('mensagem', 'resposta', 'documentos')
+    produz = ('confianca',)
+    opcional = True
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        threshold_confianca = ctx.uow.config.threshold_confianca
+
+        confianca = ConfiancaService.calcular_confianca(
+            query=ctx.dados['mensagem'],
+            documentos=ctx.dados['documentos'],
+            resposta=ctx.dados['resposta']
+        )
+        ctx.dados['confianca'] = confianca
+
+        logger.info(f'[CONFIANÇA] Score calculado: {confianca:.2f} (threshold: {threshold_confianca})')
+
+        if not ConfiancaService.deve_acionar_fallback(confianca, threshold_confianca):
+            logger.info(f'[CONFIANÇA] Confiança OK ({confianca:.2f}) - enviando resposta')
+            return CONTINUAR
+
+        logger.warning(f'[CONFIANÇA] Baixa confiança ({confianca:.2f}) - acionando fallback')
+        # A resposta não é enviada: o FallbackService envia a mensagem de fallback
+        ctx.dados['resposta'] = None
+        _acionar_fallback(ctx, MotivoFallback.BAIXA_CONFIANCA.value)
+        return ENCERRAR
+
+
+class EtapaGravarCacheResposta(Etapa):
+    """Guarda a resposta gerada (aprovada pela confiança) nos caches de respostas"""
+
+    nome = 'cache_resposta_gravar'
+    requer = ('resposta_llm',)
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        from app.services.rag import cache_semantico
+
+        dados = ctx.dados
+        argumentos = dict(
+            cliente_id=ctx.cliente_id,
+            tom=ctx.uow.config.tom.value,
+            versao=ctx.uow.versao_conhecimento,
+            resposta=dados['resposta_llm'],
+            confianca=dados.get('confianca'),
+            nome_usuario=dados.get('nome_usuario')
+        )
+
+        if dados.get('cache_pendente'):
+            cache_respostas.guardar(mensagem=dados['mensagem'], **argumentos)
+        if dados.get('embedding') is not None:
+            cache_semantico.guardar(embedding=dados['embedding'], **argumentos)
+        return CONTINUAR
+
+
+class EtapaEnvio(Etapa):
+    """Envia a resposta ao WhatsApp"""
+
+    nome = 'envio'
+    requer = ('resposta',)
+    produz = ('enviada',)
+    final = True
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        send_whatsapp_message(number=ctx.chat_id, text=ctx.dados['resposta'])
+        ctx.uow.registrar_envio()
+        ctx.dados['enviada'] = True
+        logger.info(f'[BUFFER] Resposta enviada para {ctx.chat_id}')
+        return CONTINUAR
+
+
+class EtapaPersistencia(Etapa):
+    """Grava mensagens, contador de envios e uso em um único commit"""
+
+    nome = 'persistencia'
+    requer = ('mensagem',)
+    final = True
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        uow = ctx.uow
+        dados = ctx.dados
+
+        conversa_id = dados.get('conversa_id')
+        if conversa_id is None:
+            # Resposta da IA vai para a conversa ativa; as demais, para a mais recente
+            respondida_pela_ia = ctx.tem('contexto') or bool(dados.get('cache_hit'))
+            conversa_id = uow.obter_conversa_ativa() if respondida_pela_ia else uow.obter_conversa()
+
+        uow.atualizar_ultima_interacao()
+        # Uma linha por mensagem do contato (todos os ids do lote ficam gravados);
+        # confiança e fallback vão na última, a que foi respondida
+        entradas = dados.get('entradas') or [(None, dados['mensagem'])]
+        for indice, (message_id, texto) in enumerate(entradas):
+            ultima = indice == len(entradas) - 1
+            uow.adicionar_mensagem(
+                conversa_id, "usuario", texto,
+                confidence_score=dados.get('confianca') if ultima else None,
+                fallback_triggered=bool(dados.get('fallback')) and ultima,
+                provider_message_id=message_id
+            )
+        if dados.get('enviada'):
+            uow.adicionar_mensagem(conversa_id, "ia", dados['resposta'], confidence_score=dados.get('confianca'))
+
+        uow.registrar_uso(dados.get('uso'))
+        uow.commit()
+        return CONTINUAR
+
+
+ETAPAS_PADRAO = [
+    EtapaAtendimentoHumano(),
+    EtapaPrimeiroContato(),
+    EtapaCapturaNome(),
+    EtapaAgendamento(),
+    EtapaSolicitacaoHumano(),
+    EtapaCacheResposta(),
+    EtapaCacheSemantico(),
+    EtapaRecuperacao(),
+    EtapaGeracao(),
+    EtapaConfianca(),
+    EtapaGravarCacheResposta(),
+    EtapaEnvio(),
+    EtapaPersistencia(),
+]
+
+# Etapas que o cliente pode desabilitar (ConfiguracaoBot.etapas_desabilitadas)
+ETAPAS_OPCIONAIS = [etapa.nome for etapa in ETAPAS_PADRAO if etapa.opcional]
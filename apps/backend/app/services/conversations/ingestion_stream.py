@@ -0,0 +1,193 @@
+"""
+Fila durável de ingestão do webhook usando Redis Streams
+
+O webhook (modo "stream") apenas publica o evento bruto no stream e responde 200.
+Os workers (app.workers.ingestion_worker) consomem via consumer group, rodam o
+pipeline normal (buffer/IA) e confirmam com XACK. Eventos que ficaram pendentes
+em um worker que morreu são reassumidos após INGESTION_CLAIM_IDLE_MS.
+"""
+import asyncio
+import logging
+from typing import Dict, Any, List, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services.conversations.webhook_payload import decodificar
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis.from_url(settings.CACHE_REDIS_URI, decode_responses=True)
+
+CAMPO_PAYLOAD = 'payload'
+
+
+def _dead_letter_key() -> str:
+    return f'{settings.INGESTION_STREAM_KEY}:dead'
+
+
+async def publicar_evento(payload: bytes) -> str:
+    """
+    Publica o payload bruto do webhook no stream de ingestão
+
+    Args:
+        payload: Corpo do request exatamente como recebido
+
+    Returns:
+        ID da entrada no stream
+    """
+    return await redis_client.xadd(
+        settings.INGESTION_STREAM_KEY,
+        {CAMPO_PAYLOAD: payload.decode('utf-8')},
+        maxlen=settings.INGESTION_STREAM_MAXLEN,
+        approximate=True
+    )
+
+
+class ConsumidorIngestao:
+    """
+    Consumidor do stream de ingestão (um por processo worker)
+
+    Cada consumidor tem um nome único dentro do consumer group; o Redis
+    distribui as entradas entre eles, permitindo escalar workers
+    independentemente dos nós que recebem o webhook.
+    """
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.stream = settings.INGESTION_STREAM_KEY
+        self.grupo = settings.INGESTION_CONSUMER_GROUP
+        self._parar = asyncio.Event()
+
+    async def garantir_grupo(self):
+        """Cria o consumer group (e o stream) se ainda não existirem"""
+        try:
+            await redis_client.xgroup_create(self.stream, self.grupo, id='0', mkstream=True)
+            logger.info(f'[INGESTAO] Consumer group criado: {self.grupo}')
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def parar(self):
+        """Sinaliza para o loop principal encerrar após o lote atual"""
+        self._parar.set()
+
+    async def executar(self):
+        """Loop principal: reassume pendentes e consome novos eventos"""
+        await self.garantir_grupo()
+        logger.info(f'[INGESTAO] Consumidor {self.nome} iniciado no stream {self.stream}')
+
+        # Ao subir, processar primeiro o que ficou pendente para este consumidor
+        await self._processar_entradas(await self._ler('0'))
+
+        while not self._parar.is_set():
+            try:
+                await self._reassumir_pendentes()
+                await self._processar_entradas(await self._ler('>'))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f'[INGESTAO] Erro no loop do consumidor: {e}', exc_info=True)
+                await asyncio.sleep(1)
+
+        logger.info(f'[INGESTAO] Consumidor {self.nome} encerrado')
+
+    async def _ler(self, ultimo_id: str) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        Lê entradas do stream para este consumidor
+
+        Args:
+            ultimo_id: '>' para novas entradas, '0' para as pendentes deste consumidor
+        """
+        resposta = await redis_client.xreadgroup(
+            self.grupo,
+            self.nome,
+            {self.stream: ultimo_id},
+            count=settings.INGESTION_BATCH_SIZE,
+            block=settings.INGESTION_BLOCK_MS if ultimo_id == '>' else None
+        )
+        if not resposta:
+            return []
+        return resposta[0][1]
+
+    async def _reassumir_pendentes(self):
+        """
+        Reassume entradas pendentes há mais de INGESTION_CLAIM_IDLE_MS em
+        outros consumidores (worker caiu no meio do processamento).
+        Entradas que excederam INGESTION_MAX_DELIVERIES vão para a dead-letter.
+        """
+        pendentes = await redis_client.xpending_range(
+            self.stream,
+            self.grupo,
+            min='-',
+            max='+',
+            count=settings.INGESTION_BATCH_SIZE,
+            idle=settings.INGESTION_CLAIM_IDLE_MS
+        )
+        if not pendentes:
+            return
+
+        para_reassumir = []
+        for pendente in pendentes:
+            entrada_id = pendente['message_id']
+            if pendente['times_delivered'] >= settings.INGESTION_MAX_DELIVERIES:
+                await self._mover_para_dead_letter(entrada_id, pendente['times_delivered'])
+            else:
+                para_reassumir.append(entrada_id)
+
+        if not para_reassumir:
+            return
+
+        entradas = await redis_client.xclaim(
+            self.stream,
+            self.grupo,
+            self.nome,
+            min_idle_time=settings.INGESTION_CLAIM_IDLE_MS,
+            message_ids=para_reassumir
+        )
+        logger.warning(f'[INGESTAO] {len(entradas)} eventos pendentes reassumidos por {self.nome}')
+        await self._processar_entradas(entradas)
+
+    async def _mover_para_dead_letter(self, entrada_id: str, entregas: int):
+        """Copia a entrada para o stream de dead-letter e confirma no original"""
+        entradas = await redis_client.xrange(self.stream, min=entrada_id, max=entrada_id)
+        if entradas:
+            _, campos = entradas[0]
+            await redis_client.xadd(
+                _dead_letter_key(),
+                {**campos, 'entrada_original': entrada_id, 'entregas': entregas},
+                maxlen=settings.INGESTION_STREAM_MAXLEN,
+                approximate=True
+            )
+        await redis_client.xack(self.stream, self.grupo, entrada_id)
+        logger.error(f'[INGESTAO] Evento {entrada_id} movido para dead-letter após {entregas} entregas')
+
+    async def _processar_entradas(self, entradas: List[Tuple[str, Dict[str, str]]]):
+        """Processa as entradas em ordem e confirma (XACK) as bem-sucedidas"""
+        from app.services.conversations.webhook_handler import processar_evento_webhook
+
+        for entrada_id, campos in entradas:
+            # Entrada removida do stream (trim) mas ainda pendente
+            if not campos:
+                await redis_client.xack(self.stream, self.grupo, entrada_id)
+                continue
+
+            try:
+                data = decodificar(campos[CAMPO_PAYLOAD].encode('utf-8'))
+            except (KeyError, ValueError) as e:
+                logger.error(f'[INGESTAO] Evento {entrada_id} inválido, descartando: {e}')
+                await redis_client.xack(self.stream, self.grupo, entrada_id)
+                continue
+
+            db = SessionLocal()
+            try:
+                resultado = await processar_evento_webhook(data, db)
+                await redis_client.xack(self.stream, self.grupo, entrada_id)
+                logger.debug(f'[INGESTAO] Evento {entrada_id} processado: {resultado}')
+            except Exception as e:
+                # Sem XACK: a entrada fica pendente e será reassumida depois
+                logger.error(f'[INGESTAO] Erro ao processar evento {entrada_id}: {e}', exc_info=True)
+            finally:
+                db.close()
@@ -1,29 +1,158 @@
 """
 Buffer de mensagens com suporte a multi-tenant
+
+O buffer é por cliente + chat (chave_buffer): o mesmo contato falando com
+dois clientes tem dois buffers, e cada rodada só drena as mensagens do
+próprio cliente.
+
+O debounce é distribuído (ver debounce_scheduler): cada mensagem reescreve
+o prazo do chat no Redis e o AgendadorDebounce chama handle_debounce
+quando o prazo vence.
+
+As operações no buffer são atômicas (Lua):
+- adicionar: RPUSH + EXPIRE em um único comando
+- drenar: LRANGE + DEL no início do processamento; mensagens que chegam
+  durante o processamento vão para um buffer novo e entram na próxima rodada
+- devolver: em caso de erro, as entradas drenadas voltam para o início do buffer
+  e o chat é reagendado (PIPELINE_RETRY_SECONDS, crescendo a cada tentativa);
+  depois de PIPELINE_MAX_TENTATIVAS falhas seguidas o lote é descartado
 """
 import asyncio
+import json
 import redis.asyncio as redis
 import logging
-from collections import defaultdict
-from typing import Optional
+from typing import Optional, List, Tuple
 from sqlalchemy.orm import Session
 
+from app.core import metrics
 from app.core.config import settings
-from app.services.whatsapp.evolution_api import send_whatsapp_message
-from app.services.ai import AIService
-from app.services.confianca import ConfiancaService
-from app.services.fallback import FallbackService
 from app.db.session import SessionLocal
 from app.db.models.mensagem import Mensagem
-from app.db.models.conversa import Conversa, StatusConversa, MotivoFallback
+from app.services.conversations.debounce_scheduler import agendar, agendar_no_pipeline
+from app.services.conversations.pipeline_executor import executar_no_pipeline
+from app.services.conversations.pipeline_uow import PipelineUnitOfWork
+from app.services.conversations.pipeline_etapas import ContextoPipeline, ReiniciarRodada, executar_etapas
+from app.services.conversations.etapas_mensagem import ETAPAS_PADRAO
 
 logger = logging.getLogger(__name__)
 
 redis_client = redis.Redis.from_url(settings.CACHE_REDIS_URI, decode_responses=True)
-debounce_tasks = defaultdict(asyncio.Task)
 
+# ARGV[1] = TTL em segundos, ARGV[2..] = entradas
+_LUA_ADICIONAR = """
+local tamanho = redis.call('RPUSH', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return tamanho
+"""
+
+_LUA_DRENAR = """
+local entradas = redis.call('LRANGE', KEYS[1], 0, -1)
+redis.call('DEL', KEYS[1])
+return entradas
+"""
+
+# Recoloca as entradas na frente do buffer, preservando a ordem original
+_LUA_DEVOLVER = """
+for i = #ARGV, 2, -1 do
+    redis.call('LPUSH', KEYS[1], ARGV[i])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return #ARGV - 1
+"""
+
+_adicionar = redis_client.register_script(_LUA_ADICIONAR)
+_drenar = redis_client.register_script(_LUA_DRENAR)
+_devolver = redis_client.register_script(_LUA_DEVOLVER)
+
+
+def chave_buffer(cliente_id: int, chat_id: str) -> str:
+    """Chave do buffer do chat no cliente (também usada pela supersessão)"""
+    return f'{cliente_id}:{chat_id}{settings.BUFFER_KEY_SUFIX}'
+
+
+def _chave_tentativas(buffer_key: str) -> str:
+    return f'{buffer_key}:tentativas'
+
+
+async def _registrar_tentativa(buffer_key: str) -> int:
+    """Conta uma rodada do lote que falhou (zerada quando uma rodada termina)"""
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.incr(_chave_tentativas(buffer_key))
+        pipe.expire(_chave_tentativas(buffer_key), int(settings.BUFFER_TTL))
+        tentativas, _ = await pipe.execute()
+    return int(tentativas)
+
+
+async def _devolver_e_reagendar(chat_id: str, cliente_id: int, buffer_key: str, brutas: List[str]):
+    """Devolve o lote ao buffer e agenda uma nova rodada (ou descarta após PIPELINE_MAX_TENTATIVAS)"""
+    tentativas = await _registrar_tentativa(buffer_key)
+    if tentativas > settings.PIPELINE_MAX_TENTATIVAS:
+        metrics.incrementar('pipeline.lotes_descartados')
+        logger.error(
+            f'[BUFFER] {len(brutas)} mensagem(ns) de {chat_id} descartada(s) após '
+            f'{settings.PIPELINE_MAX_TENTATIVAS} tentativas com erro'
+        )
+        await redis_client.delete(_chave_tentativas(buffer_key))
+        return
 
-async def buffer_message(chat_id: str, message: str, cliente_id: Optional[int] = None):
+    await _devolver(keys=[buffer_key], args=[int(settings.BUFFER_TTL), *brutas])
+    atraso_ms = int(settings.PIPELINE_RETRY_SECONDS * 1000 * tentativas)
+    await agendar(cliente_id, chat_id, atraso_ms)
+    metrics.incrementar('pipeline.rodadas_reagendadas')
+    logger.warning(f'[BUFFER] Lote de {chat_id} devolvido ao buffer, nova tentativa em {atraso_ms} ms')
+
+
+def _serializar_entrada(texto: str, message_id: Optional[str]) -> str:
+    """Entrada do buffer: texto + id da mensagem no WhatsApp"""
+    return json.dumps({'id': message_id, 'text': texto}, ensure_ascii=False)
+
+
+def _ler_entradas(entradas: List[str]) -> List[Tuple[Optional[str], str]]:
+    """Converte as entradas do buffer em (message_id, texto)"""
+    resultado = []
+    for entrada in entradas:
+        try:
+            dados = json.loads(entrada)
+        except ValueError:
+            dados = None
+        if isinstance(dados, dict) and 'text' in dados:
+            resultado.append((dados.get('id'), dados['text']))
+        else:
+            # Entrada em texto puro (buffer gravado antes do formato JSON)
+            resultado.append((None, entrada))
+    return resultado
+
+
+def _filtrar_ja_persistidas(
+    db: Session,
+    cliente_id: int,
+    entradas: List[Tuple[Optional[str], str]]
+) -> List[Tuple[Optional[str], str]]:
+    """Remove entradas cujo id do WhatsApp já foi salvo em mensagens do cliente"""
+    ids = [message_id for message_id, _ in entradas if message_id]
+    if not ids:
+        return entradas
+
+    persistidos = {
+        row.provider_message_id
+        for row in db.query(Mensagem.provider_message_id).filter(
+            Mensagem.cliente_id == cliente_id,
+            Mensagem.provider_message_id.in_(ids)
+        ).all()
+    }
+    if not persistidos:
+        return entradas
+
+    logger.info(f'[BUFFER] {len(persistidos)} mensagem(ns) já processada(s) descartada(s)')
+    return [(message_id, texto) for message_id, texto in entradas if message_id not in persistidos]
+
+
+async def buffer_message(
+    chat_id: str,
+    message: str,
+    cliente_id: Optional[int] = None,
+    message_id: Optional[str] = None
+):
     """
     Adiciona mensagem ao buffer com debounce
     
@@ -31,416 +160,165 @@ async def buffer_message(chat_id: str, message: str, cliente_id: Optional[int] =
         chat_id: ID do chat (número do WhatsApp)
         message: Mensagem recebida
         cliente_id: ID do cliente (para isolamento multi-tenant)
+        message_id: ID da mensagem no WhatsApp (data.key.id)
+    """
+    await buffer_messages(chat_id, [message], cliente_id, [message_id])
+
+
+async def buffer_messages(
+    chat_id: str,
+    messages: List[str],
+    cliente_id: Optional[int] = None,
+    message_ids: Optional[List[Optional[str]]] = None,
+    debounce_min: Optional[float] = None,
+    debounce_max: Optional[float] = None
+):
+    """
+    Adiciona várias mensagens do mesmo chat ao buffer de uma vez
+    
+    Uma única ida ao Redis (RPUSH + EXPIRE em pipeline) e uma única
+    decisão de debounce para o lote inteiro.
+    
+    Args:
+        chat_id: ID do chat (número do WhatsApp)
+        messages: Mensagens recebidas, na ordem de chegada
+        cliente_id: ID do cliente (para isolamento multi-tenant)
+        message_ids: IDs das mensagens no WhatsApp, na mesma ordem
+        debounce_min: Espera mínima do cliente em segundos (None = padrão)
+        debounce_max: Espera máxima do cliente em segundos (None = padrão)
     """
-    buffer_key = f'{chat_id}{settings.BUFFER_KEY_SUFIX}'
+    if not messages:
+        return
 
-    await redis_client.rpush(buffer_key, message)
-    await redis_client.expire(buffer_key, int(settings.BUFFER_TTL))
+    message_ids = message_ids or [None] * len(messages)
+    entradas = [_serializar_entrada(texto, message_id) for texto, message_id in zip(messages, message_ids)]
 
-    logger.info(f'[BUFFER] Mensagem adicionada ao buffer de {chat_id}: {message}')
+    if not cliente_id:
+        logger.error(f'[BUFFER] Cliente ID não fornecido para {chat_id}')
+        return
 
-    if debounce_tasks.get(chat_id):
-        debounce_tasks[chat_id].cancel()
-        logger.info(f'[BUFFER] Debounce resetado para {chat_id}')
+    buffer_key = chave_buffer(cliente_id, chat_id)
 
-    debounce_tasks[chat_id] = asyncio.create_task(
-        handle_debounce(chat_id, cliente_id)
-    )
+    # Buffer + (re)definição do prazo de debounce em uma única ida ao Redis
+    async with redis_client.pipeline(transaction=True) as pipe:
+        await _adicionar(keys=[buffer_key], args=[int(settings.BUFFER_TTL), *entradas], client=pipe)
+        await agendar_no_pipeline(pipe, cliente_id, chat_id, debounce_min, debounce_max)
+        await pipe.execute()
+
+    logger.info(f'[BUFFER] {len(messages)} mensagem(ns) adicionada(s) ao buffer de {chat_id}')
 
 
 async def handle_debounce(chat_id: str, cliente_id: Optional[int] = None):
     """
     Processa mensagens após debounce
     
+    Chamado pelo AgendadorDebounce quando o prazo do chat vence. Só o acesso
+    ao Redis roda no event loop; o pipeline (banco, IA, envio) roda no
+    executor limitado do pipeline.
+    
     Args:
         chat_id: ID do chat
         cliente_id: ID do cliente (para isolamento multi-tenant)
     """
     try:
-        logger.info(f'[BUFFER] Iniciando debounce para {chat_id}')
-        await asyncio.sleep(float(settings.DEBOUNCE_SECONDS))
-
-        buffer_key = f'{chat_id}{settings.BUFFER_KEY_SUFIX}'
-        messages = await redis_client.lrange(buffer_key, 0, -1)
-
-        full_message = ' '.join(messages).strip()
-        if full_message:
-            logger.info(f'[BUFFER] Processando mensagem para {chat_id}: {full_message}')
-            
-            if not cliente_id:
-                logger.error(f'[BUFFER] Cliente ID não fornecido para {chat_id}')
-                return
-            
-            # Criar session_id único por cliente + chat
-            session_id = f'cliente_{cliente_id}_{chat_id}'
-            
-            # Verificar se é primeira interação
-            from app.services.contexto import ContextoUsuarioService
-            
-            eh_primeira = ContextoUsuarioService.eh_primeira_interacao(db, cliente_id, chat_id)
-            nome_usuario = ContextoUsuarioService.obter_nome_usuario(db, cliente_id, chat_id)
-            
-            # Se é primeira interação, criar contexto e perguntar nome
-            if eh_primeira:
-                logger.info(f'[CONTEXTO] Primeira interação de {chat_id} - perguntando nome')
-                ContextoUsuarioService.criar_contexto(db, cliente_id, chat_id)
-                
-                send_whatsapp_message(
-                    number=chat_id,
-                    text="Olá! 👋 Qual é o seu nome?",
-                    db=db,
-                    cliente_id=cliente_id
-                )
-                
-                # Salvar mensagem do usuário
-                conversa = db.query(Conversa).filter(
-                    Conversa.cliente_id == cliente_id,
-                    Conversa.numero_whatsapp == chat_id
-                ).first()
-                
-                if not conversa:
-                    conversa = Conversa(
-                        cliente_id=cliente_id,
-                        numero_whatsapp=chat_id,
-                        status="ativa"
-                    )
-                    db.add(conversa)
-                    db.commit()
-                    db.refresh(conversa)
-                
-                mensagem_user = Mensagem(
-                    conversa_id=conversa.id,
-                    conteudo=full_message,
-                    tipo="usuario",
-                    confidence_score=None,
-                    fallback_triggered=False
-                )
-                mensagem_bot = Mensagem(
-                    conversa_id=conversa.id,
-                    conteudo="Olá! 👋 Qual é o seu nome?",
-                    tipo="ia",
-                    confidence_score=None,
-                    fallback_triggered=False
-                )
-                db.add(mensagem_user)
-                db.add(mensagem_bot)
-                db.commit()
-                
-                await redis_client.delete(buffer_key)
-                if chat_id in debounce_tasks:
-                    del debounce_tasks[chat_id]
-                return
-            
-            # Se não tem nome ainda, tentar detectar na mensagem
-            if not nome_usuario:
-                nome_detectado = ContextoUsuarioService.detectar_nome_na_mensagem(full_message)
-                if nome_detectado:
-                    logger.info(f'[CONTEXTO] Nome detectado: {nome_detectado}')
-                    ContextoUsuarioService.salvar_nome_usuario(db, cliente_id, chat_id, nome_detectado)
-                    nome_usuario = nome_detectado
-                    
-                    # Responder com saudação personalizada
-                    send_whatsapp_message(
-                        number=chat_id,
-                        text=f"Prazer em conhecer você, {nome_usuario}! 😊 Como posso ajudar?",
-                        db=db,
-                        cliente_id=cliente_id
-                    )
-                    
-                    # Salvar mensagens
-                    conversa = db.query(Conversa).filter(
-                        Conversa.cliente_id == cliente_id,
-                        Conversa.numero_whatsapp == chat_id
-                    ).first()
-                    
-                    if conversa:
-                        mensagem_user = Mensagem(
-                            conversa_id=conversa.id,
-                            conteudo=full_message,
-                            tipo="usuario",
-                            confidence_score=None,
-                            fallback_triggered=False
-                        )
-                        mensagem_bot = Mensagem(
-                            conversa_id=conversa.id,
-                            conteudo=f"Prazer em conhecer você, {nome_usuario}! 😊 Como posso ajudar?",
-                            tipo="ia",
-                            confidence_score=None,
-                            fallback_triggered=False
-                        )
-                        db.add(mensagem_user)
-                        db.add(mensagem_bot)
-                        db.commit()
-                    
-                    await redis_client.delete(buffer_key)
-                    if chat_id in debounce_tasks:
-                        del debounce_tasks[chat_id]
-                    return
-            
-            # Atualizar última interação
-            ContextoUsuarioService.atualizar_ultima_interacao(db, cliente_id, chat_id)
-            
-            # Buscar configurações do cliente
-            db = SessionLocal()
-            try:
-                from app.services.configuracoes import ConfiguracaoService
-                config = ConfiguracaoService.buscar_ou_criar(db, cliente_id)
-                tom = config.tom.value
-                threshold_confianca = config.threshold_confianca
-                
-                logger.info(f'[BUFFER] Usando tom: {tom}, threshold: {threshold_confianca}')
-                
-                # TASK 10.6: Detectar pedidos de agendamento
-                from app.services.agendamentos import AgendamentoService
-                from app.services.agendamentos.agendamento_ai_parser import AgendamentoAIParser
-                
-                parser = AgendamentoAIParser()
-                
-                # Verificar se mensagem contém intenção de agendamento
-                if parser.detectar_intencao_agendamento(full_message):
-                    logger.info(f'[AGENDAMENTO] Intenção de agendamento detectada: {chat_id}')
-                    
-                    # Buscar configuração de horários do cliente
-                    config_horarios = AgendamentoService.obter_configuracao(db, cliente_id)
-                    tipos_servico = config_horarios.tipos_servico if config_horarios else None
-                    
-                    # Extrair informações do agendamento
-                    info_agendamento = parser.extrair_informacoes_agendamento(full_message, tipos_servico)
-                    
-                    if info_agendamento:
-                        logger.info(f'[AGENDAMENTO] Informações extraídas: {info_agendamento}')
-                        
-                        # Criar agendamento
-                        agendamento = AgendamentoService.criar_agendamento(
-                            db=db,
-                            cliente_id=cliente_id,
-                            numero_usuario=chat_id,
-                            nome_usuario=nome_usuario,
-                            data_hora=info_agendamento['data_hora'],
-                            tipo_servico=info_agendamento.get('tipo_servico'),
-                            observacoes=info_agendamento.get('observacoes'),
-                            mensagem_original=full_message
-                        )
-                        
-                        # Gerar mensagem de confirmação
-                        mensagem_confirmacao = parser.gerar_mensagem_confirmacao(
-                            data_hora=agendamento.data_hora,
-                            tipo_servico=agendamento.tipo_servico,
-                            nome_usuario=nome_usuario
-                        )
-                        
-                        # Enviar mensagem de confirmação
-                        send_whatsapp_message(
-                            number=chat_id,
-                            text=mensagem_confirmacao,
-                            db=db,
-                            cliente_id=cliente_id
-                        )
-                        
-                        logger.info(f'[AGENDAMENTO] Agendamento criado: ID={agendamento.id}')
-                        
-                        # Salvar mensagens
-                        conversa = db.query(Conversa).filter(
-                            Conversa.cliente_id == cliente_id,
-                            Conversa.numero_whatsapp == chat_id
-                        ).first()
-                        
-                        if not conversa:
-                            conversa = Conversa(
-                                cliente_id=cliente_id,
-                                numero_whatsapp=chat_id,
-                                status="ativa"
-                            )
-                            db.add(conversa)
-                            db.commit()
-                            db.refresh(conversa)
-                        
-                        mensagem_user = Mensagem(
-                            conversa_id=conversa.id,
-                            conteudo=full_message,
-                            tipo="usuario",
-                            confidence_score=None,
-                            fallback_triggered=False
-                        )
-                        mensagem_bot = Mensagem(
-                            conversa_id=conversa.id,
-                            conteudo=mensagem_confirmacao,
-                            tipo="ia",
-                            confidence_score=None,
-                            fallback_triggered=False
-                        )
-                        db.add(mensagem_user)
-                        db.add(mensagem_bot)
-                        db.commit()
-                        
-                        await redis_client.delete(buffer_key)
-                        if chat_id in debounce_tasks:
-                            del debounce_tasks[chat_id]
-                        return
-                
-                # Verificar se cliente solicitou humano explicitamente
-                solicitou_humano = ConfiancaService.detectar_solicitacao_humano(full_message)
-                
-                if solicitou_humano:
-                    logger.info(f'[CONFIANÇA] Cliente solicitou atendimento humano: {chat_id}')
-                    
-                    # Acionar fallback
-                    FallbackService.acionar_fallback(
-                        db=db,
-                        numero_whatsapp=chat_id,
-                        cliente_id=cliente_id,
-                        motivo=MotivoFallback.SOLICITACAO_MANUAL.value,
-                        ultima_mensagem=full_message
-                    )
-                    
-                    # Salvar mensagem do usuário
-                    conversa = db.query(Conversa).filter(
-                        Conversa.cliente_id == cliente_id,
-                        Conversa.numero_whatsapp == chat_id
-                    ).order_by(Conversa.created_at.desc()).first()
-                    
-                    if conversa:
-                        mensagem_user = Mensagem(
-                            conversa_id=conversa.id,
-                            conteudo=full_message,
-                            tipo="usuario",
-                            confidence_score=None,
-                            fallback_triggered=True
-                        )
-                        db.add(mensagem_user)
-                        db.commit()
-                    
-                    await redis_client.delete(buffer_key)
-                    if chat_id in debounce_tasks:
-                        del debounce_tasks[chat_id]
-                    return
-                
-                # Verificar se é primeira mensagem (não tem conversa ativa)
-                conversa_existente = db.query(Conversa).filter(
-                    Conversa.cliente_id == cliente_id,
-                    Conversa.numero_whatsapp == chat_id
-                ).first()
-                primeira_mensagem = conversa_existente is None
-                
-                # Buscar nome da empresa do cliente
-                from app.db.models.cliente import Cliente
-                cliente = db.query(Cliente).filter(Cliente.id == cliente_id).first()
-                nome_empresa = cliente.nome_empresa if cliente else None
-                
-                # Processar com IA
-                resultado = AIService.processar_mensagem(
-                    cliente_id=cliente_id,
-                    chat_id=session_id,
-                    mensagem=full_message,
-                    tom=tom,
-                    nome_empresa=nome_empresa,
-                    primeira_mensagem=primeira_mensagem,
-                    nome_usuario=nome_usuario
-                )
-                
-                resposta = resultado['resposta']
-                confianca_basica = resultado['confianca']
-                documentos = resultado.get('documentos', [])
-                
-                # Calcular confiança avançada usando ConfiancaService
-                confianca = ConfiancaService.calcular_confianca(
-                    query=full_message,
-                    documentos=documentos,
-                    resposta=resposta
-                )
-                
-                logger.info(f'[CONFIANÇA] Score calculado: {confianca:.2f} (threshold: {threshold_confianca})')
-                
-                # Verificar se deve acionar fallback
-                deve_fallback = ConfiancaService.deve_acionar_fallback(confianca, threshold_confianca)
-                
-                if deve_fallback:
-                    logger.warning(f'[CONFIANÇA] Baixa confiança ({confianca:.2f}) - acionando fallback')
-                    
-                    # Acionar fallback
-                    FallbackService.acionar_fallback(
-                        db=db,
-                        numero_whatsapp=chat_id,
-                        cliente_id=cliente_id,
-                        motivo=MotivoFallback.BAIXA_CONFIANCA.value,
-                        ultima_mensagem=full_message
-                    )
-                    
-                    # Salvar mensagem do usuário com fallback
-                    conversa = db.query(Conversa).filter(
-                        Conversa.cliente_id == cliente_id,
-                        Conversa.numero_whatsapp == chat_id
-                    ).order_by(Conversa.created_at.desc()).first()
-                    
-                    if conversa:
-                        mensagem_user = Mensagem(
-                            conversa_id=conversa.id,
-                            conteudo=full_message,
-                            tipo="usuario",
-                            confidence_score=confianca,
-                            fallback_triggered=True
-                        )
-                        db.add(mensagem_user)
-                        db.commit()
-                else:
-                    # Confiança OK - enviar resposta normalmente
-                    logger.info(f'[CONFIANÇA] Confiança OK ({confianca:.2f}) - enviando resposta')
-                    
-                    send_whatsapp_message(
-                        number=chat_id,
-                        text=resposta,
-                        db=db,
-                        cliente_id=cliente_id
-                    )
-                    
-                    logger.info(f'[BUFFER] Resposta enviada para {chat_id}')
-                    
-                    # Buscar ou criar conversa
-                    conversa = db.query(Conversa).filter(
-                        Conversa.cliente_id == cliente_id,
-                        Conversa.numero_whatsapp == chat_id,
-                        Conversa.status == "ativa"
-                    ).first()
-                    
-                    if not conversa:
-                        conversa = Conversa(
-                            cliente_id=cliente_id,
-                            numero_whatsapp=chat_id,
-                            status="ativa"
-                        )
-                        db.add(conversa)
-                        db.commit()
-                        db.refresh(conversa)
-                    
-                    # Salvar mensagens
-                    mensagem_user = Mensagem(
-                        conversa_id=conversa.id,
-                        conteudo=full_message,
-                        tipo="usuario",
-                        confidence_score=confianca,
-                        fallback_triggered=False
-                    )
-                    mensagem_bot = Mensagem(
-                        conversa_id=conversa.id,
-                        conteudo=resposta,
-                        tipo="ia",
-                        confidence_score=confianca,
-                        fallback_triggered=False
-                    )
-                    db.add(mensagem_user)
-                    db.add(mensagem_bot)
-                    db.commit()
-                
-            finally:
-                db.close()
-            
-        await redis_client.delete(buffer_key)
-        
-        # Limpar task do dict
-        if chat_id in debounce_tasks:
-            del debounce_tasks[chat_id]
+        logger.info(f'[BUFFER] Debounce vencido para {chat_id}')
+
+        if not cliente_id:
+            logger.error(f'[BUFFER] Cliente ID não fornecido para {chat_id}')
+            return
+
+        buffer_key = chave_buffer(cliente_id, chat_id)
+
+        # Leitura + limpeza atômicas: o que chegar depois fica para a próxima rodada
+        brutas = await _drenar(keys=[buffer_key])
+        if not brutas:
+            return
+
+        # Entradas drenadas durante a rodada (supersessão), devolvidas junto em caso de erro
+        drenadas: List[str] = []
+        try:
+            await executar_no_pipeline(_processar_buffer, chat_id, cliente_id, _ler_entradas(brutas), drenadas)
+        except Exception as e:
+            # Não perder as mensagens: voltam para o buffer e o chat é reagendado
+            logger.error(f'[BUFFER] Erro ao processar mensagem: {str(e)}', exc_info=True)
+            await _devolver_e_reagendar(chat_id, cliente_id, buffer_key, [*brutas, *drenadas])
+            return
+
+        await redis_client.delete(_chave_tentativas(buffer_key))
 
     except asyncio.CancelledError:
-        logger.info(f'[BUFFER] Debounce cancelado para {chat_id}')
+        logger.info(f'[BUFFER] Processamento cancelado para {chat_id}')
+        raise
     except Exception as e:
         logger.error(f'[BUFFER] Erro ao processar mensagem: {str(e)}', exc_info=True)
+
+
+def _processar_buffer(
+    chat_id: str,
+    cliente_id: int,
+    entradas: List[Tuple[Optional[str], str]],
+    drenadas: Optional[List[str]] = None
+):
+    """
+    Pipeline síncrono de uma rodada de mensagens do chat (banco, IA, envio)
+    
+    Roda em thread do executor do pipeline, nunca no event loop. As etapas
+    estão em etapas_mensagem (ETAPAS_PADRAO); o cliente pode desabilitar as
+    opcionais em ConfiguracaoBot.etapas_desabilitadas.
+    
+    Args:
+        chat_id: ID do chat
+        cliente_id: ID do cliente
+        entradas: Entradas do buffer (message_id, texto)
+        drenadas: Recebe as entradas brutas drenadas durante a rodada (supersessão)
+    """
+    db = SessionLocal()
+    try:
+        # Reentregas que escaparam do dedup no Redis (ex: TTL expirado)
+        entradas = _filtrar_ja_persistidas(db, cliente_id, entradas)
+
+        full_message = ' '.join(texto for _, texto in entradas).strip()
+        if not full_message:
+            return
+
+        logger.info(f'[BUFFER] Processando mensagem para {chat_id}: {full_message}')
+        
+        # Uma leitura de cliente, configuração, contexto e conversa por rodada;
+        # as escritas são acumuladas e gravadas em um único commit no final
+        uow = PipelineUnitOfWork(db, cliente_id, chat_id).carregar()
+        
+        drenadas = drenadas if drenadas is not None else []
+        reinicios = 0
+        while True:
+            ctx = ContextoPipeline(chat_id, cliente_id, uow, {
+                'mensagem': full_message,
+                # Cada entrada vira uma mensagem do usuário, com o seu id do WhatsApp
+                'entradas': [(message_id, texto) for message_id, texto in entradas if texto.strip()],
+                # session_id único por cliente + chat
+                'session_id': f'cliente_{cliente_id}_{chat_id}',
+                'nome_usuario': uow.nome_usuario,
+                'drenadas': drenadas,
+                'reinicios': reinicios
+            })
+            try:
+                executar_etapas(ETAPAS_PADRAO, ctx, uow.config.etapas_desabilitadas)
+            except ReiniciarRodada as reinicio:
+                # Supersessão trouxe texto que muda a intenção: etapas de novo com o texto completo
+                full_message = reinicio.mensagem
+                entradas = [*entradas, *reinicio.entradas]
+                reinicios += 1
+                continue
+            except Exception as e:
+                if not (uow.houve_envio or ctx.dados.get('fallback')):
+                    raise
+                # O contato já recebeu a resposta (ou a mensagem de fallback): devolver o
+                # lote ao buffer faria a rodada responder de novo
+                metrics.incrementar('pipeline.falhas_apos_envio')
+                logger.error(
+                    f'[BUFFER] Erro depois do envio para {chat_id} - lote não será reprocessado: {e}',
+                    exc_info=True
+                )
+            break
+        
+    finally:
+        db.close()
@@ -0,0 +1,151 @@
+"""
+Framework de etapas do pipeline de mensagens
+
+Uma rodada do pipeline é uma lista ordenada de etapas. Cada etapa declara
+o que lê (requer) e o que grava (produz) no contexto da rodada:
+
+- etapa sem todas as entradas em `requer` é pulada ('sem_entrada')
+- etapa cujas saídas em `produz` já estão no contexto é pulada ('pulada'),
+  ex: resposta já produzida por uma etapa anterior
+- etapa que retorna ENCERRAR interrompe a rodada; só as etapas `final`
+  (envio, persistência) continuam rodando
+- etapas `opcional` podem ser desabilitadas por cliente ('desabilitada')
+- etapa que levanta ReiniciarRodada aborta a rodada sem etapas finais; quem
+  chamou executa as etapas de novo com a mensagem nova
+
+Cada etapa emite a própria duração (pipeline.etapa.<nome>.duracao_segundos)
+e um contador por resultado (pipeline.etapa.<nome>.<resultado>).
+"""
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+CONTINUAR = 'continuar'
+ENCERRAR = 'encerrar'
+
+
+class ReiniciarRodada(Exception):
+    """
+    A rodada precisa recomeçar da primeira etapa com outro texto
+
+    Ex: a supersessão juntou mensagens novas que mudam a intenção detectada
+    pelas etapas anteriores à geração (agendamento, pedido de humano).
+    """
+
+    def __init__(self, mensagem: str, entradas: List[Tuple[Optional[str], str]]):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        self.entradas = entradas  # Entradas (message_id, texto) juntadas ao texto
+
+
+class ContextoPipeline:
+    """Estado de uma rodada do pipeline, compartilhado entre as etapas"""
+
+    def __init__(self, chat_id: str, cliente_id: int, uow, dados: Optional[Dict[str, Any]] = None):
+        self.chat_id = chat_id
+        self.cliente_id = cliente_id
+        self.uow = uow
+        self.dados: Dict[str, Any] = dict(dados or {})
+        self.encerrado_por: Optional[str] = None
+        self.tempos: List[Tuple[str, str, float]] = []  # (etapa, resultado, segundos)
+
+    def tem(self, *chaves: str) -> bool:
+        return all(self.dados.get(chave) is not None for chave in chaves)
+
+
+class Etapa:
+    """
+    Etapa do pipeline
+
+    Subclasses definem `nome`, `requer`, `produz` e implementam executar(),
+    que retorna CONTINUAR (ou None) ou ENCERRAR.
+    """
+
+    nome: str = ''
+    requer: Tuple[str, ...] = ()
+    produz: Tuple[str, ...] = ()
+    final: bool = False     # Roda mesmo depois de ENCERRAR
+    opcional: bool = False  # Pode ser desabilitada por cliente
+
+    def executar(self, ctx: ContextoPipeline) -> Optional[str]:
+        raise NotImplementedError
+
+
+def _resultado_previo(etapa: Etapa, ctx: ContextoPipeline, desabilitadas) -> Optional[str]:
+    """Resultado da etapa quando ela não precisa rodar (None = executar)"""
+    if ctx.encerrado_por and not etapa.final:
+        return 'encerrada'
+    if etapa.opcional and etapa.nome in desabilitadas:
+        return 'desabilitada'
+    if etapa.requer and not ctx.tem(*etapa.requer):
+        return 'sem_entrada'
+    if etapa.produz and ctx.tem(*etapa.produz):
+        return 'pulada'
+    return None
+
+
+def executar_etapas(
+    etapas: List[Etapa],
+    ctx: ContextoPipeline,
+    desabilitadas: Optional[Iterable[str]] = None
+) -> ContextoPipeline:
+    """
+    Executa as etapas em ordem sobre o contexto
+
+    Args:
+        etapas: Etapas na ordem de execução
+        ctx: Contexto da rodada
+        desabilitadas: Nomes das etapas opcionais desabilitadas pelo cliente
+
+    Returns:
+        O próprio contexto, com os tempos de cada etapa em ctx.tempos
+
+    Raises:
+        ReiniciarRodada: Uma etapa pediu que a rodada recomece
+        Exception: Erro de uma etapa (a rodada é abortada, sem etapas finais)
+    """
+    desabilitadas = set(desabilitadas or ())
+
+    for etapa in etapas:
+        prefixo = f'pipeline.etapa.{etapa.nome}'
+
+        resultado = _resultado_previo(etapa, ctx, desabilitadas)
+        if resultado is not None:
+            metrics.incrementar(f'{prefixo}.{resultado}')
+            ctx.tempos.append((etapa.nome, resultado, 0.0))
+            continue
+
+        inicio = time.monotonic()
+        try:
+            resultado = etapa.executar(ctx) or CONTINUAR
+        except ReiniciarRodada:
+            metrics.incrementar(f'{prefixo}.reiniciada')
+            ctx.tempos.append((etapa.nome, 'reiniciada', time.monotonic() - inicio))
+            raise
+        except Exception:
+            duracao = time.monotonic() - inicio
+            metrics.incrementar(f'{prefixo}.erro')
+            metrics.observar(f'{prefixo}.duracao_segundos', duracao)
+            logger.error(f'[PIPELINE] Erro na etapa {etapa.nome} | {ctx.chat_id}')
+            raise
+
+        duracao = time.monotonic() - inicio
+        metrics.incrementar(f'{prefixo}.{resultado}')
+        metrics.observar(f'{prefixo}.duracao_segundos', duracao)
+        ctx.tempos.append((etapa.nome, resultado, duracao))
+
+        if resultado == ENCERRAR and not ctx.encerrado_por:
+            ctx.encerrado_por = etapa.nome
+
+    logger.info(
+        f'[PIPELINE] {ctx.chat_id} | '
+        + ' '.join(
+            f'{nome}={duracao * 1000:.1f}ms' if duracao else f'{nome}:{resultado}'
+            for nome, resultado, duracao in ctx.tempos
+        )
+    )
+    return ctx
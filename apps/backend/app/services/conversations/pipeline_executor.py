@@ -0,0 +1,96 @@
+"""
+Executor limitado do pipeline de mensagens
+
+O pipeline (SQLAlchemy, LLM, Chroma, envio via Evolution API, e-mail do
+fallback) é síncrono e bloqueante. Ele roda em um ThreadPoolExecutor com
+PIPELINE_MAX_WORKERS threads para que o event loop continue livre para
+receber webhooks. No máximo PIPELINE_MAX_QUEUE rodadas ficam na fila do
+executor; as demais aguardam no event loop (sem ocupar thread).
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PIPELINE_MAX_WORKERS,
+    thread_name_prefix='pipeline'
+)
+
+_lock = threading.Lock()
+_estado = {'aguardando': 0, 'na_fila': 0, 'em_execucao': 0}
+_vagas: asyncio.Semaphore = None
+
+
+def _alterar(campo: str, delta: int):
+    with _lock:
+        _estado[campo] += delta
+
+
+def _obter_vagas() -> asyncio.Semaphore:
+    # Criado sob demanda para ficar no event loop em uso
+    global _vagas
+    if _vagas is None:
+        _vagas = asyncio.Semaphore(settings.PIPELINE_MAX_WORKERS + settings.PIPELINE_MAX_QUEUE)
+    return _vagas
+
+
+metrics.registrar_gauge('pipeline.aguardando', lambda: _estado['aguardando'])
+metrics.registrar_gauge('pipeline.fila', lambda: _estado['na_fila'])
+metrics.registrar_gauge('pipeline.em_execucao', lambda: _estado['em_execucao'])
+metrics.registrar_gauge('pipeline.max_workers', lambda: settings.PIPELINE_MAX_WORKERS)
+
+
+async def executar_no_pipeline(funcao: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Executa uma função bloqueante do pipeline fora do event loop
+
+    Args:
+        funcao: Função síncrona
+        *args, **kwargs: Argumentos da função
+
+    Returns:
+        Retorno da função
+    """
+    enfileirado_em = time.monotonic()
+
+    def _executar():
+        _alterar('na_fila', -1)
+        _alterar('em_execucao', 1)
+        metrics.observar('pipeline.espera_segundos', time.monotonic() - enfileirado_em)
+        inicio = time.monotonic()
+        try:
+            return funcao(*args, **kwargs)
+        except Exception:
+            metrics.incrementar('pipeline.erros')
+            raise
+        finally:
+            _alterar('em_execucao', -1)
+            metrics.incrementar('pipeline.concluidos')
+            metrics.observar('pipeline.duracao_segundos', time.monotonic() - inicio)
+
+    vagas = _obter_vagas()
+    _alterar('aguardando', 1)
+    try:
+        await vagas.acquire()
+    finally:
+        _alterar('aguardando', -1)
+
+    try:
+        _alterar('na_fila', 1)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, _executar)
+    finally:
+        vagas.release()
+
+
+def encerrar():
+    """Aguarda as rodadas em execução e encerra as threads"""
+    _executor.shutdown(wait=True)
@@ -0,0 +1,305 @@
+"""
+Unit of work do pipeline de mensagens
+
+Carrega uma única vez tudo o que uma rodada do pipeline lê (cliente,
+configuração do bot, contexto do usuário, conversa) e acumula as escritas
+(mensagens, contador de envios, uso da IA). No final, commit() grava tudo
+em uma única transação, com as mensagens em um insert em lote.
+
+O estado do chat (contexto, nome, conversa, status) vem do hash no Redis
+(chat_state); o Postgres só é lido em cache miss. Depois do commit, o
+estado é regravado no Redis.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.core import paralelo
+from app.core.config import settings
+from app.db.models.cliente import Cliente
+from app.db.models.configuracao_bot import ConfiguracaoBot
+from app.db.models.contexto_usuario import ContextoUsuarioWhatsApp
+from app.db.models.conversa import Conversa
+from app.db.models.mensagem import Mensagem
+from app.services.conversations import chat_state
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineUnitOfWork:
+    """Leituras e escritas de uma rodada do pipeline de um chat"""
+
+    def __init__(self, db: Session, cliente_id: int, chat_id: str):
+        self.db = db
+        self.cliente_id = cliente_id
+        self.chat_id = chat_id
+
+        self.cliente: Optional[Cliente] = None
+        self.config: Optional[ConfiguracaoBot] = None
+        self.tem_contexto = False
+        self.nome_usuario: Optional[str] = None
+        self.conversa_id: Optional[int] = None
+        self.conversa_status: Optional[str] = None
+        self.versao_conhecimento = 0
+        self.primeira_mensagem = False
+        self.estado_em_cache = False
+
+        # Objetos ORM carregados só quando uma etapa precisa alterá-los
+        self._contexto: Optional[ContextoUsuarioWhatsApp] = None
+        self._conversa: Optional[Conversa] = None
+        self._tocar_contexto = False
+
+        self._mensagens: List[Dict[str, Any]] = []
+        self._envios = 0
+        self._usos: List[Dict[str, Any]] = []
+
+    def carregar(self) -> 'PipelineUnitOfWork':
+        """
+        Carrega cliente, configuração e estado do chat (Redis, ou banco em cache miss)
+
+        O estado do chat é lido no Redis em paralelo com a query de cliente e
+        configuração (uma só, com outer join). Redis mais lento que
+        PREGERACAO_TIMEOUT_ESTADO conta como cache miss.
+        """
+        from app.services.configuracoes import ConfiguracaoService
+
+        leitura_estado = paralelo.iniciar(
+            'estado',
+            lambda: chat_state.ler(self.cliente_id, self.chat_id),
+            settings.PREGERACAO_TIMEOUT_ESTADO,
+            lambda: None
+        )
+
+        linha = self.db.query(Cliente, ConfiguracaoBot).outerjoin(
+            ConfiguracaoBot, ConfiguracaoBot.cliente_id == Cliente.id
+        ).filter(Cliente.id == self.cliente_id).first()
+        self.cliente, self.config = linha if linha else (None, None)
+        if self.config is None:
+            self.config = ConfiguracaoService.buscar_ou_criar(self.db, self.cliente_id)
+
+        estado = leitura_estado.resultado()
+        if estado is not None:
+            self.estado_em_cache = True
+            self.tem_contexto = estado['contexto']
+            self.nome_usuario = estado['nome']
+            self.conversa_id = estado['conversa_id']
+            self.conversa_status = estado['status']
+            self.versao_conhecimento = estado['versao_conhecimento']
+        else:
+            self._carregar_do_banco()
+
+        self.primeira_mensagem = self.conversa_id is None
+        return self
+
+    def _carregar_do_banco(self):
+        self._contexto = self.db.query(ContextoUsuarioWhatsApp).filter(
+            ContextoUsuarioWhatsApp.cliente_id == self.cliente_id,
+            ContextoUsuarioWhatsApp.numero_usuario == self.chat_id
+        ).first()
+        self.tem_contexto = self._contexto is not None
+        self.nome_usuario = self._contexto.nome if self._contexto else None
+
+        self._definir_conversa(self.db.query(Conversa).filter(
+            Conversa.cliente_id == self.cliente_id,
+            Conversa.numero_whatsapp == self.chat_id
+        ).order_by(Conversa.created_at.desc()).first())
+
+        self.versao_conhecimento = chat_state.versao_conhecimento(self.cliente_id)
+
+    # Contexto do usuário
+
+    @property
+    def eh_primeira_interacao(self) -> bool:
+        return not self.tem_contexto
+
+    def _obter_contexto(self) -> Optional[ContextoUsuarioWhatsApp]:
+        if self._contexto is None and self.tem_contexto:
+            self._contexto = self.db.query(ContextoUsuarioWhatsApp).filter(
+                ContextoUsuarioWhatsApp.cliente_id == self.cliente_id,
+                ContextoUsuarioWhatsApp.numero_usuario == self.chat_id
+            ).first()
+        return self._contexto
+
+    def criar_contexto(self) -> ContextoUsuarioWhatsApp:
+        """Cria o contexto do usuário (gravado no commit)"""
+        contexto = self._obter_contexto()
+        if contexto is None:
+            contexto = ContextoUsuarioWhatsApp(
+                cliente_id=self.cliente_id,
+                numero_usuario=self.chat_id
+            )
+            self.db.add(contexto)
+            self._contexto = contexto
+            self.tem_contexto = True
+        return contexto
+
+    def salvar_nome_usuario(self, nome: str):
+        """Salva o nome do usuário no contexto (gravado no commit)"""
+        contexto = self.criar_contexto()
+        contexto.nome = nome
+        contexto.ultima_interacao = datetime.utcnow()
+        self.nome_usuario = nome
+
+    def atualizar_ultima_interacao(self):
+        """Marca a última interação (UPDATE direto no commit, sem carregar o contexto)"""
+        if self._contexto is not None:
+            self._contexto.ultima_interacao = datetime.utcnow()
+        elif self.tem_contexto:
+            self._tocar_contexto = True
+
+    # Conversa
+
+    def _definir_conversa(self, conversa: Optional[Conversa]):
+        self._conversa = conversa
+        self.conversa_id = conversa.id if conversa else None
+        self.conversa_status = conversa.status if conversa else None
+
+    def definir_conversa(self, conversa: Conversa):
+        """Atualiza a conversa corrente (ex: depois do FallbackService)"""
+        self._definir_conversa(conversa)
+
+    def carregar_conversa(self) -> Optional[Conversa]:
+        """Objeto ORM da conversa corrente (para etapas que alteram a conversa)"""
+        if self._conversa is None and self.conversa_id is not None:
+            self._conversa = self.db.get(Conversa, self.conversa_id)
+        return self._conversa
+
+    def _nova_conversa(self) -> int:
+        conversa = Conversa(
+            cliente_id=self.cliente_id,
+            numero_whatsapp=self.chat_id,
+            status="ativa"
+        )
+        self.db.add(conversa)
+        # INSERT dentro da transação da rodada, para as mensagens terem o id
+        self.db.flush()
+        self._definir_conversa(conversa)
+        return conversa.id
+
+    def obter_conversa(self) -> int:
+        """Id da conversa mais recente do chat (cria uma ativa se não houver)"""
+        if self.conversa_id is not None:
+            return self.conversa_id
+        return self._nova_conversa()
+
+    def obter_conversa_ativa(self) -> int:
+        """Id da conversa ativa do chat (cria uma nova se a mais recente não estiver ativa)"""
+        if self.conversa_id is not None and self.conversa_status == "ativa":
+            return self.conversa_id
+        return self._nova_conversa()
+
+    # Escritas acumuladas
+
+    def adicionar_mensagem(
+        self,
+        conversa_id: int,
+        tipo: str,
+        conteudo: str,
+        confidence_score: Optional[float] = None,
+        fallback_triggered: bool = False,
+        provider_message_id: Optional[str] = None
+    ):
+        """Acumula uma mensagem para o insert em lote do commit"""
+        self._mensagens.append({
+            'conversa_id': conversa_id,
+            'tipo': tipo,
+            'conteudo': conteudo,
+            'confidence_score': confidence_score,
+            'fallback_triggered': fallback_triggered,
+            'provider_message_id': provider_message_id
+        })
+
+    def registrar_envio(self, quantidade: int = 1):
+        """Acumula mensagens enviadas ao WhatsApp (contador do cliente)"""
+        self._envios += quantidade
+
+    @property
+    def houve_envio(self) -> bool:
+        """Se a rodada já enviou algo ao contato (o lote não pode ser reprocessado)"""
+        return self._envios > 0
+
+    def registrar_uso(self, uso: Optional[Dict[str, Any]]):
+        """Acumula o uso de tokens retornado pelo AIService"""
+        if uso and (uso.get('tokens_prompt') or uso.get('tokens_completion')):
+            self._usos.append(uso)
+
+    def commit(self):
+        """Grava todas as escritas da rodada em uma única transação"""
+        from app.services.uso import UsoOpenAIService
+
+        try:
+            self.db.flush()
+
+            if self._tocar_contexto:
+                self.db.execute(
+                    update(ContextoUsuarioWhatsApp)
+                    .where(
+                        ContextoUsuarioWhatsApp.cliente_id == self.cliente_id,
+                        ContextoUsuarioWhatsApp.numero_usuario == self.chat_id
+                    )
+                    .values(ultima_interacao=datetime.utcnow())
+                )
+
+            if self._mensagens:
+                # created_at usa o default da coluna (avaliado por linha)
+                self.db.execute(insert(Mensagem), [
+                    {
+                        'conversa_id': dados['conversa_id'],
+                        'cliente_id': self.cliente_id,
+                        'tipo': dados['tipo'],
+                        'conteudo': dados['conteudo'],
+                        'confidence_score': dados['confidence_score'],
+                        'fallback_triggered': dados['fallback_triggered'],
+                        'provider_message_id': dados['provider_message_id']
+                    }
+                    for dados in self._mensagens
+                ])
+
+            if self._envios:
+                self.db.execute(
+                    update(Cliente)
+                    .where(Cliente.id == self.cliente_id)
+                    .values(total_mensagens_enviadas=Cliente.total_mensagens_enviadas + self._envios)
+                )
+
+            for uso in self._usos:
+                UsoOpenAIService.registrar_uso(
+                    db=self.db,
+                    cliente_id=self.cliente_id,
+                    modelo=uso['modelo'],
+                    tokens_prompt=uso.get('tokens_prompt', 0),
+                    tokens_completion=uso.get('tokens_completion', 0),
+                    commit=False,
+                    hedge=uso.get('hedge', False),
+                    tokens_cache=uso.get('tokens_cache', 0),
+                    uso_hedge=uso.get('uso_hedge')
+                )
+
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        # Write-through do estado do chat, só depois do commit
+        chat_state.gravar(
+            self.cliente_id,
+            self.chat_id,
+            contexto=self.tem_contexto,
+            nome=self.nome_usuario,
+            conversa_id=self.conversa_id,
+            status=self.conversa_status,
+            ultima_interacao=datetime.utcnow(),
+            versao_conhecimento=self.versao_conhecimento
+        )
+
+        logger.info(
+            f'[PIPELINE] Commit único: {len(self._mensagens)} mensagem(ns), '
+            f'{self._envios} envio(s), {len(self._usos)} registro(s) de uso | {self.chat_id}'
+        )
+        self._mensagens.clear()
+        self._envios = 0
+        self._usos.clear()
+        self._tocar_contexto = False
@@ -0,0 +1,183 @@
+"""
+Executor particionado por chat
+
+Trabalhos com a mesma chave (cliente_id|chat_id) são executados em ordem,
+um de cada vez; chaves diferentes rodam em paralelo em N faixas (lanes).
+Cada faixa tem uma fila e um único consumidor.
+
+A faixa de uma chave é escolhida por rendezvous hashing (HRW). O número de
+faixas é fixo (PIPELINE_LANES) durante a vida do processo; para mudar,
+altere a configuração e reinicie o processo.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+_FIM = object()
+
+
+def _peso(chave: str, faixa: int) -> int:
+    digest = hashlib.blake2b(f'{chave}#{faixa}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class _Faixa:
+    def __init__(self, indice: int):
+        self.indice = indice
+        self.fila: asyncio.Queue = asyncio.Queue()
+        self.ativa = True
+        self.tarefa: Optional[asyncio.Task] = None
+        self.processados = 0
+
+
+class ExecutorParticionado:
+    """
+    Executor com ordem garantida por chave e paralelismo entre chaves
+
+    Uso:
+        executor = ExecutorParticionado('pipeline', faixas=8)
+        executor.iniciar()
+        await executor.executar(f'{cliente_id}|{chat_id}', lambda: processar(...))
+        await executor.parar()
+    """
+
+    def __init__(self, nome: str, faixas: int):
+        if faixas < 1:
+            raise ValueError('faixas deve ser >= 1')
+        self.nome = nome
+        self._faixas: Dict[int, _Faixa] = {}
+        self._fixadas: Dict[str, Tuple[int, int]] = {}  # chave → (faixa, pendentes)
+        self._quantidade_inicial = faixas
+        self._proximo_indice = 0
+        self._iniciado = False
+
+    def iniciar(self):
+        """Cria as faixas e seus consumidores (precisa de event loop rodando)"""
+        if self._iniciado:
+            return
+        self._iniciado = True
+        for _ in range(self._quantidade_inicial):
+            self._adicionar_faixa()
+        logger.info(f'[EXECUTOR] {self.nome} iniciado com {self._quantidade_inicial} faixa(s)')
+
+    @property
+    def faixas_ativas(self) -> List[int]:
+        return [f.indice for f in self._faixas.values() if f.ativa]
+
+    def faixa_da_chave(self, chave: str) -> int:
+        """Faixa em que a chave roda agora (fixada ou por rendezvous hashing)"""
+        fixada = self._fixadas.get(chave)
+        if fixada:
+            return fixada[0]
+        return max(self.faixas_ativas, key=lambda faixa: _peso(chave, faixa))
+
+    def submeter(self, chave: str, trabalho: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Enfileira um trabalho na faixa da chave
+
+        Args:
+            chave: Chave de ordenação (ex: "cliente_id|chat_id")
+            trabalho: Função sem argumentos que retorna a corrotina
+
+        Returns:
+            Future com o resultado do trabalho
+        """
+        if not self._iniciado:
+            raise RuntimeError(f'Executor {self.nome} não iniciado')
+
+        indice = self.faixa_da_chave(chave)
+        _, pendentes = self._fixadas.get(chave, (indice, 0))
+        self._fixadas[chave] = (indice, pendentes + 1)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._faixas[indice].fila.put_nowait((chave, trabalho, futuro, time.monotonic()))
+        return futuro
+
+    async def executar(self, chave: str, trabalho: Callable[[], Awaitable[Any]]) -> Any:
+        """Enfileira e aguarda o resultado do trabalho"""
+        return await self.submeter(chave, trabalho)
+
+    async def parar(self):
+        """Processa o que já foi enfileirado e encerra todas as faixas"""
+        tarefas = []
+        for faixa in list(self._faixas.values()):
+            if faixa.ativa:
+                faixa.ativa = False
+                faixa.fila.put_nowait(_FIM)
+            if faixa.tarefa:
+                tarefas.append(faixa.tarefa)
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        self._iniciado = False
+
+    def metricas(self) -> Dict[str, Any]:
+        """Fila e processados por faixa"""
+        return {
+            'faixas': {
+                faixa.indice: {
+                    'ativa': faixa.ativa,
+                    'fila': faixa.fila.qsize(),
+                    'processados': faixa.processados
+                }
+                for faixa in self._faixas.values()
+            },
+            'chaves_pendentes': len(self._fixadas)
+        }
+
+    def _adicionar_faixa(self):
+        faixa = _Faixa(self._proximo_indice)
+        self._proximo_indice += 1
+        self._faixas[faixa.indice] = faixa
+        faixa.tarefa = asyncio.create_task(self._consumir(faixa))
+        metrics.registrar_gauge(f'{self.nome}.faixa.{faixa.indice}.fila', faixa.fila.qsize)
+
+    def _liberar_chave(self, chave: str):
+        indice, pendentes = self._fixadas[chave]
+        if pendentes <= 1:
+            del self._fixadas[chave]
+        else:
+            self._fixadas[chave] = (indice, pendentes - 1)
+
+    async def _consumir(self, faixa: _Faixa):
+        """Consumidor único da faixa: executa os trabalhos em ordem"""
+        prefixo = f'{self.nome}.faixa.{faixa.indice}'
+
+        while True:
+            item = await faixa.fila.get()
+
+            if item is _FIM:
+                # Chaves fixadas ainda podem ter enfileirado trabalho depois do _FIM
+                if faixa.fila.empty():
+                    break
+                faixa.fila.put_nowait(_FIM)
+                continue
+
+            chave, trabalho, futuro, enfileirado_em = item
+            metrics.observar(f'{self.nome}.espera_segundos', time.monotonic() - enfileirado_em)
+            inicio = time.monotonic()
+            try:
+                resultado = await trabalho()
+                if not futuro.done():
+                    futuro.set_result(resultado)
+            except asyncio.CancelledError:
+                if not futuro.done():
+                    futuro.cancel()
+                raise
+            except Exception as e:
+                metrics.incrementar(f'{prefixo}.erros')
+                if not futuro.done():
+                    futuro.set_exception(e)
+            finally:
+                faixa.processados += 1
+                metrics.incrementar(f'{prefixo}.processados')
+                metrics.observar(f'{self.nome}.duracao_segundos', time.monotonic() - inicio)
+                self._liberar_chave(chave)
+
+        metrics.remover_gauge(f'{prefixo}.fila')
+        del self._faixas[faixa.indice]
+        logger.info(f'[EXECUTOR] {self.nome}: faixa {faixa.indice} encerrada')
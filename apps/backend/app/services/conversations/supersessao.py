@@ -0,0 +1,186 @@
+"""
+Supersessão de gerações em andamento
+
+Mensagens que chegam depois do início de uma rodada vão para um buffer novo
+(ver message_buffer). Sem supersessão, a resposta da rodada atual é enviada
+e, logo depois, uma segunda rodada responde às mensagens novas.
+
+Com supersessão, a etapa de geração roda a chamada ao LLM (async) e
+verifica o buffer do chat no cliente a cada PIPELINE_SUPERSESSAO_POLL_MS. Se houver
+entrada nova, a chamada é cancelada, as entradas são drenadas, o texto é
+juntado à mensagem da rodada e a resposta é gerada de novo. O mesmo vale
+para entradas que chegam entre o fim da geração e o envio.
+
+Entradas drenadas passam pelo mesmo filtro de reenvios do início da rodada.
+Se o texto novo muda a intenção detectada (ex: "quero marcar um horário"
+depois de uma pergunta), a geração não serve: ReiniciarRodada faz a rodada
+recomeçar da primeira etapa com o texto completo.
+
+Roda na thread do executor do pipeline, no event loop persistente da thread
+(clients.executar_no_loop: os clientes LLM async mantêm o pool de conexões
+daquele loop entre rodadas).
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.conversations.pipeline_etapas import ReiniciarRodada
+from app.services.llm.clients import executar_no_loop
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis.from_url(settings.CACHE_REDIS_URI, decode_responses=True)
+
+_drenar = None
+
+
+def _chave_buffer(cliente_id: int, chat_id: str) -> str:
+    from app.services.conversations.message_buffer import chave_buffer
+
+    return chave_buffer(cliente_id, chat_id)
+
+
+def ha_entradas_novas(cliente_id: int, chat_id: str) -> bool:
+    """Se o buffer do chat no cliente recebeu entradas depois do início da rodada"""
+    try:
+        return redis_client.llen(_chave_buffer(cliente_id, chat_id)) > 0
+    except Exception as e:
+        logger.warning(f'[SUPERSESSÃO] Erro ao verificar buffer de {chat_id}: {e}')
+        return False
+
+
+Entradas = List[Tuple[Optional[str], str]]
+
+
+def drenar_entradas_novas(
+    cliente_id: int,
+    chat_id: str,
+    drenadas: List[str],
+    filtrar: Optional[Callable[[Entradas], Entradas]] = None
+) -> Entradas:
+    """
+    Drena o buffer do chat no cliente (mesmo script atômico do message_buffer)
+
+    Args:
+        cliente_id: ID do cliente
+        chat_id: ID do chat
+        drenadas: Lista que recebe as entradas brutas (devolvidas ao buffer se a rodada falhar)
+        filtrar: Remove entradas já processadas (reenvios do webhook)
+
+    Returns:
+        Entradas (message_id, texto)
+    """
+    from app.services.conversations.message_buffer import _LUA_DRENAR, _ler_entradas
+
+    global _drenar
+    if _drenar is None:
+        _drenar = redis_client.register_script(_LUA_DRENAR)
+
+    brutas = _drenar(keys=[_chave_buffer(cliente_id, chat_id)])
+    drenadas.extend(brutas)
+    entradas = _ler_entradas(brutas)
+    return filtrar(entradas) if filtrar and entradas else entradas
+
+
+async def _aguardar_ou_supersedir(tarefa: asyncio.Future, cliente_id: int, chat_id: str) -> bool:
+    """True se a geração terminou; False se foi cancelada por entrada nova"""
+    intervalo = settings.PIPELINE_SUPERSESSAO_POLL_MS / 1000
+
+    while True:
+        concluidas, _ = await asyncio.wait({tarefa}, timeout=intervalo)
+        if concluidas:
+            return True
+
+        if ha_entradas_novas(cliente_id, chat_id):
+            tarefa.cancel()
+            try:
+                await tarefa
+            except (asyncio.CancelledError, Exception):
+                pass
+            return False
+
+
+async def _gerar_com_supersessao(
+    cliente_id: int,
+    chat_id: str,
+    mensagem: str,
+    gerar: Callable[[str], Awaitable[Dict[str, Any]]],
+    drenadas: List[str],
+    filtrar: Optional[Callable[[Entradas], Entradas]] = None,
+    intencoes: Optional[Callable[[str], Any]] = None
+) -> Tuple[Dict[str, Any], str, Entradas]:
+    maximo = settings.PIPELINE_SUPERSESSAO_MAX
+    incorporadas: Entradas = []
+    rodada = 0
+
+    while True:
+        pode_supersedir = rodada < maximo
+        tarefa = asyncio.ensure_future(gerar(mensagem))
+
+        if pode_supersedir:
+            concluida = await _aguardar_ou_supersedir(tarefa, cliente_id, chat_id)
+        else:
+            await asyncio.wait({tarefa})
+            concluida = True
+
+        if concluida:
+            resultado = tarefa.result()
+            # Entrada nova entre o fim da geração e o envio também supersede
+            if not pode_supersedir or not ha_entradas_novas(cliente_id, chat_id):
+                return resultado, mensagem, incorporadas
+
+        novas = drenar_entradas_novas(cliente_id, chat_id, drenadas, filtrar)
+        if not novas:
+            if concluida:
+                return resultado, mensagem, incorporadas
+            # Buffer drenado por outro processo (ou só reenvios): gera de novo com o mesmo texto
+        else:
+            anterior = mensagem
+            mensagem = ' '.join([mensagem] + [texto for _, texto in novas]).strip()
+            incorporadas.extend(novas)
+            if intencoes is not None and intencoes(mensagem) != intencoes(anterior):
+                metrics.incrementar('pipeline.supersessao.rodadas_reiniciadas')
+                logger.info(f'[SUPERSESSÃO] Mensagem nova muda a intenção em {chat_id} - recomeçando a rodada')
+                raise ReiniciarRodada(mensagem, incorporadas)
+
+        rodada += 1
+        metrics.incrementar('pipeline.supersessao.geracoes_descartadas')
+        logger.info(
+            f'[SUPERSESSÃO] {len(novas)} mensagem(ns) nova(s) em {chat_id} - '
+            f'geração {"descartada" if concluida else "cancelada"}, gerando de novo'
+        )
+
+
+def gerar_com_supersessao(
+    cliente_id: int,
+    chat_id: str,
+    mensagem: str,
+    gerar: Callable[[str], Awaitable[Dict[str, Any]]],
+    drenadas: List[str],
+    filtrar: Optional[Callable[[Entradas], Entradas]] = None,
+    intencoes: Optional[Callable[[str], Any]] = None
+) -> Tuple[Dict[str, Any], str, Entradas]:
+    """
+    Gera a resposta, regerando enquanto chegarem mensagens novas no chat
+
+    Args:
+        cliente_id: ID do cliente
+        chat_id: ID do chat
+        mensagem: Texto da rodada
+        gerar: Corrotina que gera a resposta para um texto
+        drenadas: Recebe as entradas brutas drenadas do buffer durante a geração
+        filtrar: Remove entradas drenadas já processadas (reenvios do webhook)
+        intencoes: Intenções detectadas em um texto; se mudarem com o texto
+            novo, a rodada recomeça
+
+    Returns:
+        (resultado de gerar, texto final, entradas novas (message_id, texto) juntadas ao texto)
+
+    Raises:
+        ReiniciarRodada: O texto novo mudou as intenções detectadas
+    """
+    return executar_no_loop(_gerar_com_supersessao(cliente_id, chat_id, mensagem, gerar, drenadas, filtrar, intencoes))
@@ -0,0 +1,229 @@
+"""
+Processamento de eventos do webhook do WhatsApp (Evolution API)
+
+Usado tanto pelo endpoint POST /webhook/whatsapp (modo inline) quanto pelo
+worker de ingestão (modo stream), garantindo o mesmo comportamento nos dois.
+"""
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.services.conversations.message_buffer import buffer_messages
+from app.services.conversations.debounce_scheduler import registrar_presenca
+from app.services.conversations.deduplicacao import marcar_mensagens, desmarcar_mensagens
+from app.services.whatsapp.tenant_cache import resolver_tenant
+from app.db.models.cliente import ClienteStatus
+
+logger = logging.getLogger(__name__)
+
+
+def _extrair_mensagem(
+    message_data: Dict[str, Any],
+    event: str
+) -> Tuple[Optional[Tuple[str, str, Optional[str]]], Optional[str]]:
+    """
+    Extrai (chat_id, texto, message_id) de um item de messages.upsert
+
+    Returns:
+        ((chat_id, texto, message_id), None) se a mensagem deve ser processada,
+        (None, reason) se deve ser ignorada
+    """
+    # Extrair chat_id e mensagem
+    chat_id = message_data.get('key', {}).get('remoteJid')
+    message_id = message_data.get('key', {}).get('id')
+    from_me = message_data.get('key', {}).get('fromMe', False)
+    message = message_data.get('message', {}).get('conversation')
+
+    # IGNORAR MENSAGENS ENVIADAS PELO PRÓPRIO BOT
+    if from_me:
+        logger.info(f"⏭️ Mensagem própria ignorada: {chat_id}")
+        return None, 'own_message'
+
+    # Tentar outros formatos de mensagem
+    if not message:
+        msg_obj = message_data.get('message') or {}
+        message = (
+            msg_obj.get('extendedTextMessage', {}).get('text') or
+            msg_obj.get('imageMessage', {}).get('caption') or
+            msg_obj.get('videoMessage', {}).get('caption')
+        )
+
+    # Validações básicas
+    if not chat_id or not message:
+        logger.warning(f"⚠️ Webhook sem chat_id ou message | event: {event}")
+        return None, 'missing_data'
+
+    # Ignorar mensagens de grupo
+    if '@g.us' in chat_id:
+        logger.info(f"⚠️ Mensagem de grupo ignorada: {chat_id}")
+        return None, 'group_message'
+
+    return (chat_id, message, message_id), None
+
+
+async def _processar_presenca(
+    presence_data: Dict[str, Any],
+    instance_id: Optional[str],
+    db: Session
+) -> Dict[str, Any]:
+    """
+    Ajusta o prazo do debounce do chat a partir de um presence.update
+
+    Formato da Evolution API:
+        {"id": "<jid>", "presences": {"<jid>": {"lastKnownPresence": "composing"}}}
+    """
+    chat_id = presence_data.get('id')
+    presences = presence_data.get('presences') or {}
+
+    if not chat_id or '@g.us' in chat_id or not isinstance(presences, dict):
+        return {'status': 'ignored', 'reason': 'presence_event'}
+
+    entrada = presences.get(chat_id) or next(iter(presences.values()), None) or {}
+    presenca = entrada.get('lastKnownPresence')
+    if not presenca:
+        return {'status': 'ignored', 'reason': 'presence_event'}
+
+    numero = chat_id.replace('@s.whatsapp.net', '')
+    tenant = await resolver_tenant(db, instance_id, numero)
+    if not tenant or tenant['status'] != ClienteStatus.ATIVO.value:
+        return {'status': 'ignored', 'reason': 'presence_event'}
+
+    prazo = await registrar_presenca(
+        cliente_id=tenant['cliente_id'],
+        chat_id=chat_id,
+        presenca=presenca,
+        minimo=tenant.get('debounce_min'),
+        maximo=tenant.get('debounce_max')
+    )
+
+    logger.debug(f"⌨️ Presença {presenca} de {chat_id} | prazo: {prazo}")
+    return {'status': 'ok', 'presence': presenca}
+
+
+async def processar_evento_webhook(data: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    """
+    Processa um evento da Evolution API com isolamento por cliente
+
+    Quando a Evolution entrega várias mensagens no mesmo evento (lista em
+    'data', ex: reenvio de histórico após reconexão), todas são processadas:
+    as mensagens são agrupadas por chat e cada chat recebe uma única escrita
+    em pipeline no Redis e uma única decisão de debounce.
+
+    Args:
+        data: Payload do webhook já decodificado
+        db: Sessão do banco
+
+    Returns:
+        Dict com 'status' e, quando ignorado, 'reason'. Para lotes com mais
+        de uma mensagem, inclui também 'processadas' e 'ignoradas'.
+    """
+    # Extrair event type
+    event = data.get('event')
+    instance_id = data.get('instance')
+
+    # Presença (digitando, parou de digitar) ajusta o debounce do chat
+    if event == 'presence.update':
+        return await _processar_presenca(data.get('data') or {}, instance_id, db)
+
+    # Processar apenas eventos de mensagens
+    if event != 'messages.upsert':
+        logger.debug(f"⏭️ Evento ignorado: {event}")
+        return {'status': 'ignored', 'reason': 'not_message_event'}
+
+    # Extrair dados da mensagem (objeto único ou lista)
+    message_data = data.get('data', {})
+    mensagens = message_data if isinstance(message_data, list) else [message_data]
+
+    if len(mensagens) == 0:
+        logger.warning("⚠️ Lista de mensagens vazia")
+        return {'status': 'ignored', 'reason': 'empty_list'}
+
+    ignoradas: List[str] = []
+    candidatas: List[Tuple[str, str, Optional[str]]] = []
+
+    for item in mensagens:
+        if item is not None and not isinstance(item, dict):
+            # Item malformado no lote (ex: string): ignora só ele, não o evento inteiro
+            logger.warning(f"⚠️ Item inválido ignorado ({type(item).__name__}) | event: {event}")
+            ignoradas.append('invalid_item')
+            continue
+        extraida, reason = _extrair_mensagem(item or {}, event)
+        if not extraida:
+            ignoradas.append(reason)
+            continue
+        candidatas.append(extraida)
+
+    # Descartar reenvios antes de qualquer acesso ao banco (SET NX no Redis)
+    marcadas = [(chat_id, message_id) for chat_id, _, message_id in candidatas]
+    novas = await marcar_mensagens(instance_id, marcadas)
+
+    try:
+        # (cliente_id, chat_id) → (textos, ids, tenant), preservando a ordem de chegada
+        por_chat: Dict[Tuple[int, str], Tuple[List[str], List[Optional[str]], Dict[str, Any]]] = {}
+
+        for (chat_id, message, message_id), nova in zip(candidatas, novas):
+            if not nova:
+                logger.info(f"⏭️ Mensagem duplicada ignorada: {chat_id} | id: {message_id}")
+                ignoradas.append('duplicate')
+                continue
+
+            logger.info(f"📥 Mensagem recebida: {chat_id} | Instance: {instance_id}")
+
+            # Resolver cliente (cache LRU local → Redis → banco)
+            # Fallback por número: extrair do chat_id (remover @s.whatsapp.net)
+            numero = chat_id.replace('@s.whatsapp.net', '')
+            tenant = await resolver_tenant(db, instance_id, numero)
+
+            # Se não encontrou cliente, logar e ignorar
+            if not tenant:
+                logger.warning(f"⚠️ Cliente não encontrado para chat_id: {chat_id} | instance: {instance_id}")
+                ignoradas.append('client_not_found')
+                continue
+
+            cliente_id = tenant['cliente_id']
+
+            # Validar assinatura ativa
+            if tenant['status'] != ClienteStatus.ATIVO.value:
+                logger.warning(f"⚠️ Cliente {cliente_id} com status {tenant['status']} - mensagem ignorada")
+                ignoradas.append('inactive_subscription')
+                continue
+
+            textos, ids, _ = por_chat.setdefault((cliente_id, chat_id), ([], [], tenant))
+            textos.append(message)
+            ids.append(message_id)
+
+        # Uma escrita no Redis e um debounce por chat
+        processadas = 0
+        for (cliente_id, chat_id), (textos, ids, tenant) in por_chat.items():
+            await buffer_messages(
+                chat_id=chat_id,
+                messages=textos,
+                cliente_id=cliente_id,  # ← ISOLAMENTO MULTI-TENANT
+                message_ids=ids,
+                debounce_min=tenant.get('debounce_min'),
+                debounce_max=tenant.get('debounce_max')
+            )
+            processadas += len(textos)
+            logger.info(f"✅ {len(textos)} mensagem(ns) processada(s) para cliente {cliente_id}")
+
+    except Exception:
+        # Liberar os ids para que o reenvio do evento seja processado
+        await desmarcar_mensagens(
+            instance_id,
+            [m for m, nova in zip(marcadas, novas) if nova]
+        )
+        raise
+
+    # Evento com uma única mensagem: manter o formato de resposta original
+    if len(mensagens) == 1:
+        if processadas:
+            return {'status': 'ok'}
+        return {'status': 'ignored', 'reason': ignoradas[0]}
+
+    logger.info(f"📦 Lote processado: {processadas} mensagem(ns), {len(ignoradas)} ignorada(s), {len(por_chat)} chat(s)")
+    return {
+        'status': 'ok' if processadas else 'ignored',
+        'processadas': processadas,
+        'ignoradas': len(ignoradas)
+    }
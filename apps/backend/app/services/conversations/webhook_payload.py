@@ -0,0 +1,78 @@
+"""
+Decodificação do payload do webhook da Evolution API
+
+A maior parte do volume do webhook são eventos que o bot ignora
+(messages.update, connection.update, send.message...). O campo "event"
+é lido direto dos bytes, sem montar o dict, para descartar esses eventos
+antes de decodificar o JSON. Os eventos processados são decodificados com
+orjson. O log do payload é amostrado e truncado.
+"""
+import logging
+import random
+import re
+from typing import Any, Dict, Optional
+
+import orjson
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Eventos que seguem para decodificação completa e processamento
+EVENTOS_PROCESSADOS = {'messages.upsert', 'presence.update'}
+
+# A Evolution API envia "event" como primeira chave de topo do payload
+_EVENTO_RE = re.compile(rb'"event"\s*:\s*"([^"\\]{1,64})"')
+
+
+def extrair_evento(corpo: bytes) -> Optional[str]:
+    """
+    Lê o nome do evento direto dos bytes, sem decodificar o payload
+
+    Returns:
+        Nome do evento ou None se não encontrado
+    """
+    match = _EVENTO_RE.search(corpo, 0, 512)
+    if not match:
+        return None
+    return match.group(1).decode('utf-8', errors='replace')
+
+
+def motivo_ignorado(evento: Optional[str]) -> Optional[str]:
+    """
+    Verifica se o evento pode ser descartado sem decodificar o payload
+
+    Returns:
+        'not_message_event' ou None se o evento deve ser processado
+        (ou não foi possível identificá-lo)
+    """
+    if evento is None or evento in EVENTOS_PROCESSADOS:
+        return None
+    return 'not_message_event'
+
+
+def decodificar(corpo: bytes) -> Dict[str, Any]:
+    """
+    Decodifica o payload com orjson
+
+    Raises:
+        ValueError: Se o payload não é JSON válido ou não é um objeto
+    """
+    data = orjson.loads(corpo)
+    if not isinstance(data, dict):
+        raise ValueError('payload não é um objeto JSON')
+    return data
+
+
+def logar_payload(corpo: bytes, evento: Optional[str]):
+    """
+    Loga uma amostra dos payloads (WEBHOOK_LOG_SAMPLE_RATE), truncada em
+    WEBHOOK_LOG_MAX_CHARS. Com o logger em DEBUG todos são logados.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) and random.random() >= settings.WEBHOOK_LOG_SAMPLE_RATE:
+        return
+
+    limite = settings.WEBHOOK_LOG_MAX_CHARS
+    trecho = corpo[:limite].decode('utf-8', errors='replace')
+    sufixo = f'... (+{len(corpo) - limite} bytes)' if len(corpo) > limite else ''
+    logger.info(f"🔍 [WEBHOOK] Payload ({evento}): {trecho}{sufixo}")
@@ -156,7 +156,7 @@ class DicasIAService:
         Returns:
             Dict com dicas geradas
         """
-        from langchain_openai import ChatOpenAI
+        from app.services.llm.clients import obter_chat_model
         from langchain_core.messages import SystemMessage, HumanMessage
         from app.core.config import settings
         import json
@@ -164,10 +164,10 @@ class DicasIAService:
         logger.info("🤖 Gerando dicas com OpenAI")
         
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL,
-                temperature=0.7,
-                api_key=settings.OPENAI_API_KEY
+            llm = obter_chat_model(
+                settings.OPENAI_MODEL_NAME,
+                api_key=settings.OPENAI_API_KEY,
+                temperatura=0.7
             )
             
             system_prompt = """Você é um consultor de negócios especializado em SaaS e análise de métricas.
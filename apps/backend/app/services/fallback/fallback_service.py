@@ -9,6 +9,7 @@ from typing import Optional
 from app.db.models.conversa import Conversa, StatusConversa, MotivoFallback
 from app.services.configuracoes import ConfiguracaoService
 from app.services.email import EmailService
+from app.services.conversas import ConversaService
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,9 @@ class FallbackService:
         cliente_id: int,
         numero_whatsapp: str,
         motivo: str,
-        ultima_mensagem: Optional[str] = None
+        ultima_mensagem: Optional[str] = None,
+        conversa: Optional[Conversa] = None,
+        commit: bool = True
     ) -> Conversa:
         """
         Aciona fallback para atendimento humano
@@ -33,34 +36,32 @@ class FallbackService:
             numero_whatsapp: Número do WhatsApp
             motivo: Motivo do fallback ('baixa_confianca' ou 'solicitacao_manual')
             ultima_mensagem: Última mensagem do cliente (opcional)
+            conversa: Conversa já carregada pelo chamador (evita nova busca)
+            commit: Se False, só faz flush (o chamador controla a transação)
             
         Returns:
             Conversa: Conversa atualizada
         """
         # Buscar ou criar conversa
-        conversa = db.query(Conversa).filter(
-            Conversa.cliente_id == cliente_id,
-            Conversa.numero_whatsapp == numero_whatsapp
-        ).first()
+        if conversa is None:
+            conversa = db.query(Conversa).filter(
+                Conversa.cliente_id == cliente_id,
+                Conversa.numero_whatsapp == numero_whatsapp
+            ).first()
         
         if not conversa:
             conversa = Conversa(
                 cliente_id=cliente_id,
                 numero_whatsapp=numero_whatsapp,
-                status="aguardando_humano",
-                motivo_fallback=motivo,
                 ultima_mensagem_em=datetime.utcnow()
             )
-            db.add(conversa)
             logger.info(f"Nova conversa criada para fallback: {numero_whatsapp}")
         else:
-            conversa.status = "aguardando_humano"
-            conversa.motivo_fallback = motivo
             conversa.ultima_mensagem_em = datetime.utcnow()
             logger.info(f"Conversa {conversa.id} atualizada para aguardando_humano")
         
-        db.commit()
-        db.refresh(conversa)
+        # Sem commit, o estado do chat é gravado pela unit of work do pipeline depois do commit
+        ConversaService.alterar_status(db, conversa, "aguardando_humano", motivo_fallback=motivo, commit=commit)
         
         # Buscar configurações do cliente
         config = ConfiguracaoService.buscar_ou_criar(db, cliente_id)
@@ -73,7 +74,8 @@ class FallbackService:
                 number=numero_whatsapp,
                 text=mensagem_fallback,
                 db=db,
-                cliente_id=cliente_id
+                cliente_id=cliente_id,
+                commit=commit
             )
             logger.info(f"Mensagem de fallback enviada para {numero_whatsapp}")
         except Exception as e:
@@ -217,9 +219,7 @@ WhatsApp AI Bot
                 # TODO: WhatsAppService.enviar_mensagem(conversa.numero_whatsapp, config.mensagem_retorno_24h)
                 
                 # Voltar para modo automático
-                conversa.status = "ativa"
-                conversa.motivo_fallback = None
-                db.commit()
+                ConversaService.alterar_status(db, conversa, "ativa")
                 
                 logger.info(f"Conversa {conversa.id} voltou para modo automático após 24h")
                 
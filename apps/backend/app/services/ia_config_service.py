@@ -1,11 +1,30 @@
 """
 Serviço para gerenciar configurações de IA
+
+Os provedores configurados (ordem de tentativa + chaves descriptografadas)
+ficam em memória por IA_CONFIG_CACHE_TTL: o pipeline não abre sessão nem
+consulta ia_configuracoes a cada mensagem. As rotas de api/v1/ia_config
+chamam invalidar() depois de gravar; outros processos enxergam a mudança
+quando o TTL expira.
 """
 from sqlalchemy.orm import Session
 import base64
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+from cachetools import TTLCache
 
+from app.core.config import settings
 from app.db.models.ia_configuracao import IAConfiguracao
 
+logger = logging.getLogger(__name__)
+
+_CHAVE_PROVEDORES = 'provedores'
+
+_cache = TTLCache(maxsize=1, ttl=settings.IA_CONFIG_CACHE_TTL)
+_lock = threading.Lock()
+
 
 class IAConfigService:
     
@@ -33,3 +52,68 @@ class IAConfigService:
         api_key = IAConfigService.decrypt_key(config.api_key_encrypted)
         
         return (config.provedor, config.modelo, api_key)
+    
+    @staticmethod
+    def listar_provedores(db: Optional[Session] = None) -> List[Tuple[str, str, str]]:
+        """
+        Provedores configurados na ordem de tentativa: o ativo primeiro, depois os outros
+        
+        Usa o cache em memória; em miss, uma única query (com a sessão
+        informada ou uma própria).
+        
+        Returns:
+            Lista de (provedor, modelo, api_key)
+        """
+        with _lock:
+            provedores = _cache.get(_CHAVE_PROVEDORES)
+        if provedores is not None:
+            return list(provedores)
+        
+        if db is not None:
+            provedores = IAConfigService._carregar_provedores(db)
+        else:
+            from app.db.session import SessionLocal
+            
+            db = SessionLocal()
+            try:
+                provedores = IAConfigService._carregar_provedores(db)
+            finally:
+                db.close()
+        
+        with _lock:
+            _cache[_CHAVE_PROVEDORES] = tuple(provedores)
+        return provedores
+    
+    @staticmethod
+    def _carregar_provedores(db: Session) -> List[Tuple[str, str, str]]:
+        configs = db.query(IAConfiguracao).filter(
+            IAConfiguracao.configurado.is_(True),
+            IAConfiguracao.api_key_encrypted.isnot(None)
+        ).order_by(IAConfiguracao.ativo.desc(), IAConfiguracao.id).all()
+        
+        provedores = []
+        for cfg in configs:
+            try:
+                provedores.append((cfg.provedor, cfg.modelo, IAConfigService.decrypt_key(cfg.api_key_encrypted)))
+            except Exception as e:
+                logger.error(f"❌ [IA CONFIG] Chave inválida para {cfg.provedor}: {e}")
+        
+        logger.info(f"🔑 [IA CONFIG] {len(provedores)} provedor(es) carregado(s) do banco")
+        return provedores
+    
+    @staticmethod
+    def invalidar(chaves_alteradas: bool = False):
+        """
+        Descarta os provedores em cache (chamar após alterar ia_configuracoes)
+        
+        Args:
+            chaves_alteradas: Se uma API key foi trocada/removida, descarta também
+                os clientes LLM criados com as chaves antigas
+        """
+        with _lock:
+            _cache.clear()
+        
+        if chaves_alteradas:
+            from app.services.llm.clients import invalidar as invalidar_clientes_llm
+            
+            invalidar_clientes_llm()
@@ -7,7 +7,6 @@ from typing import Optional
 from langchain_classic.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain_classic.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_openai import ChatOpenAI
 
 from app.core.config import (
     OPENAI_MODEL_NAME,
@@ -16,6 +15,7 @@ from app.core.config import (
 from app.services.conversations.memory import get_session_history
 from app.services.rag.vectorstore import get_vectorstore
 from app.services.llm.prompts import contextualize_prompt, qa_prompt
+from app.services.llm.clients import obter_chat_model
 
 logger = logging.getLogger(__name__)
 
@@ -30,10 +30,7 @@ def get_rag_chain(cliente_id: Optional[int] = None):
     Returns:
         RAG chain configurada
     """
-    llm = ChatOpenAI(
-        model=OPENAI_MODEL_NAME,
-        temperature=OPENAI_MODEL_TEMPERATURE,
-    )
+    llm = obter_chat_model(OPENAI_MODEL_NAME, temperatura=float(OPENAI_MODEL_TEMPERATURE))
     
     # Obter vectorstore do cliente específico
     vectorstore = get_vectorstore(cliente_id)
@@ -0,0 +1,188 @@
+"""
+Circuit breaker dos provedores LLM (por provedor/modelo)
+
+O estado fica no Redis, compartilhado por todos os workers:
+
+    llm:circuito:{provedor}:{modelo}            hash estado / aberto_ate / sondagem_ate
+    llm:circuito:{provedor}:{modelo}:{balde}    hash total / falhas / lentas (TTL = janela)
+
+Estados:
+- fechado: chamadas liberadas; cada resultado soma no balde atual. Com pelo
+  menos LLM_CB_MINIMO_CHAMADAS na janela e (falhas + lentas) / total acima de
+  LLM_CB_LIMIAR_FALHAS, o circuito abre.
+- aberto: chamadas recusadas (o AIService passa direto para o próximo
+  provedor) até LLM_CB_ABERTURA_SEGUNDOS.
+- meio_aberto: uma única chamada de sondagem é liberada. Sucesso fecha o
+  circuito (janela zerada); falha ou lentidão abre de novo.
+
+Transições são scripts Lua (atômicos entre workers). Falha aberto: com o
+Redis indisponível, todas as chamadas são liberadas.
+"""
+import logging
+import time
+from typing import List
+
+import redis
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.Redis.from_url(settings.CACHE_REDIS_URI, decode_responses=True)
+
+MEIO_ABERTO = 'meio_aberto'
+
+# ARGV[1] = agora, ARGV[2] = tempo máximo de uma sondagem
+# Retorna {liberado (0/1), estado}
+_LUA_PERMITIR = """
+local estado = redis.call('HGET', KEYS[1], 'estado') or 'fechado'
+local agora = tonumber(ARGV[1])
+
+if estado == 'fechado' then
+    return {1, estado}
+end
+
+if estado == 'aberto' then
+    if agora < tonumber(redis.call('HGET', KEYS[1], 'aberto_ate') or 0) then
+        return {0, estado}
+    end
+    redis.call('HSET', KEYS[1], 'estado', 'meio_aberto', 'sondagem_ate', agora + tonumber(ARGV[2]))
+    return {1, 'meio_aberto'}
+end
+
+-- meio_aberto: só libera outra sondagem se a anterior não voltou no prazo
+if agora < tonumber(redis.call('HGET', KEYS[1], 'sondagem_ate') or 0) then
+    return {0, estado}
+end
+redis.call('HSET', KEYS[1], 'sondagem_ate', agora + tonumber(ARGV[2]))
+return {1, estado}
+"""
+
+# KEYS[1] = estado, KEYS[2] = balde atual, KEYS[3..] = baldes anteriores da janela
+# ARGV[1] = agora, ARGV[2] = falhou (0/1), ARGV[3] = lenta (0/1), ARGV[4] = TTL dos baldes,
+# ARGV[5] = mínimo de chamadas, ARGV[6] = limiar, ARGV[7] = segundos aberto
+# Retorna 'abriu', 'fechou' ou o estado (sem transição)
+_LUA_REGISTRAR = """
+local estado = redis.call('HGET', KEYS[1], 'estado') or 'fechado'
+local agora = tonumber(ARGV[1])
+local ruim = ARGV[2] == '1' or ARGV[3] == '1'
+
+if estado == 'meio_aberto' then
+    if ruim then
+        redis.call('HSET', KEYS[1], 'estado', 'aberto', 'aberto_ate', agora + tonumber(ARGV[7]))
+        return 'abriu'
+    end
+    redis.call('DEL', KEYS[1], unpack(KEYS, 2))
+    return 'fechou'
+end
+
+if estado == 'aberto' then
+    -- Resultado de uma chamada iniciada antes de abrir: não muda nada
+    return estado
+end
+
+redis.call('HINCRBY', KEYS[2], 'total', 1)
+if ARGV[2] == '1' then redis.call('HINCRBY', KEYS[2], 'falhas', 1) end
+if ARGV[3] == '1' then redis.call('HINCRBY', KEYS[2], 'lentas', 1) end
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+
+if not ruim then
+    return estado
+end
+
+local total, ruins = 0, 0
+for i = 2, #KEYS do
+    local balde = redis.call('HMGET', KEYS[i], 'total', 'falhas', 'lentas')
+    total = total + tonumber(balde[1] or 0)
+    ruins = ruins + tonumber(balde[2] or 0) + tonumber(balde[3] or 0)
+end
+
+if total >= tonumber(ARGV[5]) and ruins / total >= tonumber(ARGV[6]) then
+    redis.call('HSET', KEYS[1], 'estado', 'aberto', 'aberto_ate', agora + tonumber(ARGV[7]))
+    return 'abriu'
+end
+return estado
+"""
+
+_permitir = redis_client.register_script(_LUA_PERMITIR)
+_registrar = redis_client.register_script(_LUA_REGISTRAR)
+
+
+class CircuitoAbertoError(Exception):
+    """Nenhum provedor LLM disponível (todos com o circuito aberto)"""
+
+
+def _chave(provedor: str, modelo: str) -> str:
+    return f'llm:circuito:{provedor}:{modelo}'
+
+
+def _nome(provedor: str) -> str:
+    # '.env' (modelo de último recurso do AIService) vira 'env' nas chaves e métricas
+    return provedor.lstrip('.')
+
+
+def _chaves_janela(provedor: str, modelo: str, agora: float) -> List[str]:
+    """Chaves dos baldes da janela, o atual primeiro"""
+    balde = int(agora // settings.LLM_CB_BALDE_SEGUNDOS)
+    quantidade = max(1, -(-settings.LLM_CB_JANELA_SEGUNDOS // settings.LLM_CB_BALDE_SEGUNDOS))
+    return [f'{_chave(provedor, modelo)}:{balde - i}' for i in range(quantidade)]
+
+
+def permitir(provedor: str, modelo: str) -> bool:
+    """
+    Se uma chamada a provedor/modelo pode ser feita agora
+
+    Em meio_aberto, só o chamador que recebe True faz a sondagem.
+    """
+    provedor = _nome(provedor)
+    try:
+        liberado, estado = _permitir(
+            keys=[_chave(provedor, modelo)],
+            args=[time.time(), settings.LLM_CB_SONDAGEM_SEGUNDOS]
+        )
+    except Exception as e:
+        logger.warning(f'[CIRCUITO] Redis indisponível, liberando {provedor}/{modelo}: {e}')
+        return True
+
+    if not int(liberado):
+        metrics.incrementar(f'llm.circuito.{provedor}.recusadas')
+        return False
+    if estado == MEIO_ABERTO:
+        logger.info(f'[CIRCUITO] {provedor}/{modelo} meio aberto - chamada de sondagem')
+    return True
+
+
+def registrar(provedor: str, modelo: str, sucesso: bool, duracao: float):
+    """
+    Registra o resultado de uma chamada (falha, ou sucesso com a duração)
+
+    Chamadas canceladas (supersessão) não devem ser registradas.
+    """
+    provedor = _nome(provedor)
+    agora = time.time()
+    lenta = sucesso and duracao >= settings.LLM_CB_LATENCIA_LENTA_SEGUNDOS
+    chave = _chave(provedor, modelo)
+
+    try:
+        transicao = _registrar(
+            keys=[chave, *_chaves_janela(provedor, modelo, agora)],
+            args=[
+                agora,
+                0 if sucesso else 1,
+                1 if lenta else 0,
+                settings.LLM_CB_JANELA_SEGUNDOS + settings.LLM_CB_BALDE_SEGUNDOS,
+                settings.LLM_CB_MINIMO_CHAMADAS,
+                settings.LLM_CB_LIMIAR_FALHAS,
+                settings.LLM_CB_ABERTURA_SEGUNDOS
+            ]
+        )
+    except Exception as e:
+        logger.warning(f'[CIRCUITO] Erro ao registrar resultado de {provedor}/{modelo}: {e}')
+        return
+
+    if transicao == 'abriu':
+        metrics.incrementar(f'llm.circuito.{provedor}.aberturas')
+        logger.error(f'🔌 [CIRCUITO] {provedor}/{modelo} aberto por {settings.LLM_CB_ABERTURA_SEGUNDOS}s')
+    elif transicao == 'fechou':
+        logger.info(f'✅ [CIRCUITO] {provedor}/{modelo} respondeu à sondagem - circuito fechado')
@@ -0,0 +1,204 @@
+"""
+Registro de clientes LLM compartilhados
+
+Criar um ChatOpenAI/OpenAI por mensagem abre uma conexão nova (TCP + TLS) a
+cada chamada. Aqui os clientes são criados uma vez por (provedor, modelo,
+chave, temperatura) e reutilizam o pool de conexões HTTP:
+
+- chamadas síncronas (invoke, stream, SDK OpenAI) usam um httpx.Client
+  único por processo (thread-safe)
+- chamadas async (ainvoke, astream) usam um httpx.AsyncClient por event
+  loop, porque conexões async não podem ser usadas em outro loop
+
+Timeouts, tamanho do pool e retentativas vêm de LLM_* nas settings.
+
+Código síncrono (threads do pipeline) roda corrotinas com executar_no_loop,
+que reutiliza um event loop por thread (e, com ele, o pool async do loop).
+
+Uso:
+    llm = obter_chat_model('gpt-4o-mini', api_key=..., temperatura=0)
+    resposta = llm.invoke(messages)         # ou: await llm.ainvoke(messages)
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import weakref
+from typing import Awaitable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+from langchain_openai import ChatOpenAI
+from openai import OpenAI
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+_http_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = weakref.WeakKeyDictionary()
+_chat_models: Dict[Tuple, ChatOpenAI] = {}
+_chat_models_async: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, ChatOpenAI]]' = weakref.WeakKeyDictionary()
+_openai_clients: Dict[str, OpenAI] = {}
+_local = threading.local()
+
+T = TypeVar('T')
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS)
+
+
+def _limites() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE
+    )
+
+
+def _hash_chave(api_key: Optional[str]) -> str:
+    # A chave não fica em claro no registro (só o hash)
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+
+
+def _loop_atual() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def executar_no_loop(corrotina: Awaitable[T]) -> T:
+    """Roda a corrotina no event loop persistente da thread atual (fora de um loop)"""
+    loop = getattr(_local, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _local.loop = loop
+    return loop.run_until_complete(corrotina)
+
+
+def obter_http_client() -> httpx.Client:
+    """Pool HTTP síncrono compartilhado pelo processo"""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(timeout=_timeout(), limits=_limites())
+        return _http_client
+
+
+def _obter_http_async_client(loop: asyncio.AbstractEventLoop) -> httpx.AsyncClient:
+    cliente = _http_async_clients.get(loop)
+    if cliente is None:
+        cliente = httpx.AsyncClient(timeout=_timeout(), limits=_limites())
+        _http_async_clients[loop] = cliente
+    return cliente
+
+
+def obter_chat_model(
+    modelo: str,
+    api_key: Optional[str] = None,
+    temperatura: float = 0.0,
+    provedor: str = 'openai'
+) -> ChatOpenAI:
+    """
+    ChatOpenAI compartilhado para (provedor, modelo, chave, temperatura)
+
+    Chamado dentro de um event loop, retorna a instância daquele loop
+    (ainvoke/astream usam o pool async do loop); fora, a instância síncrona.
+
+    Args:
+        modelo: Nome do modelo
+        api_key: Chave do provedor (None = OPENAI_API_KEY do ambiente)
+        temperatura: Temperatura
+        provedor: Só 'openai' é suportado
+
+    Raises:
+        ValueError: Provedor não suportado
+    """
+    if provedor != 'openai':
+        raise ValueError(f'Provedor LLM não suportado: {provedor}')
+
+    chave = (provedor, modelo, _hash_chave(api_key), float(temperatura))
+    loop = _loop_atual()
+
+    with _lock:
+        modelos = _chat_models if loop is None else _chat_models_async.setdefault(loop, {})
+        llm = modelos.get(chave)
+        if llm is not None:
+            return llm
+
+    http_client = obter_http_client()
+
+    with _lock:
+        llm = modelos.get(chave)
+        if llm is None:
+            argumentos = dict(
+                model=modelo,
+                temperature=float(temperatura),
+                timeout=_timeout(),
+                max_retries=settings.LLM_MAX_RETRIES,
+                http_client=http_client
+            )
+            if api_key:
+                argumentos['api_key'] = api_key
+            if loop is not None:
+                argumentos['http_async_client'] = _obter_http_async_client(loop)
+
+            llm = ChatOpenAI(**argumentos)
+            modelos[chave] = llm
+            logger.info(f'[LLM] Cliente criado: {provedor}/{modelo} (temperatura {temperatura})')
+        return llm
+
+
+def obter_openai(api_key: Optional[str] = None) -> OpenAI:
+    """Cliente do SDK da OpenAI compartilhado (mesmo pool HTTP síncrono)"""
+    api_key = api_key or settings.OPENAI_API_KEY
+    chave = _hash_chave(api_key)
+
+    with _lock:
+        cliente = _openai_clients.get(chave)
+    if cliente is not None:
+        return cliente
+
+    http_client = obter_http_client()
+
+    with _lock:
+        cliente = _openai_clients.get(chave)
+        if cliente is None:
+            cliente = OpenAI(
+                api_key=api_key,
+                timeout=_timeout(),
+                max_retries=settings.LLM_MAX_RETRIES,
+                http_client=http_client
+            )
+            _openai_clients[chave] = cliente
+        return cliente
+
+
+def invalidar(api_key: Optional[str] = None):
+    """
+    Descarta clientes em cache (ex: chave do provedor trocada)
+
+    Args:
+        api_key: Descarta só os clientes dessa chave (None = todos)
+    """
+    with _lock:
+        registros = [_chat_models, *_chat_models_async.values()]
+        for modelos in registros:
+            for chave in list(modelos):
+                if api_key is None or chave[2] == _hash_chave(api_key):
+                    del modelos[chave]
+        if api_key is None:
+            _openai_clients.clear()
+        else:
+            _openai_clients.pop(_hash_chave(api_key), None)
+
+
+def fechar():
+    """Fecha o pool HTTP síncrono e descarta os clientes (encerramento do processo)"""
+    global _http_client
+    invalidar()
+    with _lock:
+        cliente, _http_client = _http_client, None
+    if cliente is not None:
+        cliente.close()
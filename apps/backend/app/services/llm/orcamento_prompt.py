@@ -0,0 +1,195 @@
+"""
+Montagem do prompt dentro de um orçamento de tokens
+
+Sem limite, o prompt cresce com o conhecimento: o fallback da busca embute
+o texto estruturado inteiro (até 50.000 caracteres) e o histórico entra com
+as últimas 10 mensagens sem medir nada. Aqui os tokens são contados com o
+tiktoken (ou estimados em ~4 caracteres por token, se o tokenizer não
+carregar) e o orçamento é preenchido por prioridade:
+
+    1. prefixo, instruções (sem conhecimento) e mensagem atual - sempre
+    2. trechos do conhecimento, na ordem da busca (o que estoura é cortado
+       por linha)
+    3. turnos recentes (LLM_PROMPT_MENSAGENS_RECENTES últimas mensagens)
+    4. turnos antigos
+
+O histórico entra sempre contíguo a partir da mensagem mais recente. O que
+fica de fora volta em 'descartados' e é publicado em prompt.* nas métricas.
+
+Uso:
+    prompt = montar_prompt(instrucoes, contexto_texto, historico, mensagem, orcamento=6000, prefixo=prefixo)
+    messages = [
+        SystemMessage(prefixo), *prompt['historico'],
+        SystemMessage(prompt['system_prompt']), HumanMessage(mensagem)
+    ]
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import tiktoken
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tokens de formatação de cada mensagem no formato de chat (role, separadores)
+TOKENS_POR_MENSAGEM = 4
+
+_lock = threading.Lock()
+_codificadores: Dict[str, Any] = {}
+
+
+class _Estimativa:
+    """Contagem aproximada (~4 caracteres por token) quando o tiktoken não carrega"""
+
+    def encode(self, texto: str, disallowed_special=()):
+        # Arredonda para cima: a soma das linhas nunca fica abaixo do texto inteiro
+        return range((len(texto) + 3) // 4)
+
+
+def _codificador(modelo: Optional[str]):
+    chave = modelo or ''
+    with _lock:
+        codificador = _codificadores.get(chave)
+    if codificador is not None:
+        return codificador
+
+    try:
+        try:
+            codificador = tiktoken.encoding_for_model(modelo) if modelo else None
+        except KeyError:
+            codificador = None
+        if codificador is None:
+            codificador = tiktoken.get_encoding(settings.LLM_PROMPT_ENCODING_PADRAO)
+    except Exception as e:
+        # O tiktoken baixa o arquivo BPE na primeira carga; sem rede (ou sem cache
+        # em TIKTOKEN_CACHE_DIR) o prompt segue com a estimativa, sem nova tentativa
+        metrics.incrementar('prompt.tokenizer_indisponivel')
+        logger.warning(f'[PROMPT] Tokenizer indisponível ({e}); usando estimativa de ~4 caracteres por token')
+        codificador = _Estimativa()
+
+    with _lock:
+        _codificadores[chave] = codificador
+    return codificador
+
+
+def contar_tokens(texto: str, modelo: Optional[str] = None) -> int:
+    """Tokens do texto no tokenizer do modelo (modelo desconhecido = LLM_PROMPT_ENCODING_PADRAO)"""
+    if not texto:
+        return 0
+    return len(_codificador(modelo).encode(texto, disallowed_special=()))
+
+
+def _trechos(contexto: str) -> List[str]:
+    # Trechos da busca (e parágrafos do conhecimento do banco) vêm separados por linha em branco
+    return [trecho for trecho in (contexto or '').split('\n\n') if trecho.strip()]
+
+
+def cortar_por_linha(trecho: str, disponivel: int, modelo: Optional[str] = None) -> str:
+    """Primeiras linhas inteiras do texto que cabem em `disponivel` tokens"""
+    linhas = []
+    usados = 0
+    for linha in trecho.split('\n'):
+        tokens = contar_tokens(linha + '\n', modelo)
+        if usados + tokens > disponivel:
+            break
+        linhas.append(linha)
+        usados += tokens
+    return '\n'.join(linhas).strip()
+
+
+def montar_prompt(
+    instrucoes: Callable[[str], str],
+    contexto: str,
+    historico: List[Any],
+    mensagem: str,
+    orcamento: int,
+    modelo: Optional[str] = None,
+    prefixo: str = ''
+) -> Dict[str, Any]:
+    """
+    Escolhe o conhecimento e o histórico que cabem no orçamento
+
+    Args:
+        instrucoes: Monta o system prompt a partir do texto de conhecimento
+        contexto: Texto de conhecimento (trechos separados por linha em branco)
+        historico: Mensagens anteriores (mais antiga primeiro; objetos com .content)
+        mensagem: Mensagem atual do usuário
+        orcamento: Máximo de tokens do prompt
+        modelo: Modelo para escolher o tokenizer
+        prefixo: Parte fixa do prompt (ex: prefixo estável do cliente), sempre incluída
+
+    Returns:
+        Dict com 'system_prompt', 'historico' (mensagens mantidas),
+        'tokens' (estimativa do prompt) e 'descartados'
+        ({'trechos', 'trechos_cortados', 'mensagens', 'tokens'})
+    """
+    usados = (
+        contar_tokens(prefixo, modelo) + contar_tokens(instrucoes(''), modelo)
+        + contar_tokens(mensagem, modelo) + (3 if prefixo else 2) * TOKENS_POR_MENSAGEM
+    )
+    if usados > orcamento:
+        logger.warning(f'[PROMPT] Prefixo, instruções e mensagem já somam {usados} tokens (orçamento {orcamento})')
+
+    descartados = {'trechos': 0, 'trechos_cortados': 0, 'mensagens': 0, 'tokens': 0}
+
+    # 2. Conhecimento, na ordem da busca
+    trechos = _trechos(contexto)
+    mantidos = []
+    for indice, trecho in enumerate(trechos):
+        tokens = contar_tokens(trecho + '\n\n', modelo)
+        if usados + tokens <= orcamento:
+            mantidos.append(trecho)
+            usados += tokens
+            continue
+
+        cortado = cortar_por_linha(trecho, orcamento - usados, modelo)
+        if cortado:
+            mantidos.append(cortado)
+            usados += contar_tokens(cortado + '\n\n', modelo)
+            descartados['trechos_cortados'] = 1
+            descartados['tokens'] += tokens - contar_tokens(cortado + '\n\n', modelo)
+        else:
+            descartados['trechos'] += 1
+            descartados['tokens'] += tokens
+        for restante in trechos[indice + 1:]:
+            descartados['trechos'] += 1
+            descartados['tokens'] += contar_tokens(restante + '\n\n', modelo)
+        break
+
+    # 3 e 4. Histórico da mais recente para a mais antiga (recentes antes das antigas)
+    recentes = settings.LLM_PROMPT_MENSAGENS_RECENTES
+    mantidas = 0
+    for posicao, mensagem_anterior in enumerate(reversed(historico)):
+        tokens = contar_tokens(str(mensagem_anterior.content or ''), modelo) + TOKENS_POR_MENSAGEM
+        if usados + tokens > orcamento:
+            descartadas = historico[:len(historico) - posicao]
+            descartados['mensagens'] = len(descartadas)
+            descartados['tokens'] += sum(
+                contar_tokens(str(m.content or ''), modelo) + TOKENS_POR_MENSAGEM for m in descartadas
+            )
+            if posicao < recentes:
+                logger.warning(f'[PROMPT] Orçamento sem espaço para os {recentes} turnos recentes')
+            break
+        usados += tokens
+        mantidas += 1
+
+    if descartados['tokens']:
+        metrics.incrementar('prompt.trechos_descartados', descartados['trechos'])
+        metrics.incrementar('prompt.mensagens_descartadas', descartados['mensagens'])
+        metrics.incrementar('prompt.tokens_descartados', descartados['tokens'])
+        logger.info(
+            f'[PROMPT] Orçamento de {orcamento} tokens: {descartados["trechos"]} trecho(s) e '
+            f'{descartados["mensagens"]} mensagem(ns) do histórico descartados '
+            f'({descartados["tokens"]} tokens)'
+        )
+    metrics.observar('prompt.tokens', usados)
+
+    return {
+        'system_prompt': instrucoes('\n\n'.join(mantidos)),
+        'historico': historico[len(historico) - mantidas:] if mantidas else [],
+        'tokens': usados,
+        'descartados': descartados
+    }
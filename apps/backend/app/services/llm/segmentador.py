@@ -0,0 +1,84 @@
+"""
+Segmentação do texto de uma resposta em streaming
+
+Os tokens chegam aos pedaços; o segmentador acumula e devolve trechos
+completos para envio ao WhatsApp:
+
+- o primeiro segmento sai no primeiro fim de frase (ou de parágrafo) depois
+  de `minimo_primeiro` caracteres: é o que o contato vê primeiro
+- os seguintes saem a cada parágrafo ou, em parágrafos longos, no último
+  fim de frase depois de `tamanho_alvo` caracteres (evita uma mensagem por
+  frase)
+
+Fim de frase é . ! ? ou … seguido de espaço: pontuação sem espaço depois
+("R$ 3.50", "site.com") e abreviações comuns ("Sr.", "Dra.") não cortam.
+"""
+import re
+from typing import List, Optional
+
+_FIM_FRASE = re.compile(r'[.!?…]+["\')\]]*(?=\s)')
+_PARAGRAFO = re.compile(r'\n\s*\n')
+_ABREVIACOES = {'sr', 'sra', 'srta', 'dr', 'dra', 'prof', 'profa', 'av', 'n', 'nº', 'no', 'tel', 'obs', 'ex'}
+
+
+class SegmentadorFrases:
+    """Acumula o texto em streaming e devolve segmentos prontos para envio"""
+
+    def __init__(self, minimo_primeiro: int = 40, tamanho_alvo: int = 400):
+        self.minimo_primeiro = minimo_primeiro
+        self.tamanho_alvo = tamanho_alvo
+        self.emitidos = 0
+        self._buffer = ''
+
+    def adicionar(self, texto: str) -> List[str]:
+        """Acrescenta um pedaço do texto e retorna os segmentos completos"""
+        self._buffer += texto or ''
+        segmentos = []
+
+        while True:
+            corte = self._proximo_corte()
+            if corte is None:
+                return segmentos
+
+            segmento = self._buffer[:corte].strip()
+            self._buffer = self._buffer[corte:]
+            if segmento:
+                segmentos.append(segmento)
+                self.emitidos += 1
+
+    def finalizar(self) -> Optional[str]:
+        """Resto do texto no fim da geração (None se vazio)"""
+        segmento = self._buffer.strip()
+        self._buffer = ''
+        if not segmento:
+            return None
+        self.emitidos += 1
+        return segmento
+
+    def _fins_de_frase(self) -> List[int]:
+        fins = []
+        for fim in _FIM_FRASE.finditer(self._buffer):
+            palavra = re.split(r'\s', self._buffer[:fim.start()])[-1].lower()
+            if fim.group().startswith('.') and palavra in _ABREVIACOES:
+                continue
+            fins.append(fim.end())
+        return fins
+
+    def _proximo_corte(self) -> Optional[int]:
+        paragrafos = [p.end() for p in _PARAGRAFO.finditer(self._buffer)]
+
+        if self.emitidos == 0:
+            for corte in sorted(paragrafos + self._fins_de_frase()):
+                if len(self._buffer[:corte].strip()) >= self.minimo_primeiro:
+                    return corte
+            return None
+
+        for corte in paragrafos:
+            if self._buffer[:corte].strip():
+                return corte
+
+        if len(self._buffer) >= self.tamanho_alvo:
+            fins = self._fins_de_frase()
+            if fins:
+                return fins[-1]
+        return None
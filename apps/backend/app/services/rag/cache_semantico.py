@@ -0,0 +1,168 @@
+"""
+Cache semântico de respostas (por cliente)
+
+Complementa o cache exato (app/services/ai/cache_respostas): perguntas com
+outras palavras ("vocês aceitam pix?" / "posso pagar no pix?") reaproveitam
+a resposta quando a similaridade de cosseno entre os embeddings passa do
+limiar do cliente (configuracoes_bot.limiar_cache_semantico, padrão
+CACHE_SEMANTICO_LIMIAR).
+
+O embedding é o mesmo da busca no vectorstore: calculado uma vez por
+mensagem e reutilizado pela recuperação em caso de miss.
+
+Organização em memória (por processo):
+- um balde por (cliente_id, tom, versão do conhecimento), em um LRU de até
+  CACHE_SEMANTICO_MAX_CLIENTES baldes: ao mudar a versão, os baldes antigos
+  deixam de ser consultados e saem pelo LRU
+- até CACHE_SEMANTICO_MAX_POR_CLIENTE respostas por balde (sai a usada há
+  mais tempo) e cada resposta expira em CACHE_RESPOSTAS_TTL
+
+As respostas são guardadas sem o nome do contato (mesmo marcador do cache
+exato). Métricas: cache_semantico.acertos / cache_semantico.falhas e o
+histograma cache_semantico.similaridade (melhor similaridade da busca).
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.ai.cache_respostas import despersonalizar, personalizar
+
+_lock = threading.Lock()
+
+
+class _Balde:
+    """Respostas de um cliente/tom/versão, com os embeddings normalizados em uma matriz"""
+
+    def __init__(self):
+        self.vetores: Optional[np.ndarray] = None  # (n, dimensão)
+        self.entradas: List[Dict[str, Any]] = []    # resposta, confianca, expira_em, usado_em
+
+    def remover_expiradas(self, agora: float):
+        manter = [i for i, entrada in enumerate(self.entradas) if entrada['expira_em'] > agora]
+        if len(manter) != len(self.entradas):
+            self.entradas = [self.entradas[i] for i in manter]
+            self.vetores = self.vetores[manter] if manter else None
+
+    def adicionar(self, vetor: np.ndarray, entrada: Dict[str, Any]):
+        if self.vetores is not None and len(self.entradas) >= settings.CACHE_SEMANTICO_MAX_POR_CLIENTE:
+            menos_usada = min(range(len(self.entradas)), key=lambda i: self.entradas[i]['usado_em'])
+            self.entradas.pop(menos_usada)
+            self.vetores = np.delete(self.vetores, menos_usada, axis=0)
+
+        linha = vetor.reshape(1, -1)
+        self.vetores = linha if self.vetores is None else np.vstack([self.vetores, linha])
+        self.entradas.append(entrada)
+
+    def mais_similar(self, vetor: np.ndarray) -> Tuple[Optional[Dict[str, Any]], float]:
+        if self.vetores is None or self.vetores.shape[1] != vetor.shape[0]:
+            return None, 0.0
+        similaridades = self.vetores @ vetor
+        indice = int(np.argmax(similaridades))
+        return self.entradas[indice], float(similaridades[indice])
+
+
+_baldes: LRUCache = LRUCache(maxsize=settings.CACHE_SEMANTICO_MAX_CLIENTES)
+
+
+def _normalizar(embedding: List[float]) -> Optional[np.ndarray]:
+    vetor = np.asarray(embedding, dtype=np.float32)
+    norma = float(np.linalg.norm(vetor))
+    return vetor / norma if norma > 0 else None
+
+
+def buscar(
+    cliente_id: int,
+    embedding: List[float],
+    tom: str,
+    versao: int,
+    limiar: Optional[float] = None,
+    nome_usuario: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Resposta em cache para uma pergunta semelhante
+
+    Args:
+        cliente_id: ID do cliente
+        embedding: Embedding da mensagem
+        tom: Tom das respostas
+        versao: Versão do conhecimento do cliente
+        limiar: Similaridade mínima (None = CACHE_SEMANTICO_LIMIAR)
+        nome_usuario: Nome do contato (aplicado na resposta)
+
+    Returns:
+        Dict com 'resposta', 'confianca' e 'similaridade', ou None
+    """
+    limiar = settings.CACHE_SEMANTICO_LIMIAR if limiar is None else limiar
+    vetor = _normalizar(embedding)
+    agora = time.time()
+
+    entrada, similaridade = None, 0.0
+    if vetor is not None:
+        with _lock:
+            balde = _baldes.get((cliente_id, tom, versao))
+            if balde is not None:
+                balde.remover_expiradas(agora)
+                entrada, similaridade = balde.mais_similar(vetor)
+                if entrada is not None and similaridade >= limiar:
+                    entrada['usado_em'] = agora
+
+    if entrada is not None:
+        metrics.observar('cache_semantico.similaridade', similaridade)
+
+    resposta = personalizar(entrada['resposta'], nome_usuario) if entrada and similaridade >= limiar else None
+    if resposta is None:
+        metrics.incrementar('cache_semantico.falhas')
+        return None
+
+    metrics.incrementar('cache_semantico.acertos')
+    return {'resposta': resposta, 'confianca': entrada['confianca'], 'similaridade': similaridade}
+
+
+def guardar(
+    cliente_id: int,
+    embedding: List[float],
+    tom: str,
+    versao: int,
+    resposta: str,
+    confianca: Optional[float] = None,
+    nome_usuario: Optional[str] = None
+):
+    """Guarda a resposta (sem saudação) gerada para a mensagem com esse embedding"""
+    vetor = _normalizar(embedding)
+    if not resposta or vetor is None:
+        return
+
+    agora = time.time()
+    entrada = {
+        'resposta': despersonalizar(resposta, nome_usuario),
+        'confianca': confianca,
+        'expira_em': agora + settings.CACHE_RESPOSTAS_TTL,
+        'usado_em': agora
+    }
+
+    with _lock:
+        chave = (cliente_id, tom, versao)
+        balde = _baldes.get(chave)
+        if balde is None:
+            balde = _Balde()
+            _baldes[chave] = balde
+        balde.remover_expiradas(agora)
+        balde.adicionar(vetor, entrada)
+
+
+def invalidar_cliente(cliente_id: int):
+    """Remove as respostas do cliente deste processo (conhecimento alterado)"""
+    with _lock:
+        for chave in [chave for chave in _baldes if chave[0] == cliente_id]:
+            _baldes.pop(chave, None)
+
+
+def limpar():
+    """Esvazia o cache (testes)"""
+    with _lock:
+        _baldes.clear()
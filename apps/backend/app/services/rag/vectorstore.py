@@ -4,7 +4,7 @@ Cada cliente tem sua própria coleção isolada no ChromaDB
 """
 import logging
 import time
-from typing import List, Dict
+from typing import List, Dict, Optional
 import chromadb
 from chromadb.config import Settings
 from langchain_openai import OpenAIEmbeddings
@@ -12,9 +12,12 @@ from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
 from app.core.config import settings
+from app.services.llm.clients import obter_http_client
 
 logger = logging.getLogger(__name__)
 
+_embeddings: Optional[OpenAIEmbeddings] = None
+
 
 def get_chroma_client():
     """
@@ -27,6 +30,29 @@ def get_chroma_client():
     )
 
 
+def get_embeddings() -> OpenAIEmbeddings:
+    """
+    Modelo de embeddings compartilhado (pool HTTP dos clientes LLM)
+    """
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = OpenAIEmbeddings(http_client=obter_http_client())
+    return _embeddings
+
+
+def embedar_query(query: str) -> List[float]:
+    """
+    Embedding de uma consulta (o mesmo usado na busca do vectorstore)
+    
+    Args:
+        query: Texto da busca
+        
+    Returns:
+        Vetor do embedding
+    """
+    return get_embeddings().embed_query(query)
+
+
 def get_collection_name(cliente_id: int) -> str:
     """
     Retorna o nome da coleção para um cliente específico
@@ -95,7 +121,7 @@ def criar_vectorstore_de_chunks(cliente_id: int, chunks: List[Dict]) -> Chroma:
             # Primeiro lote - criar vectorstore
             vectorstore = Chroma.from_documents(
                 documents=batch,
-                embedding=OpenAIEmbeddings(),
+                embedding=get_embeddings(),
                 client=client,
                 collection_name=collection_name,
             )
@@ -111,7 +137,12 @@ def criar_vectorstore_de_chunks(cliente_id: int, chunks: List[Dict]) -> Chroma:
     return vectorstore
 
 
-def buscar_no_vectorstore(cliente_id: int, query: str, k: int = 5) -> List[Dict]:
+def buscar_no_vectorstore(
+    cliente_id: int,
+    query: str,
+    k: int = 5,
+    embedding: Optional[List[float]] = None
+) -> List[Dict]:
     """
     Busca documentos relevantes no vectorstore do cliente
     
@@ -119,6 +150,7 @@ def buscar_no_vectorstore(cliente_id: int, query: str, k: int = 5) -> List[Dict]
         cliente_id: ID do cliente
         query: Texto da busca
         k: Número de resultados
+        embedding: Embedding da query já calculado (ex: pelo cache semântico)
         
     Returns:
         Lista de dicts com 'text', 'score', 'metadata'
@@ -130,13 +162,16 @@ def buscar_no_vectorstore(cliente_id: int, query: str, k: int = 5) -> List[Dict]
         client = get_chroma_client()
         
         vectorstore = Chroma(
-            embedding_function=OpenAIEmbeddings(),
+            embedding_function=get_embeddings(),
             client=client,
             collection_name=collection_name,
         )
         
-        # Buscar com scores
-        results = vectorstore.similarity_search_with_score(query, k=k)
+        if embedding is None:
+            embedding = embedar_query(query)
+        
+        # Buscar com scores (distância: menor = melhor)
+        results = vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
         
         # Formatar resultados
         formatted_results = []
@@ -37,11 +37,14 @@ class UsoOpenAIService:
         }
     }
     
+    # Tokens do prompt lidos do cache do provedor custam uma fração do preço do prompt
+    FATOR_CUSTO_TOKENS_CACHE = 0.5
+    
     # Threshold padrão de alerta (em dólares por dia)
     THRESHOLD_ALERTA_DIARIO = 10.0  # $10/dia
     
     @staticmethod
-    def calcular_custo(modelo: str, tokens_prompt: int, tokens_completion: int) -> float:
+    def calcular_custo(modelo: str, tokens_prompt: int, tokens_completion: int, tokens_cache: int = 0) -> float:
         """
         Calcula custo estimado baseado no modelo e tokens usados
         
@@ -49,6 +52,7 @@ class UsoOpenAIService:
             modelo: Nome do modelo OpenAI
             tokens_prompt: Tokens do prompt
             tokens_completion: Tokens da resposta
+            tokens_cache: Tokens do prompt lidos do cache (incluídos em tokens_prompt)
             
         Returns:
             Custo em dólares
@@ -58,7 +62,10 @@ class UsoOpenAIService:
             "completion": 0.002
         })
         
-        custo_prompt = (tokens_prompt / 1000) * custos["prompt"]
+        tokens_cache = min(tokens_cache, tokens_prompt)
+        custo_prompt = (
+            (tokens_prompt - tokens_cache) + tokens_cache * UsoOpenAIService.FATOR_CUSTO_TOKENS_CACHE
+        ) / 1000 * custos["prompt"]
         custo_completion = (tokens_completion / 1000) * custos["completion"]
         
         return custo_prompt + custo_completion
@@ -69,7 +76,11 @@ class UsoOpenAIService:
         cliente_id: int,
         modelo: str,
         tokens_prompt: int,
-        tokens_completion: int
+        tokens_completion: int,
+        commit: bool = True,
+        hedge: bool = False,
+        tokens_cache: int = 0,
+        uso_hedge: Optional[Dict] = None
     ) -> UsoOpenAI:
         """
         Registra uso da OpenAI para um cliente
@@ -81,13 +92,29 @@ class UsoOpenAIService:
             modelo: Modelo usado
             tokens_prompt: Tokens do prompt
             tokens_completion: Tokens da resposta
+            commit: Se False, só faz flush (o chamador controla a transação)
+            hedge: Se a resposta teve chamada de hedge (a outra chamada
+                também recebeu o prompt)
+            tokens_cache: Tokens do prompt lidos do cache do provedor
+            uso_hedge: Uso real da outra chamada ('modelo', 'tokens_prompt',
+                'tokens_completion'), quando ela terminou. Cancelada, o provedor
+                não informa o uso: o custo dela é estimado só pelo prompt (os
+                tokens gerados até o cancelamento ficam de fora)
             
         Returns:
             Registro de uso atualizado
         """
         hoje = date.today()
+        custo = UsoOpenAIService.calcular_custo(modelo, tokens_prompt, tokens_completion, tokens_cache)
+        if hedge and uso_hedge:
+            custo += UsoOpenAIService.calcular_custo(
+                uso_hedge['modelo'], uso_hedge['tokens_prompt'], uso_hedge['tokens_completion']
+            )
+            tokens_prompt += uso_hedge['tokens_prompt']
+            tokens_completion += uso_hedge['tokens_completion']
+        elif hedge:
+            custo += UsoOpenAIService.calcular_custo(modelo, tokens_prompt, 0)
         tokens_total = tokens_prompt + tokens_completion
-        custo = UsoOpenAIService.calcular_custo(modelo, tokens_prompt, tokens_completion)
         
         # Buscar registro existente do dia
         uso = db.query(UsoOpenAI).filter(
@@ -102,6 +129,8 @@ class UsoOpenAIService:
             uso.tokens_total += tokens_total
             uso.custo_estimado += custo
             uso.mensagens_processadas += 1
+            uso.chamadas_hedge += 1 if hedge else 0
+            uso.tokens_cache += tokens_cache
             uso.updated_at = datetime.utcnow()
         else:
             # Criar novo registro
@@ -113,12 +142,17 @@ class UsoOpenAIService:
                 tokens_total=tokens_total,
                 custo_estimado=custo,
                 mensagens_processadas=1,
+                chamadas_hedge=1 if hedge else 0,
+                tokens_cache=tokens_cache,
                 modelo=modelo
             )
             db.add(uso)
         
-        db.commit()
-        db.refresh(uso)
+        if commit:
+            db.commit()
+            db.refresh(uso)
+        else:
+            db.flush()
         
         logger.info(f"📊 Uso registrado: Cliente {cliente_id} | {tokens_total} tokens | R$ {custo:.4f}")
         
@@ -206,6 +240,8 @@ class UsoOpenAIService:
                 "tokens_total": r.tokens_total,
                 "custo_estimado": r.custo_estimado,
                 "mensagens_processadas": r.mensagens_processadas,
+                "chamadas_hedge": r.chamadas_hedge,
+                "tokens_cache": r.tokens_cache,
                 "modelo": r.modelo
             }
             for r in registros
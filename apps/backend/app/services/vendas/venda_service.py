@@ -10,6 +10,7 @@ import stripe
 
 from app.core.config import settings
 from app.db.models.cliente import Cliente, ClienteStatus
+from app.services.whatsapp.tenant_cache import invalidar_cliente
 
 # Configurar Stripe
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -185,6 +186,7 @@ class VendaService:
                 else:
                     cliente.stripe_status = "canceling"
                 db.commit()
+                invalidar_cliente(db, cliente.id)
             
             return {
                 "sucesso": True,
@@ -222,6 +224,7 @@ class VendaService:
                 cliente.status = ClienteStatus.ATIVO
                 cliente.stripe_status = subscription.status
                 db.commit()
+                invalidar_cliente(db, cliente.id)
             
             return {
                 "sucesso": True,
@@ -12,7 +12,13 @@ from app.core.config import (
 logger = logging.getLogger(__name__)
 
 
-def send_whatsapp_message(number, text, db: Optional[Session] = None, cliente_id: Optional[int] = None):
+def send_whatsapp_message(
+    number,
+    text,
+    db: Optional[Session] = None,
+    cliente_id: Optional[int] = None,
+    commit: bool = True
+):
     """
     Envia mensagem via Evolution API e incrementa contador do cliente
     
@@ -21,6 +27,7 @@ def send_whatsapp_message(number, text, db: Optional[Session] = None, cliente_id
         text: Texto da mensagem
         db: Sessão do banco (opcional)
         cliente_id: ID do cliente (opcional, para incrementar contador)
+        commit: Se False, o contador só é alterado na sessão (o chamador faz o commit)
     """
     url = f'{EVOLUTION_API_URL}/message/sendText/{EVOLUTION_INSTANCE_NAME}'
     headers = {
@@ -50,14 +57,16 @@ def send_whatsapp_message(number, text, db: Optional[Session] = None, cliente_id
         if response.status_code == 200 and db and cliente_id:
             try:
                 from app.db.models.cliente import Cliente
-                cliente = db.query(Cliente).filter(Cliente.id == cliente_id).first()
+                cliente = db.get(Cliente, cliente_id)
                 if cliente:
                     cliente.total_mensagens_enviadas += 1
-                    db.commit()
+                    if commit:
+                        db.commit()
                     logger.info(f"📊 Contador incrementado: cliente {cliente_id} agora tem {cliente.total_mensagens_enviadas} mensagens")
             except Exception as e:
                 logger.error(f"❌ Erro ao incrementar contador: {e}")
-                db.rollback()
+                if commit:
+                    db.rollback()
         
         return response
         
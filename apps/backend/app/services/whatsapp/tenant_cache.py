@@ -0,0 +1,203 @@
+"""
+Cache de resolução instância/número → cliente para o webhook
+
+Dois níveis:
+1. LRU em memória por processo (TTL curto, TENANT_CACHE_LOCAL_TTL)
+2. Redis compartilhado entre processos (TENANT_CACHE_REDIS_TTL)
+
+As escritas que mudam a resolução (status da instância, suspensão/ativação
+do cliente, mudanças de assinatura) chamam invalidar_instancia/invalidar_cliente,
+que limpam o Redis e o LRU do processo atual. Outros processos enxergam a
+mudança quando o TTL do LRU local expira.
+"""
+import json
+import logging
+import threading
+from typing import Optional, Dict, Any, Iterable
+
+import redis
+import redis.asyncio as redis_async
+from cachetools import TTLCache
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models.instancia_whatsapp import InstanciaWhatsApp
+from app.db.models.cliente import Cliente
+from app.db.models.configuracao_bot import ConfiguracaoBot
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis_async.Redis.from_url(settings.CACHE_REDIS_URI, decode_responses=True)
+redis_sync_client = redis.Redis.from_url(settings.CACHE_REDIS_URI, decode_responses=True)
+
+_cache_local = TTLCache(maxsize=settings.TENANT_CACHE_MAXSIZE, ttl=settings.TENANT_CACHE_LOCAL_TTL)
+_cache_negativo = TTLCache(maxsize=settings.TENANT_CACHE_MAXSIZE, ttl=settings.TENANT_CACHE_NEGATIVE_TTL)
+_lock = threading.Lock()
+
+
+def _chave_instancia(instance_id: str) -> str:
+    return f'tenant:instancia:{instance_id}'
+
+
+def _chave_numero(numero: str) -> str:
+    return f'tenant:numero:{numero}'
+
+
+def _buscar_no_banco(db: Session, filtro) -> Optional[Dict[str, Any]]:
+    """Uma única query instância + status e limites de debounce do cliente (sem lazy-load)"""
+    row = db.query(
+        InstanciaWhatsApp.cliente_id,
+        InstanciaWhatsApp.instance_id,
+        InstanciaWhatsApp.numero,
+        Cliente.status,
+        ConfiguracaoBot.debounce_min_segundos,
+        ConfiguracaoBot.debounce_max_segundos
+    ).join(
+        Cliente, Cliente.id == InstanciaWhatsApp.cliente_id
+    ).outerjoin(
+        ConfiguracaoBot, ConfiguracaoBot.cliente_id == InstanciaWhatsApp.cliente_id
+    ).filter(filtro).first()
+
+    if not row:
+        return None
+
+    return {
+        'cliente_id': row.cliente_id,
+        'status': row.status.value if hasattr(row.status, 'value') else row.status,
+        'instance_id': row.instance_id,
+        'numero': row.numero,
+        'debounce_min': row.debounce_min_segundos,
+        'debounce_max': row.debounce_max_segundos
+    }
+
+
+async def _resolver_chave(db: Session, chave: str, filtro) -> Optional[Dict[str, Any]]:
+    """Resolve uma chave passando por LRU local → Redis → Postgres"""
+    with _lock:
+        tenant = _cache_local.get(chave)
+        if tenant is not None:
+            return tenant
+        if chave in _cache_negativo:
+            return None
+
+    try:
+        valor = await redis_client.get(chave)
+        if valor:
+            tenant = json.loads(valor)
+            with _lock:
+                _cache_local[chave] = tenant
+            return tenant
+    except Exception as e:
+        logger.warning(f'[TENANT CACHE] Redis indisponível, consultando banco: {e}')
+
+    tenant = _buscar_no_banco(db, filtro)
+
+    with _lock:
+        if tenant is None:
+            _cache_negativo[chave] = True
+        else:
+            _cache_local[chave] = tenant
+
+    if tenant is not None:
+        try:
+            await redis_client.set(chave, json.dumps(tenant), ex=settings.TENANT_CACHE_REDIS_TTL)
+        except Exception as e:
+            logger.warning(f'[TENANT CACHE] Erro ao gravar no Redis: {e}')
+
+    return tenant
+
+
+async def resolver_tenant(
+    db: Session,
+    instance_id: Optional[str],
+    numero: Optional[str]
+) -> Optional[Dict[str, Any]]:
+    """
+    Resolve o cliente dono de uma mensagem recebida
+
+    Tenta primeiro pelo instance_id e, se não encontrar, pelo número.
+
+    Args:
+        db: Sessão do banco (usada só em cache miss)
+        instance_id: Nome da instância enviado pela Evolution API
+        numero: Número extraído do chat_id
+
+    Returns:
+        Dict com 'cliente_id', 'status', 'instance_id', 'numero',
+        'debounce_min', 'debounce_max' ou None
+    """
+    if instance_id:
+        tenant = await _resolver_chave(
+            db, _chave_instancia(instance_id), InstanciaWhatsApp.instance_id == instance_id
+        )
+        if tenant:
+            return tenant
+
+    if numero:
+        return await _resolver_chave(
+            db, _chave_numero(numero), InstanciaWhatsApp.numero == numero
+        )
+
+    return None
+
+
+def _invalidar_chaves(chaves: Iterable[str]):
+    chaves = [c for c in chaves if c]
+    if not chaves:
+        return
+
+    with _lock:
+        for chave in chaves:
+            _cache_local.pop(chave, None)
+            _cache_negativo.pop(chave, None)
+
+    try:
+        redis_sync_client.delete(*chaves)
+    except Exception as e:
+        logger.warning(f'[TENANT CACHE] Erro ao invalidar no Redis: {e}')
+
+
+def invalidar_instancia(instance_id: Optional[str] = None, *numeros: Optional[str]):
+    """
+    Invalida a resolução de uma instância e dos números associados
+
+    Args:
+        instance_id: ID da instância na Evolution API
+        numeros: Números (antigo e/ou novo) conectados à instância
+    """
+    chaves = []
+    if instance_id:
+        chaves.append(_chave_instancia(instance_id))
+    chaves.extend(_chave_numero(n) for n in numeros if n)
+    _invalidar_chaves(chaves)
+
+
+def invalidar_cliente(db: Session, cliente_id: int):
+    """
+    Invalida todas as instâncias de um cliente (ex: suspensão, ativação, billing,
+    alteração das configurações do bot)
+
+    Args:
+        db: Sessão do banco
+        cliente_id: ID do cliente
+    """
+    instancias = db.query(
+        InstanciaWhatsApp.instance_id,
+        InstanciaWhatsApp.numero
+    ).filter(InstanciaWhatsApp.cliente_id == cliente_id).all()
+
+    chaves = []
+    for instancia in instancias:
+        chaves.append(_chave_instancia(instancia.instance_id))
+        if instancia.numero:
+            chaves.append(_chave_numero(instancia.numero))
+
+    _invalidar_chaves(chaves)
+    logger.info(f'[TENANT CACHE] Cache invalidado para cliente {cliente_id}')
+
+
+def limpar_cache_local():
+    """Esvazia o LRU em memória deste processo (não afeta o Redis)"""
+    with _lock:
+        _cache_local.clear()
+        _cache_negativo.clear()
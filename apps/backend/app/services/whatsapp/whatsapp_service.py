@@ -8,6 +8,7 @@ from typing import Optional, Dict
 
 from app.core.config import settings
 from app.db.models.instancia_whatsapp import InstanciaWhatsApp, InstanciaStatus
+from app.services.whatsapp.tenant_cache import invalidar_instancia
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +63,7 @@ class WhatsAppService:
                         "QRCODE_UPDATED",
                         "MESSAGES_UPSERT",
                         "MESSAGES_UPDATE",
+                        "PRESENCE_UPDATE",
                         "MESSAGES_DELETE",
                         "SEND_MESSAGE",
                         "CONNECTION_UPDATE"
@@ -88,6 +90,9 @@ class WhatsAppService:
         db.commit()
         db.refresh(instancia)
         
+        # Descartar "não encontrada" que possa estar em cache
+        invalidar_instancia(instance_id)
+        
         logger.info(f"Instância salva no banco: {instance_id}")
         return instancia
     
@@ -182,6 +187,8 @@ class WhatsAppService:
         ).first()
         
         if instancia:
+            numero_anterior = instancia.numero
+            
             # Se está conectando e tem número
             if status == InstanciaStatus.CONECTADA and numero:
                 # Buscar cliente dono da instância
@@ -210,6 +217,10 @@ class WhatsAppService:
                 instancia.numero = numero
             db.commit()
             db.refresh(instancia)
+            
+            # Resolução instância/número → cliente mudou
+            invalidar_instancia(instance_id, numero_anterior, instancia.numero)
+            
             logger.info(f"Status atualizado: {instance_id} -> {status.value}")
             return instancia
         
@@ -2,6 +2,7 @@
 Fixtures globais para testes
 """
 import pytest
+from unittest.mock import patch
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
@@ -10,6 +11,8 @@ from fastapi.testclient import TestClient
 from app.db.base import Base
 from app.db.session import get_db
 from app.main import app
+from app.core.config import settings
+from app.services.whatsapp.tenant_cache import limpar_cache_local
 
 
 # Database de teste em memória
@@ -43,6 +46,17 @@ def db_session():
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def limpar_caches():
+    """
+    Limpa caches em memória entre testes
+    Evita que a resolução de cliente de um teste vaze para o próximo
+    """
+    limpar_cache_local()
+    yield
+    limpar_cache_local()
+
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """
@@ -57,8 +71,10 @@ def client(db_session):
     
     app.dependency_overrides[get_db] = override_get_db
     
-    with TestClient(app) as test_client:
-        yield test_client
+    # Sem agendador do debounce nos testes (não há Redis)
+    with patch.object(settings, 'DEBOUNCE_POLLER_ENABLED', False):
+        with TestClient(app) as test_client:
+            yield test_client
     
     app.dependency_overrides.clear()
 
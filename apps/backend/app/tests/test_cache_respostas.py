@@ -0,0 +1,51 @@
+"""
+Testes para o cache de respostas de perguntas repetidas
+"""
+import pytest
+
+from app.services.ai import cache_respostas
+
+
+@pytest.fixture(autouse=True)
+def _cache_vazio():
+    cache_respostas.limpar()
+    yield
+    cache_respostas.limpar()
+
+
+@pytest.mark.unit
+class TestCacheRespostas:
+    """Testes unitários para normalização, chave e personalização"""
+
+    def test_normaliza_acentos_caixa_e_pontuacao(self):
+        assert cache_respostas.normalizar('  Qual o HORÁRIO?? ') == 'qual o horario'
+        assert cache_respostas.normalizar('Aceita PIX?!') == cache_respostas.normalizar('aceita pix')
+
+    def test_acerto_com_texto_equivalente(self):
+        cache_respostas.guardar(1, 'Qual o horário?', 'casual', 3, 'Das 8h às 18h.', confianca=0.9)
+
+        acerto = cache_respostas.buscar(1, 'qual o horario', 'casual', 3)
+
+        assert acerto == {'resposta': 'Das 8h às 18h.', 'confianca': 0.9}
+
+    def test_chave_separa_cliente_tom_e_versao(self):
+        cache_respostas.guardar(1, 'aceita pix?', 'casual', 3, 'Aceitamos!')
+
+        assert cache_respostas.buscar(2, 'aceita pix?', 'casual', 3) is None
+        assert cache_respostas.buscar(1, 'aceita pix?', 'formal', 3) is None
+        assert cache_respostas.buscar(1, 'aceita pix?', 'casual', 4) is None
+
+    def test_nome_do_contato_aplicado_depois_da_busca(self):
+        cache_respostas.guardar(1, 'quanto custa?', 'casual', 0, 'Maria, custa R$ 50.', nome_usuario='Maria')
+
+        assert cache_respostas.buscar(1, 'quanto custa?', 'casual', 0, nome_usuario='João')['resposta'] == 'João, custa R$ 50.'
+        assert cache_respostas.buscar(1, 'quanto custa?', 'casual', 0) is None
+
+    def test_invalidar_cliente(self):
+        cache_respostas.guardar(1, 'aceita pix?', 'casual', 0, 'Aceitamos!')
+        cache_respostas.guardar(2, 'aceita pix?', 'casual', 0, 'Não aceitamos.')
+
+        cache_respostas.invalidar_cliente(1)
+
+        assert cache_respostas.buscar(1, 'aceita pix?', 'casual', 0) is None
+        assert cache_respostas.buscar(2, 'aceita pix?', 'casual', 0) is not None
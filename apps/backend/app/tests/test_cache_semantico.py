@@ -0,0 +1,50 @@
+"""
+Testes para o cache semântico de respostas
+"""
+import pytest
+
+from app.services.rag import cache_semantico
+
+
+@pytest.fixture(autouse=True)
+def _cache_vazio():
+    cache_semantico.limpar()
+    yield
+    cache_semantico.limpar()
+
+
+@pytest.mark.unit
+class TestCacheSemantico:
+    """Testes unitários para limiar, chave e limite por cliente"""
+
+    def test_acerto_acima_do_limiar(self):
+        cache_semantico.guardar(1, [1.0, 0.0, 0.0], 'casual', 0, 'Aceitamos pix!', confianca=0.8)
+
+        acerto = cache_semantico.buscar(1, [0.99, 0.1, 0.0], 'casual', 0, limiar=0.9)
+
+        assert acerto['resposta'] == 'Aceitamos pix!'
+        assert acerto['confianca'] == 0.8
+        assert acerto['similaridade'] > 0.9
+
+    def test_miss_abaixo_do_limiar(self):
+        cache_semantico.guardar(1, [1.0, 0.0, 0.0], 'casual', 0, 'Aceitamos pix!')
+
+        assert cache_semantico.buscar(1, [0.6, 0.8, 0.0], 'casual', 0, limiar=0.9) is None
+
+    def test_chave_separa_cliente_tom_e_versao(self):
+        cache_semantico.guardar(1, [1.0, 0.0], 'casual', 0, 'Aceitamos pix!')
+
+        assert cache_semantico.buscar(2, [1.0, 0.0], 'casual', 0) is None
+        assert cache_semantico.buscar(1, [1.0, 0.0], 'formal', 0) is None
+        assert cache_semantico.buscar(1, [1.0, 0.0], 'casual', 1) is None
+
+    def test_limite_por_cliente_remove_a_menos_usada(self, monkeypatch):
+        monkeypatch.setattr(cache_semantico.settings, 'CACHE_SEMANTICO_MAX_POR_CLIENTE', 2)
+        cache_semantico.guardar(1, [1.0, 0.0, 0.0], 'casual', 0, 'A')
+        cache_semantico.guardar(1, [0.0, 1.0, 0.0], 'casual', 0, 'B')
+        assert cache_semantico.buscar(1, [1.0, 0.0, 0.0], 'casual', 0, limiar=0.99) is not None
+
+        cache_semantico.guardar(1, [0.0, 0.0, 1.0], 'casual', 0, 'C')
+
+        assert cache_semantico.buscar(1, [0.0, 1.0, 0.0], 'casual', 0, limiar=0.99) is None
+        assert cache_semantico.buscar(1, [1.0, 0.0, 0.0], 'casual', 0, limiar=0.99)['resposta'] == 'A'
@@ -0,0 +1,102 @@
+"""
+Testes para ConversaService (status da conversa e estado do chat)
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.conversas import ConversaService
+from app.services.conversations import chat_state
+from app.services.conversations.etapas_mensagem import EtapaAtendimentoHumano
+from app.services.conversations.pipeline_etapas import CONTINUAR, ENCERRAR, ContextoPipeline
+from app.services.conversations.pipeline_uow import PipelineUnitOfWork
+
+CLIENTE_ID = 1
+NUMERO = '5511999999999'
+
+
+class _PipelineFalso:
+    def __init__(self, redis_falso):
+        self.redis_falso = redis_falso
+        self.comandos = []
+
+    def hgetall(self, chave):
+        self.comandos.append(dict(self.redis_falso.hashes.get(chave, {})))
+
+    def get(self, chave):
+        self.comandos.append(None)
+
+    def execute(self):
+        return self.comandos
+
+
+class _RedisFalso:
+    """Hashes em memória com a semântica do script de atualizar (só altera registro existente)"""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def pipeline(self, transaction=False):
+        return _PipelineFalso(self)
+
+    def atualizar(self, keys, args):
+        if keys[0] not in self.hashes:
+            return 0
+        pares = args[1:]
+        self.hashes[keys[0]].update(zip(pares[::2], pares[1::2]))
+        return 1
+
+
+@pytest.fixture
+def redis_falso():
+    falso = _RedisFalso()
+    falso.hashes[chat_state._chave(CLIENTE_ID, NUMERO)] = chat_state._serializar({
+        'contexto': True,
+        'nome': 'Maria',
+        'conversa_id': 7,
+        'status': 'ativa',
+        'ultima_interacao': '',
+        'versao_conhecimento': 0
+    })
+    with patch.object(chat_state, 'redis_client', falso), patch.object(chat_state, '_atualizar', falso.atualizar):
+        yield falso
+
+
+def _portao(mensagem='oi'):
+    """Executa EtapaAtendimentoHumano com o estado do chat lido pela unit of work"""
+    db = MagicMock()
+    db.query.return_value.outerjoin.return_value.filter.return_value.first.return_value = (MagicMock(), MagicMock())
+    uow = PipelineUnitOfWork(db, CLIENTE_ID, NUMERO).carregar()
+    assert uow.estado_em_cache
+    return EtapaAtendimentoHumano().executar(ContextoPipeline(NUMERO, CLIENTE_ID, uow, {'mensagem': mensagem}))
+
+
+@pytest.mark.unit
+class TestAlterarStatus:
+    """Testes unitários para o write-through do status da conversa"""
+
+    def test_status_alterado_chega_ao_portao_do_pipeline(self, redis_falso):
+        conversa = SimpleNamespace(id=7, cliente_id=CLIENTE_ID, numero_whatsapp=NUMERO, status='ativa', motivo_fallback=None)
+        db = MagicMock()
+        assert _portao() == CONTINUAR
+
+        ConversaService.alterar_status(db, conversa, 'aguardando_humano', motivo_fallback='solicitacao_manual')
+
+        db.commit.assert_called_once()
+        assert _portao() == ENCERRAR
+
+        ConversaService.alterar_status(db, conversa, 'ativa')
+
+        assert _portao() == CONTINUAR
+
+    def test_sem_commit_nao_grava_o_estado(self, redis_falso):
+        conversa = SimpleNamespace(id=7, cliente_id=CLIENTE_ID, numero_whatsapp=NUMERO, status='ativa', motivo_fallback=None)
+        db = MagicMock()
+
+        ConversaService.alterar_status(db, conversa, 'aguardando_humano', commit=False)
+
+        db.flush.assert_called_once()
+        db.commit.assert_not_called()
+        # Gravado pela unit of work do pipeline depois do commit da rodada
+        assert _portao() == CONTINUAR
@@ -0,0 +1,101 @@
+"""
+Testes para o AgendadorDebounce (reivindicação de chats vencidos)
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.config import settings
+from app.services.conversations import debounce_scheduler
+from app.services.conversations.debounce_scheduler import AgendadorDebounce
+from app.services.conversations.sharded_executor import ExecutorParticionado
+
+VALOR = '1|5511999999999@s.whatsapp.net'
+
+
+@pytest.mark.unit
+class TestAgendadorDebounce:
+    """Testes unitários para reivindicação limitada às faixas livres e renovação do lease"""
+
+    async def test_reivindica_apenas_faixas_livres(self):
+        agendador = AgendadorDebounce(AsyncMock(), ExecutorParticionado('teste', faixas=2))
+        agendador.executor.iniciar()
+        agendador._tarefas.add(MagicMock())
+
+        with patch.object(debounce_scheduler, 'redis_client') as redis_client:
+            redis_client.zrangebyscore = AsyncMock(return_value=[])
+            await agendador._despachar_vencidos()
+        await agendador.executor.parar()
+
+        assert redis_client.zrangebyscore.await_args.kwargs['num'] == 1
+
+    async def test_faixas_ocupadas_nao_reivindica(self):
+        agendador = AgendadorDebounce(AsyncMock(), ExecutorParticionado('teste', faixas=1))
+        agendador.executor.iniciar()
+        agendador._tarefas.add(MagicMock())
+
+        with patch.object(debounce_scheduler, 'redis_client') as redis_client:
+            redis_client.zrangebyscore = AsyncMock(return_value=[])
+            await agendador._despachar_vencidos()
+        await agendador.executor.parar()
+
+        redis_client.zrangebyscore.assert_not_called()
+
+    async def test_lease_conta_a_partir_do_inicio_da_rodada(self):
+        processar = AsyncMock()
+        agendador = AgendadorDebounce(processar, ExecutorParticionado('teste', faixas=1))
+
+        with patch.object(debounce_scheduler, 'redis_client') as redis_client, \
+                patch.object(debounce_scheduler, '_renovar', AsyncMock(return_value=1)) as renovar, \
+                patch.object(debounce_scheduler, '_renovar_lock', AsyncMock(return_value=1)), \
+                patch.object(debounce_scheduler, '_concluir', AsyncMock()) as concluir, \
+                patch.object(debounce_scheduler, '_agora_ms', return_value=5000):
+            redis_client.set = AsyncMock(return_value=True)
+            redis_client.get = AsyncMock(return_value='1000')
+            redis_client.delete = AsyncMock()
+            await agendador._rodada(VALOR, 1000)
+
+        novo_lease = 5000 + settings.DEBOUNCE_LEASE_MS
+        assert renovar.await_args.kwargs['args'] == [VALOR, 1000, novo_lease]
+        processar.assert_awaited_once_with('5511999999999@s.whatsapp.net', 1)
+        assert concluir.await_args.kwargs['args'] == [VALOR, novo_lease]
+        redis_client.delete.assert_awaited_once()
+
+    async def test_rodada_longa_renova_lease_e_lock(self):
+        async def processar(chat_id, cliente_id):
+            # Rodada mais longa que o lease
+            await asyncio.sleep(0.05)
+
+        agendador = AgendadorDebounce(processar, ExecutorParticionado('teste', faixas=1))
+        agora = iter(range(1000, 100000, 1000))
+
+        with patch.object(debounce_scheduler, 'redis_client') as redis_client, \
+                patch.object(debounce_scheduler, '_renovar', AsyncMock(return_value=1)) as renovar, \
+                patch.object(debounce_scheduler, '_renovar_lock', AsyncMock(return_value=1)) as renovar_lock, \
+                patch.object(debounce_scheduler, '_concluir', AsyncMock()) as concluir, \
+                patch.object(debounce_scheduler, '_agora_ms', side_effect=lambda: next(agora)), \
+                patch.object(settings, 'DEBOUNCE_LEASE_MS', 30):
+            redis_client.set = AsyncMock(return_value=True)
+            redis_client.get = AsyncMock(return_value='500')
+            redis_client.delete = AsyncMock()
+            await agendador._rodada(VALOR, 500)
+
+        assert renovar.await_count > 1
+        assert renovar_lock.await_count == renovar.await_count
+        # Cada renovação parte do lease anterior e o concluir usa o último
+        leases = [chamada.kwargs['args'] for chamada in renovar.await_args_list]
+        assert all(atual[1] == anterior[2] for anterior, atual in zip(leases, leases[1:]))
+        assert concluir.await_args.kwargs['args'] == [VALOR, leases[-1][2]]
+
+    async def test_chat_com_lock_de_outro_worker_e_reagendado(self):
+        processar = AsyncMock()
+        agendador = AgendadorDebounce(processar, ExecutorParticionado('teste', faixas=1))
+
+        with patch.object(debounce_scheduler, 'redis_client') as redis_client, \
+                patch.object(debounce_scheduler, 'agendar', AsyncMock()) as agendar:
+            redis_client.set = AsyncMock(return_value=False)
+            await agendador._rodada(VALOR, 1000)
+
+        processar.assert_not_awaited()
+        agendar.assert_awaited_once()
@@ -0,0 +1,84 @@
+"""
+Testes para o processamento do buffer de mensagens (erro e nova tentativa)
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.config import settings
+from app.services.conversations import message_buffer
+
+CHAT_ID = '5511999999999@s.whatsapp.net'
+BRUTAS = ['{"id": "ABC1", "text": "oi"}', '{"id": "ABC2", "text": "tudo bem?"}']
+
+
+@pytest.mark.unit
+class TestHandleDebounce:
+    """Testes unitários para o lote que falha no pipeline"""
+
+    @patch.object(message_buffer, 'agendar', new_callable=AsyncMock)
+    @patch.object(message_buffer, '_registrar_tentativa', new_callable=AsyncMock, return_value=1)
+    @patch.object(message_buffer, '_devolver', new_callable=AsyncMock)
+    @patch.object(message_buffer, '_drenar', new_callable=AsyncMock, return_value=BRUTAS)
+    @patch.object(message_buffer, '_processar_buffer', side_effect=RuntimeError('banco fora'))
+    @patch.object(message_buffer, 'executar_no_pipeline', new_callable=AsyncMock)
+    def test_erro_no_pipeline_devolve_e_reagenda(self, executar, processar, drenar, devolver, tentativa, agendar):
+        executar.side_effect = lambda funcao, *args: funcao(*args)
+
+        asyncio.run(message_buffer.handle_debounce(CHAT_ID, cliente_id=1))
+
+        processar.assert_called_once()
+        drenar.assert_awaited_once_with(keys=[message_buffer.chave_buffer(1, CHAT_ID)])
+
+        devolver.assert_awaited_once()
+        assert devolver.await_args.kwargs['keys'] == [message_buffer.chave_buffer(1, CHAT_ID)]
+        assert devolver.await_args.kwargs['args'][1:] == BRUTAS
+        tentativa.assert_awaited_once_with(message_buffer.chave_buffer(1, CHAT_ID))
+        agendar.assert_awaited_once_with(1, CHAT_ID, int(settings.PIPELINE_RETRY_SECONDS * 1000))
+
+    @patch.object(message_buffer, 'redis_client')
+    @patch.object(message_buffer, 'agendar', new_callable=AsyncMock)
+    @patch.object(message_buffer, '_registrar_tentativa', new_callable=AsyncMock)
+    @patch.object(message_buffer, '_devolver', new_callable=AsyncMock)
+    @patch.object(message_buffer, '_drenar', new_callable=AsyncMock, return_value=BRUTAS)
+    @patch.object(message_buffer, 'executar_no_pipeline', new_callable=AsyncMock, side_effect=RuntimeError('banco fora'))
+    def test_lote_descartado_apos_max_tentativas(self, executar, drenar, devolver, tentativa, agendar, redis_client):
+        tentativa.return_value = settings.PIPELINE_MAX_TENTATIVAS + 1
+        redis_client.delete = AsyncMock()
+
+        asyncio.run(message_buffer.handle_debounce(CHAT_ID, cliente_id=1))
+
+        devolver.assert_not_awaited()
+        agendar.assert_not_awaited()
+
+
+@pytest.mark.unit
+class TestChaveBuffer:
+    """Testes unitários para o isolamento do buffer por cliente"""
+
+    def test_mesmo_contato_em_clientes_diferentes(self):
+        assert message_buffer.chave_buffer(1, CHAT_ID) != message_buffer.chave_buffer(2, CHAT_ID)
+
+
+@pytest.mark.unit
+class TestProcessarBuffer:
+    """Testes unitários para falhas do pipeline antes e depois do envio"""
+
+    def _processar(self, houve_envio):
+        uow = MagicMock(houve_envio=houve_envio, nome_usuario=None)
+        uow.config.etapas_desabilitadas = []
+        with patch.object(message_buffer, 'SessionLocal'), \
+                patch.object(message_buffer, 'PipelineUnitOfWork') as uow_cls, \
+                patch.object(message_buffer, 'executar_etapas', side_effect=RuntimeError('commit falhou')), \
+                patch.object(message_buffer, '_filtrar_ja_persistidas', side_effect=lambda db, *args: args[-1]):
+            uow_cls.return_value.carregar.return_value = uow
+            message_buffer._processar_buffer(CHAT_ID, 1, [('ABC1', 'oi')])
+
+    def test_erro_antes_do_envio_propaga(self):
+        with pytest.raises(RuntimeError):
+            self._processar(houve_envio=False)
+
+    def test_erro_depois_do_envio_nao_devolve_o_lote(self):
+        # Sem exceção, handle_debounce não devolve o lote e o contato não recebe a resposta duas vezes
+        self._processar(houve_envio=True)
@@ -0,0 +1,86 @@
+"""
+Testes para a montagem do prompt dentro do orçamento de tokens
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.llm import orcamento_prompt
+from app.services.llm.orcamento_prompt import contar_tokens, montar_prompt
+
+
+@pytest.fixture(autouse=True)
+def _sem_download(monkeypatch):
+    # O tiktoken baixa o BPE na primeira carga; os testes usam a estimativa local
+    monkeypatch.setattr(orcamento_prompt, '_codificador', lambda modelo: orcamento_prompt._Estimativa())
+
+
+def _instrucoes(contexto: str) -> str:
+    return f'Responda com base no conhecimento.\n\nCONHECIMENTO:\n{contexto}'
+
+
+def _historico(quantidade: int):
+    return [SimpleNamespace(content=f'mensagem {i} ' + 'palavra ' * 20) for i in range(quantidade)]
+
+
+@pytest.mark.unit
+class TestOrcamentoPrompt:
+    """Testes unitários para a prioridade do orçamento"""
+
+    def test_tudo_cabe_no_orcamento(self):
+        historico = _historico(4)
+
+        prompt = montar_prompt(_instrucoes, 'trecho um\n\ntrecho dois', historico, 'oi', orcamento=5000)
+
+        assert 'trecho um\n\ntrecho dois' in prompt['system_prompt']
+        assert prompt['historico'] == historico
+        assert prompt['descartados']['tokens'] == 0
+
+    def test_conhecimento_cortado_por_linha(self):
+        contexto = '\n'.join(f'Serviço {i}: banho e tosa completo por R$ {i},00' for i in range(2000))
+
+        prompt = montar_prompt(_instrucoes, contexto, [], 'qual o preço?', orcamento=500)
+
+        assert prompt['tokens'] <= 500
+        assert 'Serviço 0:' in prompt['system_prompt']
+        assert 'Serviço 1999:' not in prompt['system_prompt']
+        assert prompt['descartados']['trechos_cortados'] == 1
+
+    def test_trechos_tem_prioridade_sobre_historico(self):
+        trechos = '\n\n'.join(f'[Trecho {i}]: ' + 'conteudo ' * 40 for i in range(3))
+        tokens_trechos = contar_tokens(trechos)
+
+        prompt = montar_prompt(_instrucoes, trechos, _historico(10), 'oi', orcamento=tokens_trechos + 150)
+
+        assert '[Trecho 2]' in prompt['system_prompt']
+        assert prompt['descartados']['trechos'] == 0
+        assert prompt['descartados']['mensagens'] > 0
+
+    def test_historico_mantem_as_mais_recentes(self):
+        historico = _historico(10)
+
+        prompt = montar_prompt(_instrucoes, '', historico, 'oi', orcamento=200)
+
+        mantidas = prompt['historico']
+        assert mantidas == historico[len(historico) - len(mantidas):]
+        assert prompt['descartados']['mensagens'] == len(historico) - len(mantidas)
+
+
+@pytest.mark.unit
+class TestContarTokens:
+    """Testes unitários para o fallback do tokenizer"""
+
+    def test_tokenizer_indisponivel_usa_estimativa_uma_vez(self, monkeypatch):
+        chamadas = []
+
+        def sem_rede(nome):
+            chamadas.append(nome)
+            raise OSError('sem rede')
+
+        monkeypatch.undo()
+        monkeypatch.setattr(orcamento_prompt.tiktoken, 'get_encoding', sem_rede)
+        monkeypatch.setattr(orcamento_prompt, '_codificadores', {})
+
+        assert contar_tokens('a' * 40) == 10
+        assert contar_tokens('oi') == 1
+        assert len(chamadas) == 1
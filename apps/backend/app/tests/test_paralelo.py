@@ -0,0 +1,52 @@
+"""
+Testes para as chamadas em paralelo da pré-geração
+"""
+import threading
+import time
+
+import pytest
+
+from app.core.paralelo import executar_em_paralelo, iniciar
+
+
+@pytest.mark.unit
+class TestParalelo:
+    """Testes unitários para timeout, erro e valor degradado"""
+
+    def test_chamadas_rodam_ao_mesmo_tempo(self):
+        inicio = time.monotonic()
+
+        resultados = executar_em_paralelo({
+            'a': (lambda: time.sleep(0.2) or 'a', 1.0, lambda: None),
+            'b': (lambda: time.sleep(0.2) or 'b', 1.0, lambda: None),
+        })
+
+        assert resultados == {'a': 'a', 'b': 'b'}
+        assert time.monotonic() - inicio < 0.35
+
+    def test_timeout_usa_padrao_sem_esperar_a_chamada(self):
+        liberar = threading.Event()
+        inicio = time.monotonic()
+
+        resultados = executar_em_paralelo({
+            'lenta': (lambda: liberar.wait(2) and 'lenta', 0.1, list),
+            'rapida': (lambda: 'rapida', 1.0, lambda: None),
+        })
+        liberar.set()
+
+        assert resultados == {'lenta': [], 'rapida': 'rapida'}
+        assert time.monotonic() - inicio < 0.5
+
+    def test_erro_usa_padrao(self):
+        def falhar():
+            raise ConnectionError('redis fora')
+
+        assert executar_em_paralelo({'estado': (falhar, 1.0, lambda: None)}) == {'estado': None}
+
+    def test_iniciar_sobrepoe_trabalho_da_thread_atual(self):
+        pendente = iniciar('estado', lambda: time.sleep(0.2) or {'contexto': True}, 1.0, lambda: None)
+        time.sleep(0.2)  # Trabalho na thread atual (ex: query no banco)
+        inicio = time.monotonic()
+
+        assert pendente.resultado() == {'contexto': True}
+        assert time.monotonic() - inicio < 0.1
@@ -0,0 +1,119 @@
+"""
+Testes para o framework de etapas do pipeline
+"""
+import pytest
+
+from app.core import metrics
+from app.services.conversations.pipeline_etapas import (
+    CONTINUAR,
+    ENCERRAR,
+    ContextoPipeline,
+    Etapa,
+    ReiniciarRodada,
+    executar_etapas,
+)
+
+
+class _EtapaTeste(Etapa):
+    def __init__(self, nome, requer=(), produz=(), final=False, opcional=False, resultado=CONTINUAR, grava=None):
+        self.nome = nome
+        self.requer = requer
+        self.produz = produz
+        self.final = final
+        self.opcional = opcional
+        self.resultado = resultado
+        self.grava = grava or {}
+        self.executada = False
+
+    def executar(self, ctx):
+        self.executada = True
+        ctx.dados.update(self.grava)
+        return self.resultado
+
+
+def _contexto(**dados):
+    return ContextoPipeline('5511999999999@s.whatsapp.net', 1, uow=None, dados=dados)
+
+
+@pytest.mark.unit
+class TestExecutarEtapas:
+    """Testes unitários para ordem, curto-circuito e métricas das etapas"""
+
+    def setup_method(self):
+        metrics.resetar()
+
+    def test_encerrar_pula_etapas_nao_finais(self):
+        """Testa que ENCERRAR interrompe a rodada, mas as etapas finais rodam"""
+        curto = _EtapaTeste('curto', resultado=ENCERRAR, grava={'resposta': 'oi'})
+        geracao = _EtapaTeste('geracao')
+        envio = _EtapaTeste('envio', requer=('resposta',), final=True)
+
+        ctx = executar_etapas([curto, geracao, envio], _contexto(mensagem='oi'))
+
+        assert ctx.encerrado_por == 'curto'
+        assert not geracao.executada
+        assert envio.executada
+
+    def test_pula_quando_saidas_presentes_ou_entradas_ausentes(self):
+        """Testa que a etapa é pulada sem entrada ou com a saída já produzida"""
+        sem_entrada = _EtapaTeste('confianca', requer=('documentos',))
+        ja_produzida = _EtapaTeste('geracao', produz=('resposta',))
+
+        ctx = executar_etapas([sem_entrada, ja_produzida], _contexto(resposta='cache'))
+
+        assert not sem_entrada.executada
+        assert not ja_produzida.executada
+        assert [resultado for _, resultado, _ in ctx.tempos] == ['sem_entrada', 'pulada']
+
+    def test_etapa_desabilitada_so_se_opcional(self):
+        """Testa que só etapas opcionais podem ser desabilitadas pelo cliente"""
+        opcional = _EtapaTeste('agendamento', opcional=True)
+        obrigatoria = _EtapaTeste('persistencia')
+
+        executar_etapas([opcional, obrigatoria], _contexto(), desabilitadas=['agendamento', 'persistencia'])
+
+        assert not opcional.executada
+        assert obrigatoria.executada
+
+    def test_metricas_por_etapa(self):
+        """Testa contador por resultado e histograma de duração por etapa"""
+        executar_etapas([_EtapaTeste('recuperacao')], _contexto())
+
+        snapshot = metrics.snapshot()
+        assert snapshot['contadores']['pipeline.etapa.recuperacao.continuar'] == 1
+        assert snapshot['histogramas']['pipeline.etapa.recuperacao.duracao_segundos']['count'] == 1
+
+    def test_erro_aborta_rodada(self):
+        """Testa que erro em uma etapa é propagado sem rodar as etapas finais"""
+        class _Falha(Etapa):
+            nome = 'falha'
+
+            def executar(self, ctx):
+                raise RuntimeError('erro')
+
+        final = _EtapaTeste('persistencia', final=True)
+
+        with pytest.raises(RuntimeError):
+            executar_etapas([_Falha(), final], _contexto())
+
+        assert not final.executada
+        assert metrics.snapshot()['contadores']['pipeline.etapa.falha.erro'] == 1
+
+    def test_reiniciar_rodada_propaga_sem_etapas_finais(self):
+        """Testa que ReiniciarRodada aborta a rodada sem contar como erro"""
+        class _Supersedida(Etapa):
+            nome = 'geracao'
+
+            def executar(self, ctx):
+                raise ReiniciarRodada('oi quero marcar', [('ABC2', 'quero marcar')])
+
+        final = _EtapaTeste('persistencia', final=True)
+
+        with pytest.raises(ReiniciarRodada) as reinicio:
+            executar_etapas([_Supersedida(), final], _contexto(mensagem='oi'))
+
+        assert reinicio.value.mensagem == 'oi quero marcar'
+        assert not final.executada
+        contadores = metrics.snapshot()['contadores']
+        assert contadores['pipeline.etapa.geracao.reiniciada'] == 1
+        assert 'pipeline.etapa.geracao.erro' not in contadores
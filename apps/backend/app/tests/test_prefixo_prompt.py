@@ -0,0 +1,62 @@
+"""
+Testes para o prefixo estável do prompt por cliente
+"""
+import pytest
+
+from app.services.ai import prefixo_prompt
+from app.services.llm import orcamento_prompt
+
+
+@pytest.fixture(autouse=True)
+def _cache_vazio(monkeypatch):
+    # O tiktoken baixa o BPE na primeira carga; os testes usam a estimativa local
+    monkeypatch.setattr(orcamento_prompt, '_codificador', lambda modelo: orcamento_prompt._Estimativa())
+    prefixo_prompt.limpar()
+    yield
+    prefixo_prompt.limpar()
+
+
+@pytest.fixture
+def conhecimento(monkeypatch):
+    estado = {'versao': 1, 'texto': 'Empresa: Pet Feliz\nHorário: 8h às 18h', 'cargas': 0}
+
+    def carregar(cliente_id):
+        estado['cargas'] += 1
+        return estado['texto'], estado['texto']
+
+    monkeypatch.setattr(prefixo_prompt, '_carregar_resumo', carregar)
+    monkeypatch.setattr(
+        'app.services.conhecimento.ConhecimentoService.obter_versao',
+        staticmethod(lambda cliente_id: estado['versao'])
+    )
+    return estado
+
+
+@pytest.mark.unit
+class TestPrefixoPrompt:
+    """Testes unitários para estabilidade e memorização do prefixo"""
+
+    def test_prefixo_nao_depende_da_mensagem_nem_do_contato(self):
+        prefixo = prefixo_prompt.montar('casual', 'Pet Feliz', 'Horário: 8h às 18h')
+
+        assert prefixo == prefixo_prompt.montar('casual', 'Pet Feliz', 'Horário: 8h às 18h')
+        assert 'Pet Feliz' in prefixo
+        assert 'Maria' in prefixo_prompt.contexto_dinamico('[Trecho 1]: banho', 'Maria')
+        assert 'Maria' not in prefixo
+
+    def test_memoriza_por_versao_do_conhecimento(self, conhecimento):
+        primeiro = prefixo_prompt.obter(1, 'casual', 'Pet Feliz')
+        assert prefixo_prompt.obter(1, 'casual', 'Pet Feliz') is primeiro
+        assert conhecimento['cargas'] == 1
+
+        conhecimento['versao'] = 2
+        conhecimento['texto'] = 'Empresa: Pet Feliz\nHorário: 9h às 17h'
+
+        assert '9h às 17h' in prefixo_prompt.obter(1, 'casual', 'Pet Feliz')['texto']
+        assert conhecimento['cargas'] == 2
+
+    def test_conhecimento_inteiro_no_prefixo_nao_se_repete(self, conhecimento):
+        prefixo = prefixo_prompt.obter(1, 'casual', 'Pet Feliz')
+
+        assert prefixo_prompt.ja_no_prefixo(prefixo, conhecimento['texto'] + '\n')
+        assert not prefixo_prompt.ja_no_prefixo(prefixo, '[Trecho 1]: banho e tosa')
@@ -0,0 +1,56 @@
+"""
+Testes para a segmentação de respostas em streaming
+"""
+import pytest
+
+from app.services.llm.segmentador import SegmentadorFrases
+
+
+def _segmentar(texto: str, tamanho_pedaco: int = 3, **kwargs):
+    segmentador = SegmentadorFrases(**kwargs)
+    segmentos = []
+    for i in range(0, len(texto), tamanho_pedaco):
+        segmentos.extend(segmentador.adicionar(texto[i:i + tamanho_pedaco]))
+    resto = segmentador.finalizar()
+    return segmentos + ([resto] if resto else [])
+
+
+@pytest.mark.unit
+class TestSegmentadorFrases:
+    """Testes unitários para os cortes por frase e parágrafo"""
+
+    def test_primeiro_segmento_no_primeiro_fim_de_frase_apos_o_minimo(self):
+        segmentos = _segmentar('Olá! Sim, aceitamos pix e cartão de crédito. Mais alguma dúvida?', minimo_primeiro=20)
+
+        assert segmentos[0] == 'Olá! Sim, aceitamos pix e cartão de crédito.'
+
+    def test_seguintes_cortados_por_paragrafo(self):
+        texto = 'Aceitamos pix e cartão de crédito. Parcelamos em 3x.\n\nEntregamos na região. Frete grátis.\n\nAté mais!'
+
+        segmentos = _segmentar(texto, minimo_primeiro=20)
+
+        assert segmentos == [
+            'Aceitamos pix e cartão de crédito.',
+            'Parcelamos em 3x.',
+            'Entregamos na região. Frete grátis.',
+            'Até mais!',
+        ]
+
+    def test_nao_corta_numeros_nem_abreviacoes(self):
+        texto = 'Fale com a Dra. Ana sobre o valor de R$ 3.50 por unidade. Obrigado!'
+
+        segmentos = _segmentar(texto, minimo_primeiro=10)
+
+        assert segmentos[0] == 'Fale com a Dra. Ana sobre o valor de R$ 3.50 por unidade.'
+
+    def test_paragrafo_longo_cortado_na_ultima_frase_apos_o_alvo(self):
+        texto = 'Primeira frase curta aqui. ' + 'Frase do meio. ' * 6 + 'Fim'
+
+        segmentos = _segmentar(texto, minimo_primeiro=10, tamanho_alvo=50)
+
+        assert segmentos[0] == 'Primeira frase curta aqui.'
+        assert all(len(segmento) <= 80 for segmento in segmentos)
+        assert ' '.join(segmentos) == texto.strip()
+
+    def test_texto_sem_fim_de_frase_sai_no_finalizar(self):
+        assert _segmentar('Sim', minimo_primeiro=40) == ['Sim']
@@ -0,0 +1,79 @@
+"""
+Testes para ExecutorParticionado
+"""
+import asyncio
+
+import pytest
+
+from app.services.conversations.sharded_executor import ExecutorParticionado
+
+
+@pytest.mark.unit
+class TestExecutorParticionado:
+    """Testes unitários para ordem por chave e paralelismo"""
+
+    async def test_ordem_por_chave(self):
+        """Testa que trabalhos da mesma chave executam em ordem"""
+        executor = ExecutorParticionado('teste', faixas=4)
+        executor.iniciar()
+        executados = {'a': [], 'b': []}
+
+        def trabalho(chave, i):
+            async def _executar():
+                # Trabalhos mais antigos demoram mais: sem ordenação, inverteriam
+                await asyncio.sleep(0.01 * (5 - i))
+                executados[chave].append(i)
+            return _executar
+
+        futuros = [
+            executor.submeter(chave, trabalho(chave, i))
+            for i in range(5)
+            for chave in ('a', 'b')
+        ]
+        await asyncio.gather(*futuros)
+        await executor.parar()
+
+        assert executados['a'] == [0, 1, 2, 3, 4]
+        assert executados['b'] == [0, 1, 2, 3, 4]
+
+    async def test_chaves_diferentes_em_paralelo(self):
+        """Testa que chaves em faixas diferentes rodam ao mesmo tempo"""
+        executor = ExecutorParticionado('teste', faixas=8)
+        executor.iniciar()
+
+        chaves = [f'1|55119{i:08d}@s.whatsapp.net' for i in range(50)]
+        faixas = {}
+        for chave in chaves:
+            faixas.setdefault(executor.faixa_da_chave(chave), chave)
+        assert len(faixas) > 1
+
+        em_execucao = 0
+        pico = 0
+
+        async def trabalho():
+            nonlocal em_execucao, pico
+            em_execucao += 1
+            pico = max(pico, em_execucao)
+            await asyncio.sleep(0.02)
+            em_execucao -= 1
+
+        await asyncio.gather(*[executor.executar(chave, trabalho) for chave in faixas.values()])
+        await executor.parar()
+
+        assert pico == len(faixas)
+
+    async def test_erro_propagado_sem_travar_faixa(self):
+        """Testa que erro em um trabalho chega ao chamador e a faixa continua"""
+        executor = ExecutorParticionado('teste', faixas=1)
+        executor.iniciar()
+
+        async def falha():
+            raise ValueError('erro')
+
+        async def ok():
+            return 'ok'
+
+        with pytest.raises(ValueError):
+            await executor.executar('a', falha)
+        assert await executor.executar('a', ok) == 'ok'
+        await executor.parar()
@@ -0,0 +1,71 @@
+"""
+Testes para a supersessão de gerações em andamento
+"""
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core.config import settings
+from app.services.conversations import message_buffer, supersessao
+from app.services.conversations.pipeline_etapas import ReiniciarRodada
+
+CLIENTE_ID = 1
+CHAT_ID = '5511999999999@s.whatsapp.net'
+
+
+def _brutas(*entradas):
+    return [json.dumps({'id': message_id, 'text': texto}) for message_id, texto in entradas]
+
+
+async def _gerar(mensagem):
+    return {'resposta': f'resposta para: {mensagem}'}
+
+
+def _executar(brutas, **kwargs):
+    """Uma entrada nova chega entre o fim da geração e o envio"""
+    with patch.object(supersessao, 'ha_entradas_novas', side_effect=[True, False]), \
+            patch.object(supersessao, '_drenar', MagicMock(return_value=brutas)), \
+            patch.object(settings, 'PIPELINE_SUPERSESSAO_MAX', 2):
+        return asyncio.run(supersessao._gerar_com_supersessao(CLIENTE_ID, CHAT_ID, 'qual o preço do banho?', _gerar, [], **kwargs))
+
+
+@pytest.mark.unit
+class TestGerarComSupersessao:
+    """Testes unitários para entradas drenadas durante a geração"""
+
+    def test_reenvios_drenados_sao_filtrados(self):
+        brutas = _brutas(('ABC1', 'qual o preço do banho?'), ('ABC2', 'e da tosa?'))
+
+        resultado, mensagem, incorporadas = _executar(
+            brutas, filtrar=lambda entradas: [e for e in entradas if e[0] != 'ABC1']
+        )
+
+        assert mensagem == 'qual o preço do banho? e da tosa?'
+        assert incorporadas == [('ABC2', 'e da tosa?')]
+        assert resultado['resposta'] == f'resposta para: {mensagem}'
+
+    def test_mudanca_de_intencao_reinicia_a_rodada(self):
+        brutas = _brutas(('ABC2', 'quero marcar para amanhã'))
+
+        with pytest.raises(ReiniciarRodada) as reinicio:
+            _executar(brutas, intencoes=lambda mensagem: 'marcar' in mensagem)
+
+        assert reinicio.value.mensagem == 'qual o preço do banho? quero marcar para amanhã'
+        assert reinicio.value.entradas == [('ABC2', 'quero marcar para amanhã')]
+
+    def test_mesma_intencao_segue_com_a_geracao(self):
+        brutas = _brutas(('ABC2', 'e da tosa?'))
+
+        _, mensagem, _ = _executar(brutas, intencoes=lambda mensagem: 'marcar' in mensagem)
+
+        assert mensagem == 'qual o preço do banho? e da tosa?'
+
+    def test_drena_apenas_o_buffer_do_cliente(self):
+        drenar = MagicMock(return_value=_brutas(('ABC2', 'e da tosa?')))
+
+        with patch.object(supersessao, '_drenar', drenar):
+            supersessao.drenar_entradas_novas(CLIENTE_ID, CHAT_ID, [])
+
+        drenar.assert_called_once_with(keys=[message_buffer.chave_buffer(CLIENTE_ID, CHAT_ID)])
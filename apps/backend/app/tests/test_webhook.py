@@ -98,7 +98,7 @@ class TestWebhookWhatsApp:
         assert data["status"] == "ignored"
         assert data["reason"] == "inactive_subscription"
     
-    @patch('app.main.buffer_message', new_callable=AsyncMock)
+    @patch('app.services.conversations.webhook_handler.buffer_messages', new_callable=AsyncMock)
     def test_webhook_cliente_ativo_processa_mensagem(
         self, mock_buffer, client, db_session, sample_cliente_data
     ):
@@ -135,14 +135,14 @@ class TestWebhookWhatsApp:
         data = response.json()
         assert data["status"] == "ok"
         
-        # Verificar que buffer_message foi chamado com cliente_id correto
+        # Verificar que buffer_messages foi chamado com cliente_id correto
         mock_buffer.assert_called_once()
         call_kwargs = mock_buffer.call_args[1]
         assert call_kwargs["cliente_id"] == cliente.id
         assert call_kwargs["chat_id"] == "5511999999999@s.whatsapp.net"
-        assert call_kwargs["message"] == "Olá, preciso de ajuda"
+        assert call_kwargs["messages"] == ["Olá, preciso de ajuda"]
     
-    @patch('app.main.buffer_message', new_callable=AsyncMock)
+    @patch('app.services.conversations.webhook_handler.buffer_messages', new_callable=AsyncMock)
     def test_webhook_lookup_por_numero(
         self, mock_buffer, client, db_session, sample_cliente_data
     ):
@@ -182,3 +182,148 @@ class TestWebhookWhatsApp:
         mock_buffer.assert_called_once()
         call_kwargs = mock_buffer.call_args[1]
         assert call_kwargs["cliente_id"] == cliente.id
+    
+    @patch('app.services.conversations.webhook_handler.buffer_messages', new_callable=AsyncMock)
+    def test_webhook_lote_agrupa_por_chat(
+        self, mock_buffer, client, db_session, sample_cliente_data
+    ):
+        """Testa que todas as mensagens do lote são processadas, agrupadas por chat"""
+        cliente, _ = ClienteService.criar_cliente_from_stripe(
+            db=db_session,
+            **sample_cliente_data
+        )
+        
+        instancia = InstanciaWhatsApp(
+            cliente_id=cliente.id,
+            instance_id="test_instance",
+            numero="5511999999999",
+            status=InstanciaStatus.CONECTADA
+        )
+        db_session.add(instancia)
+        db_session.commit()
+        
+        response = client.post(
+            "/webhook/whatsapp",
+            json={
+                "event": "messages.upsert",
+                "instance": "test_instance",
+                "data": [
+                    {
+                        "key": {"remoteJid": "5511888888888@s.whatsapp.net"},
+                        "message": {"conversation": "Oi"}
+                    },
+                    {
+                        "key": {"remoteJid": "5511777777777@s.whatsapp.net"},
+                        "message": {"conversation": "Bom dia"}
+                    },
+                    {
+                        "key": {"remoteJid": "5511888888888@s.whatsapp.net"},
+                        "message": {"conversation": "Tudo bem?"}
+                    },
+                    {
+                        "key": {"remoteJid": "5511888888888@s.whatsapp.net", "fromMe": True},
+                        "message": {"conversation": "Resposta do bot"}
+                    }
+                ]
+            }
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ok"
+        assert data["processadas"] == 3
+        assert data["ignoradas"] == 1
+        
+        # Uma chamada por chat, mantendo a ordem das mensagens
+        assert mock_buffer.call_count == 2
+        chamadas = {c[1]["chat_id"]: c[1]["messages"] for c in mock_buffer.call_args_list}
+        assert chamadas["5511888888888@s.whatsapp.net"] == ["Oi", "Tudo bem?"]
+        assert chamadas["5511777777777@s.whatsapp.net"] == ["Bom dia"]
+    
+    @patch('app.services.conversations.webhook_handler.resolver_tenant', new_callable=AsyncMock)
+    @patch('app.services.conversations.webhook_handler.marcar_mensagens', new_callable=AsyncMock)
+    @patch('app.services.conversations.webhook_handler.buffer_messages', new_callable=AsyncMock)
+    def test_webhook_reenvio_duplicado_ignorado(
+        self, mock_buffer, mock_marcar, mock_resolver, client
+    ):
+        """Testa que reenvio da mesma mensagem (mesmo key.id) é descartado antes do banco"""
+        mock_marcar.return_value = [False]
+        
+        response = client.post(
+            "/webhook/whatsapp",
+            json={
+                "event": "messages.upsert",
+                "instance": "test_instance",
+                "data": {
+                    "key": {"remoteJid": "5511999999999@s.whatsapp.net", "id": "3EB0ABC123"},
+                    "message": {"conversation": "Olá"}
+                }
+            }
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ignored"
+        assert data["reason"] == "duplicate"
+        mock_marcar.assert_called_once_with(
+            "test_instance", [("5511999999999@s.whatsapp.net", "3EB0ABC123")]
+        )
+        mock_resolver.assert_not_called()
+        mock_buffer.assert_not_called()
+    
+    @patch('app.services.conversations.webhook_handler.resolver_tenant', new_callable=AsyncMock)
+    @patch('app.services.conversations.webhook_handler.marcar_mensagens', new_callable=AsyncMock)
+    @patch('app.services.conversations.webhook_handler.buffer_messages', new_callable=AsyncMock)
+    def test_webhook_lote_com_item_invalido(
+        self, mock_buffer, mock_marcar, mock_resolver, client
+    ):
+        """Testa que um item que não é objeto é ignorado sem descartar o resto do lote"""
+        mock_marcar.return_value = [True]
+        mock_resolver.return_value = {'cliente_id': 1, 'status': ClienteStatus.ATIVO.value}
+        
+        response = client.post(
+            "/webhook/whatsapp",
+            json={
+                "event": "messages.upsert",
+                "instance": "test_instance",
+                "data": [
+                    "mensagem malformada",
+                    {
+                        "key": {"remoteJid": "5511888888888@s.whatsapp.net", "id": "3EB0ABC124"},
+                        "message": {"conversation": "Oi"}
+                    }
+                ]
+            }
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ok"
+        assert data["processadas"] == 1
+        assert data["ignoradas"] == 1
+        mock_buffer.assert_called_once()
+        assert mock_buffer.call_args[1]["messages"] == ["Oi"]
+    
+    @patch('app.main.processar_evento_webhook', new_callable=AsyncMock)
+    @patch('app.main.publicar_evento', new_callable=AsyncMock)
+    def test_webhook_modo_stream_enfileira_evento(
+        self, mock_publicar, mock_processar, client
+    ):
+        """Testa que no modo stream o webhook apenas enfileira o evento"""
+        with patch('app.main.settings.WEBHOOK_INGESTION_MODE', 'stream'):
+            response = client.post(
+                "/webhook/whatsapp",
+                json={
+                    "event": "messages.upsert",
+                    "instance": "test_instance",
+                    "data": {
+                        "key": {"remoteJid": "5511999999999@s.whatsapp.net"},
+                        "message": {"conversation": "Olá"}
+                    }
+                }
+            )
+        
+        assert response.status_code == 200
+        assert response.json()["status"] == "queued"
+        mock_publicar.assert_called_once()
+        mock_processar.assert_not_called()
@@ -0,0 +1,49 @@
+"""
+Testes para decodificação do payload do webhook
+"""
+import pytest
+
+from app.services.conversations.webhook_payload import (
+    extrair_evento,
+    motivo_ignorado,
+    decodificar
+)
+
+
+@pytest.mark.unit
+class TestWebhookPayload:
+    """Testes unitários para leitura antecipada do evento e decodificação"""
+    
+    def test_extrair_evento(self):
+        """Testa leitura do evento direto dos bytes"""
+        corpo = b'{"event": "presence.update", "instance": "abc", "data": {"id": "1"}}'
+        assert extrair_evento(corpo) == "presence.update"
+        
+        corpo_compacto = b'{"event":"messages.upsert","data":{}}'
+        assert extrair_evento(corpo_compacto) == "messages.upsert"
+    
+    def test_extrair_evento_ausente(self):
+        """Testa payload sem campo event"""
+        assert extrair_evento(b'{"data": {}}') is None
+        assert extrair_evento(b'') is None
+    
+    def test_motivo_ignorado(self):
+        """Testa quais eventos são descartados antes da decodificação"""
+        # presence.update alimenta o debounce adaptativo
+        assert motivo_ignorado("presence.update") is None
+        assert motivo_ignorado("messages.update") == "not_message_event"
+        assert motivo_ignorado("messages.upsert") is None
+        # Sem evento identificado: decodifica e deixa o handler decidir
+        assert motivo_ignorado(None) is None
+    
+    def test_decodificar(self):
+        """Testa decodificação com orjson"""
+        data = decodificar('{"event": "messages.upsert", "data": {"texto": "olá"}}'.encode('utf-8'))
+        assert data["data"]["texto"] == "olá"
+    
+    def test_decodificar_invalido(self):
+        """Testa payload inválido ou que não é objeto"""
+        with pytest.raises(ValueError):
+            decodificar(b'{nao e json')
+        with pytest.raises(ValueError):
+            decodificar(b'[1, 2, 3]')
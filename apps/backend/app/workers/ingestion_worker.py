@@ -0,0 +1,52 @@
+"""
+Worker de ingestão do webhook WhatsApp
+
+Consome o Redis Stream alimentado pelo webhook (WEBHOOK_INGESTION_MODE=stream)
+e executa o pipeline de buffer/IA. Também roda o agendador do debounce
+distribuído. Rodar quantas instâncias forem necessárias:
+
+    python -m app.workers.ingestion_worker
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+
+from app.services.conversations.ingestion_stream import ConsumidorIngestao
+from app.services.conversations.debounce_scheduler import AgendadorDebounce
+from app.services.conversations.message_buffer import handle_debounce
+from app.services.conversations.pipeline_executor import encerrar as encerrar_pipeline
+from app.services.llm.clients import fechar as fechar_clientes_llm
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def nome_consumidor() -> str:
+    """Nome único do consumidor no grupo (host + pid)"""
+    return os.getenv('INGESTION_CONSUMER_NAME') or f'{socket.gethostname()}-{os.getpid()}'
+
+
+async def main():
+    consumidor = ConsumidorIngestao(nome=nome_consumidor())
+    agendador = AgendadorDebounce(handle_debounce)
+
+    def parar():
+        consumidor.parar()
+        agendador.parar()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, parar)
+
+    await asyncio.gather(consumidor.executar(), agendador.executar())
+    encerrar_pipeline()
+    fechar_clientes_llm()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())